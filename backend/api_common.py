@@ -0,0 +1,253 @@
+"""
+Request handling shared by the Flask app (app.py) and the ASGI app
+(asgi_app.py): upload validation and queueing, listing parameters and the
+JSON shape of memories, so both serve identical responses. URLs are built
+by the calling app and passed in as functions.
+"""
+import hmac
+import json
+import os
+import zipfile
+from datetime import datetime
+from memory_processor import job_queue, upload_sessions
+from memory_processor.memory_store import decode_cursor, encode_cursor, memory_projection
+from memory_processor.response_cache import normalize_query
+from memory_processor.upload_utils import save_and_hash
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
+FRAMES_FOLDER = os.path.join(BASE_DIR, 'frames')
+
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(FRAMES_FOLDER, exist_ok=True)
+
+ALLOWED_EXTENSIONS = {'mp3', 'wav', 'mp4', 'mov', 'avi', 'mkv'}
+MAX_BATCH_FILES = int(os.environ.get('MAX_BATCH_FILES', 50))
+MAX_BATCH_DELETE = 1000
+# Allows ?profile=1 on /upload to run that one job under the sampling profiler
+JOB_PROFILING = os.environ.get('JOB_PROFILING', '0') == '1'
+LONG_POLL_MAX_SECONDS = 30
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+FRAME_MAX_AGE = 365 * 24 * 3600
+# Operator endpoints (/metrics, /cache/stats) require "Authorization: Bearer <METRICS_TOKEN>";
+# without a token set they are only served by the debug server
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+def number_arg(args, name, default, type=int):
+    """args.get(name, default, type=type) as Flask does it: the default when missing or malformed."""
+    try:
+        return type(args[name])
+    except (KeyError, ValueError, TypeError):
+        return default
+
+def operator_authorized(authorization, debug=False):
+    """Whether an Authorization header may read operator endpoints."""
+    if not METRICS_TOKEN:
+        return debug
+    return hmac.compare_digest(authorization or '', f'Bearer {METRICS_TOKEN}')
+
+# --- Uploads ---------------------------------------------------------------
+
+def allowed_upload(name):
+    return '.' in name and name.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def upload_destination(user_id, name):
+    # Save file with timestamp to avoid name conflicts (and a counter for
+    # same-named files in one batch)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base, ext = os.path.splitext(os.path.basename(name))
+    filename = f"{user_id}_{timestamp}_{base}{ext}"
+    counter = 1
+    while os.path.exists(os.path.join(UPLOAD_FOLDER, filename)):
+        filename = f"{user_id}_{timestamp}_{base}_{counter}{ext}"
+        counter += 1
+    return filename, os.path.join(UPLOAD_FOLDER, filename)
+
+def enqueue_upload(user_id, name, stream, status_url, details=None):
+    """Store one uploaded file and queue it for ingestion; returns its response entry."""
+    filename, filepath = upload_destination(user_id, name)
+    content_hash, _ = save_and_hash(stream, filepath)
+    job_queue.enqueue(filename, filepath, user_id, content_hash=content_hash, details=details)
+    return {
+        'name': name,
+        'filename': filename,
+        'status_url': status_url(filename)
+    }
+
+def zip_members(stream):
+    """Audio/video members of an uploaded zip archive, streamed without extracting to disk first."""
+    archive = zipfile.ZipFile(stream)
+    members = [m for m in archive.infolist() if not m.is_dir() and not os.path.basename(m.filename).startswith('.')]
+    if len(members) > MAX_BATCH_FILES:
+        raise ValueError(f"Archive has more than {MAX_BATCH_FILES} files")
+    # Declared sizes bound what is read, so this also stops zip bombs
+    if sum(m.file_size for m in members) > upload_sessions.MAX_UPLOAD_BYTES:
+        raise ValueError("Archive contents are too large")
+    for member in members:
+        yield member.filename, archive, member
+
+def enqueue_batch(user_id, uploads, status_url):
+    """
+    Queue a batch of (name, stream) uploads, expanding zip archives. Each
+    file becomes its own ingestion job. Returns (accepted, rejected) entries.
+    """
+    accepted, rejected = [], []
+    for name, stream in uploads:
+        if name.lower().endswith('.zip'):
+            try:
+                for member_name, archive, member in zip_members(stream):
+                    if len(accepted) >= MAX_BATCH_FILES:
+                        rejected.append({'name': member_name, 'error': f'At most {MAX_BATCH_FILES} files per batch'})
+                    elif not allowed_upload(member_name):
+                        rejected.append({'name': member_name, 'error': 'Invalid file type'})
+                    else:
+                        with archive.open(member) as member_stream:
+                            accepted.append(enqueue_upload(user_id, member_name, member_stream, status_url))
+            except (zipfile.BadZipFile, ValueError) as e:
+                rejected.append({'name': name, 'error': str(e)})
+        elif not allowed_upload(name):
+            rejected.append({'name': name, 'error': 'Invalid file type'})
+        elif len(accepted) >= MAX_BATCH_FILES:
+            rejected.append({'name': name, 'error': f'At most {MAX_BATCH_FILES} files per batch'})
+        else:
+            accepted.append(enqueue_upload(user_id, name, stream, status_url))
+    return accepted, rejected
+
+def upload_session_body(session, upload_url, status_url):
+    """JSON body describing a resumable upload session."""
+    body = {
+        'upload_id': session['id'],
+        'offset': session['received'],
+        'size': session['size'],
+        'status': session['status'],
+        'media_type': session['media_type'],
+        'probe': session['probe'],
+        'chunk_size': upload_sessions.UPLOAD_CHUNK_BYTES,
+        'upload_url': upload_url(session['id']),
+    }
+    if session['status'] == 'complete':
+        body['filename'] = session['filename']
+        body['status_url'] = status_url(session['filename'])
+    return body
+
+def queue_completed_upload(session, user_id):
+    """Queue a resumable upload whose last chunk just arrived, once its probe is in."""
+    probe = upload_sessions.wait_for_probe(session['id'], user_id)
+    session['probe'] = probe
+    # Queue for processing by the ingestion worker pool
+    job_queue.enqueue(session['filename'], session['filepath'], user_id,
+                      content_hash=session['content_hash'], details={'probe': probe})
+    return session
+
+def delete_ids_error(ids):
+    """Why a batch delete body's `ids` is unacceptable, or None."""
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+        return 'Provide a non-empty list of memory ids'
+    if len(ids) > MAX_BATCH_DELETE:
+        return f'At most {MAX_BATCH_DELETE} ids per request'
+    return None
+
+# --- Listings --------------------------------------------------------------
+
+def listing_args(args):
+    """
+    Parse the shared listing parameters: ?limit=&cursor= (keyset pagination),
+    ?fields=a,b (projection) and ?view=compact. Raises ValueError if invalid.
+    """
+    paginated = 'limit' in args or 'cursor' in args
+    limit = min(max(number_arg(args, 'limit', DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE) if paginated else None
+    cursor = args.get('cursor') or None
+    if cursor:
+        decode_cursor(cursor)
+    fields = [f.strip() for f in args.get('fields', '').split(',') if f.strip()]
+    compact = args.get('view') == 'compact'
+    return paginated, limit, cursor, memory_projection(fields, compact), compact
+
+def search_cursor(cursor):
+    """The (score, memory id) position a ranked /search page resumes after, or None."""
+    after = tuple(decode_cursor(cursor)) if cursor else None
+    if after and not isinstance(after[0], (int, float)):
+        raise ValueError("Invalid cursor")
+    return after
+
+def page_search_results(results, after, limit):
+    """
+    One page of already ranked search results: (score, _id) descending,
+    resuming after the cursor. The full result list is computed per page.
+    """
+    results.sort(key=lambda memory: (memory['score'], memory['_id']), reverse=True)
+    if after:
+        results = [memory for memory in results if (memory['score'], memory['_id']) < after]
+    if limit:
+        results = results[:limit]
+    return results
+
+def search_cursor_key(memory):
+    return memory['score'], memory['_id']
+
+def listing_cursor_key(memory):
+    return memory['upload_date'], memory['_id']
+
+def cache_key(path, args):
+    """Response cache key: route, normalized query and the remaining arguments (page, fields, view)."""
+    return (
+        path,
+        normalize_query(args.get('query')),
+        tuple(sorted((k, v) for k, v in args.items() if k != 'query')),
+    )
+
+def present_memory(memory, frame_url, compact=False):
+    """Turn stored keyframe names into URLs and format the date for the frontend."""
+    memory['_id'] = str(memory['_id'])
+    if 'keyframes' in memory:
+        keyframes = memory.pop('keyframes')
+        if compact:
+            # Only the first keyframe is sent in the list view
+            memory['keyframe_count'] = len(keyframes)
+            keyframes = keyframes[:1]
+        memory['keyframes'] = [frame_url(frame) for frame in keyframes]
+        memory['thumbnails'] = [frame_url(frame, 'thumb') for frame in keyframes]
+    if memory.get('contact_sheet'):
+        sheet = dict(memory['contact_sheet'])
+        sheet['url'] = frame_url(sheet.pop('file'))
+        memory['contact_sheet'] = sheet
+    # Format date for frontend
+    if 'upload_date' in memory:
+        memory['upload_date'] = memory['upload_date'].strftime('%Y-%m-%d %H:%M')
+    return memory
+
+def listing_open(paginated):
+    return '{"memories": [' if paginated else '['
+
+def listing_item(memory, index, frame_url, compact):
+    return (',' if index else '') + json.dumps(present_memory(memory, frame_url, compact), default=str)
+
+def listing_close(paginated, last_key, count, limit):
+    if not paginated:
+        return ']'
+    next_cursor = encode_cursor(*last_key) if limit and count == limit else None
+    return '], "next_cursor": ' + json.dumps(next_cursor) + '}'
+
+def memories_json(memories, cursor_key, paginated, limit, compact, frame_url):
+    """
+    Serialize memories to JSON one document at a time. Paginated responses
+    are an object {"memories": [...], "next_cursor": ...}; otherwise a plain array.
+    """
+    yield listing_open(paginated)
+    count, last_key = 0, None
+    for memory in memories:
+        last_key = cursor_key(memory)
+        yield listing_item(memory, count, frame_url, compact)
+        count += 1
+    yield listing_close(paginated, last_key, count, limit)
+
+async def memories_json_async(memories, cursor_key, paginated, limit, compact, frame_url):
+    """memories_json over an async cursor."""
+    yield listing_open(paginated)
+    count, last_key = 0, None
+    async for memory in memories:
+        last_key = cursor_key(memory)
+        yield listing_item(memory, count, frame_url, compact)
+        count += 1
+    yield listing_close(paginated, last_key, count, limit)
@@ -1,15 +1,27 @@
-from flask import Flask, request, jsonify, send_from_directory, url_for
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context, url_for
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+import json
 import os
-from datetime import datetime, timedelta
-from memory_processor.audio_transcriber import transcribe_audio
-from memory_processor.frame_extractor import extract_keyframes
-from memory_processor.memory_store import save_memory, search_memory, get_all_memories, delete_memory, get_user_memories
-from memory_processor.summarizer import summarize_content
+import time
+from datetime import datetime
+from memory_processor.memory_store import (
+    search_memory, search_segments, get_all_memories, delete_memory, delete_memories, iter_user_memories,
+    get_user_version, get_memory_stats
+)
+from memory_processor.response_cache import response_cache
+from memory_processor.frame_files import is_hashed_frame, variant_name
+from memory_processor import job_queue
+from memory_processor import metrics, progress_events
+from memory_processor import upload_sessions
 from auth.user_manager import register_user, login_user, get_user_by_id
-import threading
+from auth import tokens
+import api_common
+from api_common import (
+    UPLOAD_FOLDER, FRAMES_FOLDER, JOB_PROFILING, LONG_POLL_MAX_SECONDS, FRAME_MAX_AGE,
+    MAX_BATCH_FILES, allowed_upload, upload_destination, listing_args
+)
 import requests
 from dotenv import load_dotenv
 from flask_cors import CORS
@@ -21,58 +33,54 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
-# Configuration
-app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'fallback-secret-key-change-in-production')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
+# Configuration (shared with the ASGI app, so tokens work on both)
+app.config['JWT_SECRET_KEY'] = tokens.JWT_SECRET_KEY
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = tokens.ACCESS_TOKEN_EXPIRES
 app.config['MONGO_URI'] = os.environ.get('MONGO_ATLAS_URI', 'mongodb://localhost:27017/')
 
 # Initialize extensions
 bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
-FRAMES_FOLDER = os.path.join(BASE_DIR, 'frames')
-PROCESSING_STATUS = {}
+@jwt.token_verification_loader
+def only_access_tokens(jwt_header, jwt_data):
+    # Stream tokens (auth/tokens.py) only open one progress stream
+    return jwt_data.get('type') == 'access'
 
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(FRAMES_FOLDER, exist_ok=True)
+# Process role: "all" serves the API and runs ingestion workers in-process;
+# "api" only serves requests and never imports the ML stack (run worker.py
+# separately to process uploads).
+APP_ROLE = os.environ.get('APP_ROLE', 'all')
 
-def process_memory_async(filepath, filename, user_id):
-    """Process memory in background thread"""
-    try:
-        PROCESSING_STATUS[filename] = {"status": "processing", "progress": 30, "message": "Transcribing audio..."}
-        
-        # Transcribe (auto-detect language + translate to English)
-        transcript = transcribe_audio(filepath)
-        PROCESSING_STATUS[filename] = {"status": "processing", "progress": 50, "message": "Summarizing content..."}
-        
-        # Generate summary using OpenAI
-        summary = summarize_content(transcript)
-        
-        PROCESSING_STATUS[filename] = {"status": "processing", "progress": 60, "message": "Extracting keyframes..."}
-        
-        # Extract keyframes
-        keyframes = extract_keyframes(filepath)
-        frame_filenames = [os.path.basename(frame) for frame in keyframes]
-        PROCESSING_STATUS[filename] = {"status": "processing", "progress": 80, "message": "Saving to database..."}
+if APP_ROLE != 'api':
+    # Start the ingestion worker pool (INGEST_WORKERS=0 disables it in this process)
+    from memory_processor.ingestion import process_memory_async
+    from memory_processor.translation_service import resume_pending_translations
+    if job_queue.start_workers(process_memory_async):
+        resume_pending_translations()
+        # Periodically remove files left behind by deleted memories and failed jobs
+        from memory_processor import artifact_gc
+        artifact_gc.start_sweeper()
 
-        # Save memory with user_id
-        memory_id = save_memory(filepath, transcript, summary, frame_filenames, user_id)
-        
-        PROCESSING_STATUS[filename] = {
-            "status": "completed", 
-            "progress": 100, 
-            "message": "Memory processed successfully",
-            "memory_id": str(memory_id)
-        }
-        
-    except Exception as e:
-        PROCESSING_STATUS[filename] = {
-            "status": "error", 
-            "progress": 100, 
-            "message": f"Processing failed: {str(e)}"
-        }
+# Per-route latency and in-flight requests for /metrics
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc()
+
+@app.after_request
+def observe_request(response):
+    if 'request_started' in g:
+        # Streamed responses are timed until their first byte
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_started,
+                                        method=request.method, route=route, status=response.status_code)
+    return response
+
+@app.teardown_request
+def finish_request(error=None):
+    if g.pop('request_started', None) is not None:
+        metrics.REQUESTS_IN_FLIGHT.dec()
 
 # Auth Routes
 @app.route('/register', methods=['POST'])
@@ -89,7 +97,7 @@ def register():
         result = register_user(email, password, name)
         
         if result.get('error'):
-            return jsonify({'error': result['error']}), 400
+            return jsonify({'error': result['error']}), result.get('status', 400)
         
         # Create access token
         access_token = create_access_token(identity=result['user_id'])
@@ -118,7 +126,7 @@ def login():
         result = login_user(email, password)
         
         if result.get('error'):
-            return jsonify({'error': result['error']}), 401
+            return jsonify({'error': result['error']}), result.get('status', 401)
         
         # Create access token
         access_token = create_access_token(identity=result['user_id'])
@@ -155,6 +163,9 @@ def get_profile():
         return jsonify({'error': 'Failed to fetch profile: ' + str(e)}), 500
 
 # Protected Routes
+def status_url(filename):
+    return url_for('processing_status', filename=filename, _external=True)
+
 @app.route('/upload', methods=['POST'])
 @jwt_required()
 def upload_memory():
@@ -168,76 +179,264 @@ def upload_memory():
         return jsonify({'error': 'No file selected'}), 400
         
     # Validate file type
-    allowed_extensions = {'mp3', 'wav', 'mp4', 'mov', 'avi', 'mkv'}
-    if '.' not in file.filename or file.filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
+    if not allowed_upload(file.filename):
         return jsonify({'error': 'Invalid file type. Please upload audio or video files.'}), 400
     
-    # Save file with timestamp to avoid name conflicts
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{user_id}_{timestamp}_{file.filename}"
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(filepath)
-    
-    # Start processing in background thread
-    thread = threading.Thread(target=process_memory_async, args=(filepath, filename, user_id))
-    thread.start()
-    
-    PROCESSING_STATUS[filename] = {"status": "queued", "progress": 10, "message": "File uploaded, starting processing..."}
+    # Queue for processing by the ingestion worker pool
+    details = {'profile': True} if JOB_PROFILING and request.args.get('profile') == '1' else None
+    entry = api_common.enqueue_upload(user_id, file.filename, file.stream, status_url, details=details)
     
     return jsonify({
         'message': 'Memory upload started', 
-        'filename': filename,
-        'status_url': url_for('processing_status', filename=filename, _external=True)
+        'filename': entry['filename'],
+        'status_url': entry['status_url']
     })
 
+@app.route('/upload/batch', methods=['POST'])
+@jwt_required()
+def upload_batch():
+    """
+    Upload several files at once: repeated `files` fields, and/or zip archives
+    of audio and video files. Each file becomes its own ingestion job.
+    """
+    user_id = get_jwt_identity()
+    uploads = [f for f in request.files.getlist('files') if f.filename]
+    if not uploads:
+        return jsonify({'error': 'No files provided'}), 400
+    if len(uploads) > MAX_BATCH_FILES:
+        return jsonify({'error': f'At most {MAX_BATCH_FILES} files per batch'}), 400
+
+    accepted, rejected = api_common.enqueue_batch(
+        user_id, [(upload.filename, upload.stream) for upload in uploads], status_url
+    )
+
+    return jsonify({
+        'message': f'{len(accepted)} uploads started',
+        'uploads': accepted,
+        'rejected': rejected
+    }), 202 if accepted else 400
+
+# Resumable chunked uploads: POST /uploads opens a session, PUT /uploads/<id>
+# sends bytes at an offset, GET /uploads/<id> tells where to resume.
+def upload_session_response(session, status=200):
+    upload_url = lambda upload_id: url_for('upload_chunk', upload_id=upload_id, _external=True)
+    return jsonify(api_common.upload_session_body(session, upload_url, status_url)), status
+
+def upload_error_response(e):
+    return jsonify(dict(e.details, error=str(e))), e.status
+
+@app.route('/uploads', methods=['POST'])
+@jwt_required()
+def create_upload():
+    user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    name, size = data.get('filename', ''), data.get('size')
+    if not allowed_upload(name):
+        return jsonify({'error': 'Invalid file type. Please upload audio or video files.'}), 400
+    if not isinstance(size, int):
+        return jsonify({'error': 'File size in bytes is required'}), 400
+
+    filename, filepath = upload_destination(user_id, name)
+    try:
+        session = upload_sessions.create_session(user_id, filename, filepath, size)
+    except upload_sessions.UploadError as e:
+        return upload_error_response(e)
+    return upload_session_response(session, 201)
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_upload(upload_id):
+    try:
+        return upload_session_response(upload_sessions.get_session(upload_id, get_jwt_identity()))
+    except upload_sessions.UploadError as e:
+        return upload_error_response(e)
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+@jwt_required()
+def upload_chunk(upload_id):
+    user_id = get_jwt_identity()
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None or request.content_length is None:
+        return jsonify({'error': 'Upload-Offset and Content-Length headers are required'}), 400
+
+    try:
+        # The body is read from the socket in blocks and written at the offset, never buffered whole
+        session = upload_sessions.write_chunk(upload_id, user_id, offset, request.stream, request.content_length)
+    except upload_sessions.UploadError as e:
+        return upload_error_response(e)
+
+    if session['status'] == 'complete':
+        api_common.queue_completed_upload(session, user_id)
+    return upload_session_response(session)
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+@jwt_required()
+def abort_upload(upload_id):
+    try:
+        upload_sessions.abort_session(upload_id, get_jwt_identity())
+    except upload_sessions.UploadError as e:
+        return upload_error_response(e)
+    return jsonify({'message': 'Upload aborted'})
+
 @app.route('/processing-status/<filename>')
 @jwt_required()
 def processing_status(filename):
+    """
+    Current job status. With ?wait=N (long-poll, up to 30s) the answer is held
+    until the status differs from the `revision` passed as ?since=.
+    """
     user_id = get_jwt_identity()
     # Verify the file belongs to the user
     if not filename.startswith(user_id + '_'):
         return jsonify({'error': 'Access denied'}), 403
-    
-    status = PROCESSING_STATUS.get(filename, {"status": "unknown", "progress": 0, "message": "No status available"})
-    return jsonify(status)
+
+    wait = min(max(request.args.get('wait', 0, type=float), 0), LONG_POLL_MAX_SECONDS)
+    if wait:
+        revision, status = progress_events.watcher.wait(filename, request.args.get('since'), wait)
+    else:
+        revision, status = progress_events.load_status(filename)
+    return jsonify(dict(status, revision=revision))
+
+@app.route('/processing-status/<filename>/stream-token', methods=['POST'])
+@jwt_required()
+def processing_stream_token(filename):
+    """A short-lived ?token= for this job's event stream (EventSource cannot set headers)."""
+    user_id = get_jwt_identity()
+    if not filename.startswith(user_id + '_'):
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify({
+        'token': tokens.create_stream_token(user_id, filename),
+        'expires_in': int(tokens.STREAM_TOKEN_EXPIRES.total_seconds())
+    })
+
+@app.route('/processing-status/<filename>/events')
+def processing_events(filename):
+    """
+    Server-Sent Events stream of a job's status changes and partial transcript.
+    Takes a bearer token, or a stream token from /stream-token as ?token=.
+    """
+    try:
+        user_id = tokens.stream_identity(request.headers, request.args, filename)
+    except tokens.TokenError as e:
+        return jsonify({'msg': str(e)}), e.status
+    if not filename.startswith(user_id + '_'):
+        return jsonify({'error': 'Access denied'}), 403
+
+    return Response(
+        stream_with_context(progress_events.job_events(filename)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def frame_url(frame, size='full'):
+    return url_for('serve_frame', filename=variant_name(frame, size), _external=True)
+
+def memories_json(memories, cursor_key, paginated, limit, compact):
+    return api_common.memories_json(memories, cursor_key, paginated, limit, compact, frame_url)
+
+def stream_memories(memories, cursor_key, paginated, limit, compact):
+    """Stream the JSON, so a full archive listing never sits in memory as a whole."""
+    return Response(
+        stream_with_context(memories_json(memories, cursor_key, paginated, limit, compact)),
+        mimetype='application/json'
+    )
+
+def cached_json(user_id, build):
+    """
+    Serve a JSON body from the per-user response cache, keyed by route,
+    normalized query and the remaining arguments (page, fields, view).
+    `build()` produces the body on a miss.
+    """
+    key = api_common.cache_key(request.path, request.args)
+    # Read the version first: a write during build() then leaves this entry unreachable
+    version = get_user_version(user_id)
+    body = response_cache.get(user_id, version, key)
+    if body is None:
+        body = build()
+        response_cache.put(user_id, version, key, body)
+    return Response(body, mimetype='application/json')
 
 @app.route('/search', methods=['GET'])
 @jwt_required()
 def search():
+    """
+    Ranked search. Scores blend text and vector similarity in Python, so
+    ?cursor= is not keyset pagination in the database: every page runs the
+    whole search again and skips results ranked at or above the cursor.
+    Later pages mostly come from the response cache until the user's
+    memories change.
+    """
     user_id = get_jwt_identity()
     query = request.args.get('query')
     if not query or len(query.strip()) < 2:
         return jsonify({'error': 'Search query must be at least 2 characters long'}), 400
-        
-    results = search_memory(query, user_id)
+    try:
+        paginated, limit, cursor, projection, compact = listing_args(request.args)
+        after = api_common.search_cursor(cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    for memory in results:
-        memory['keyframes'] = [
-            url_for('serve_frame', filename=frame, _external=True)
-            for frame in memory['keyframes']
-        ]
-        # Format date for frontend
-        if 'upload_date' in memory:
-            memory['upload_date'] = memory['upload_date'].strftime('%Y-%m-%d %H:%M')
+    def build():
+        results = api_common.page_search_results(search_memory(query, user_id, projection), after, limit)
+        return ''.join(memories_json(results, api_common.search_cursor_key, paginated, limit, compact))
 
-    return jsonify(results)
+    return cached_json(user_id, build)
+
+@app.route('/search/segments', methods=['GET'])
+@jwt_required()
+def search_segments_route():
+    user_id = get_jwt_identity()
+    query = request.args.get('query')
+    if not query or len(query.strip()) < 2:
+        return jsonify({'error': 'Search query must be at least 2 characters long'}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+
+    def build():
+        results = search_segments(query, user_id, limit=limit)
+
+        # One thumbnail per hit instead of the memory's whole keyframe list
+        for segment in results:
+            keyframe = segment.pop('keyframe')
+            segment['thumbnail'] = frame_url(keyframe, 'thumb') if keyframe else None
+        return json.dumps(results)
+
+    return cached_json(user_id, build)
 
 @app.route('/memories', methods=['GET'])
 @jwt_required()
 def get_memories():
     user_id = get_jwt_identity()
-    memories = get_user_memories(user_id)
+    try:
+        paginated, limit, cursor, projection, compact = listing_args(request.args)
+        memories = iter_user_memories(user_id, limit=limit, cursor=cursor, projection=projection)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cursor_key = api_common.listing_cursor_key
+    if not paginated:
+        # A whole archive is streamed, not cached
+        return stream_memories(memories, cursor_key, paginated, limit, compact)
+    return cached_json(user_id, lambda: ''.join(memories_json(memories, cursor_key, paginated, limit, compact)))
+
+@app.route('/stats', methods=['GET'])
+@jwt_required()
+def memory_stats():
+    # One document read; kept up to date by every save and delete
+    user_id = get_jwt_identity()
+    return jsonify(get_memory_stats(user_id))
 
-    for memory in memories:
-        memory['keyframes'] = [
-            url_for('serve_frame', filename=frame, _external=True)
-            for frame in memory['keyframes']
-        ]
-        # Format date for frontend
-        if 'upload_date' in memory:
-            memory['upload_date'] = memory['upload_date'].strftime('%Y-%m-%d %H:%M')
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    if not api_common.operator_authorized(request.headers.get('Authorization'), app.debug):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
-    return jsonify(memories)
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    if not api_common.operator_authorized(request.headers.get('Authorization'), app.debug):
+        return jsonify({'error': 'Unauthorized'}), 401
+    # Counters are per API process
+    return jsonify(response_cache.stats())
 
 @app.route('/delete/<memory_id>', methods=['DELETE'])
 @jwt_required()
@@ -250,9 +449,36 @@ def delete(memory_id):
     else:
         return jsonify({'error': 'Memory not found or access denied'}), 404
 
+@app.route('/memories/delete', methods=['POST'])
+@jwt_required()
+def delete_batch():
+    """Delete many memories in one request: {"ids": [...]}. Files are removed in the background."""
+    user_id = get_jwt_identity()
+    ids = (request.get_json(silent=True) or {}).get('ids')
+    error = api_common.delete_ids_error(ids)
+    if error:
+        return jsonify({'error': error}), 400
+
+    deleted = delete_memories(ids, user_id)
+    deleted_set = set(deleted)
+    return jsonify({
+        'deleted': deleted,
+        'not_found': [i for i in ids if i not in deleted_set]
+    })
+
 @app.route('/frames/<filename>')
 def serve_frame(filename):
-    return send_from_directory(FRAMES_FOLDER, filename)
+    # Content-hashed frames never change, so clients and CDNs may keep them for
+    # good; ETag revalidation and Range requests are handled by send_file
+    immutable = is_hashed_frame(filename)
+    response = send_from_directory(
+        FRAMES_FOLDER, filename, conditional=True,
+        etag=os.path.splitext(filename)[0] if immutable else True,
+        max_age=FRAME_MAX_AGE if immutable else 3600
+    )
+    if immutable:
+        response.headers['Cache-Control'] = f'public, max-age={FRAME_MAX_AGE}, immutable'
+    return response
 
 @app.route('/health', methods=['GET'])
 def health_check():
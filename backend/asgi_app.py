@@ -0,0 +1,500 @@
+"""
+The API of app.py served over ASGI: uvicorn asgi_app:app
+
+Routes, request parameters, tokens and response bodies are the same as the
+Flask app's (the shared parts live in api_common.py), but requests are
+coroutines on one event loop. Database reads go through the async Mongo
+client, long-polls and progress streams wait on asyncio events, and only
+work with no async API (bcrypt, SQLite, file writes, deletes) is handed to
+the thread pool. A slow Mongo query or a thousand open progress streams
+therefore hold no threads.
+"""
+import json
+import os
+import re
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import format_datetime
+import anyio
+from dotenv import load_dotenv
+from fastapi import Depends, FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+from memory_processor.memory_store import delete_memory, delete_memories
+from memory_processor.response_cache import response_cache
+from memory_processor.frame_files import is_hashed_frame, variant_name
+from memory_processor import async_store, job_queue, metrics, progress_events, upload_sessions
+from auth.user_manager import register_user_async, login_user_async, get_user_by_id_async
+from auth import tokens
+import api_common
+from api_common import (
+    FRAMES_FOLDER, JOB_PROFILING, LONG_POLL_MAX_SECONDS, FRAME_MAX_AGE, MAX_BATCH_FILES,
+    allowed_upload, upload_destination, listing_args, number_arg
+)
+
+load_dotenv()
+
+# Same meaning as in app.py
+APP_ROLE = os.environ.get('APP_ROLE', 'all')
+# Threads for blocking calls (bcrypt, SQLite, uploads); 0 keeps the default of 40
+ASGI_THREADPOOL = int(os.environ.get('ASGI_THREADPOOL', 0))
+
+@asynccontextmanager
+async def lifespan(app):
+    if ASGI_THREADPOOL:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = ASGI_THREADPOOL
+    if APP_ROLE != 'api':
+        # Start the ingestion worker pool (INGEST_WORKERS=0 disables it in this process)
+        from memory_processor.ingestion import process_memory_async
+        from memory_processor.translation_service import resume_pending_translations
+        if job_queue.start_workers(process_memory_async):
+            resume_pending_translations()
+            from memory_processor import artifact_gc
+            artifact_gc.start_sweeper()
+    yield
+
+app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+
+# --- Responses -------------------------------------------------------------
+
+def _json_default(value):
+    # Dates as Flask's jsonify writes them (RFC 822, GMT)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+    return str(value)
+
+def json_response(body, status=200):
+    """A JSON response serialized like Flask's jsonify."""
+    return Response(json.dumps(body, default=_json_default, sort_keys=True, separators=(',', ':')) + '\n',
+                    status_code=status, media_type='application/json')
+
+@app.exception_handler(tokens.TokenError)
+async def token_error(request, e):
+    return json_response({'msg': str(e)}, e.status)
+
+def current_user(request: Request):
+    return tokens.identity_from(request.headers)
+
+async def json_body(request):
+    """request.get_json(silent=True) or {}"""
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+# Per-route latency and in-flight requests for /metrics, labelled like Flask's rules
+@app.middleware('http')
+async def observe_request(request, call_next):
+    started = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+    finally:
+        metrics.REQUESTS_IN_FLIGHT.dec()
+    # Streamed responses are timed until their first byte
+    route = request.scope.get('route')
+    rule = re.sub(r'\{(\w+)\}', r'<\1>', route.path) if route else 'unmatched'
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                    method=request.method, route=rule, status=response.status_code)
+    return response
+
+# --- Auth ------------------------------------------------------------------
+
+@app.post('/register')
+async def register(request: Request):
+    try:
+        data = await request.json()
+        email = data.get('email')
+        password = data.get('password')
+        name = data.get('name')
+
+        if not email or not password:
+            return json_response({'error': 'Email and password are required'}, 400)
+
+        result = await register_user_async(email, password, name)
+
+        if result.get('error'):
+            return json_response({'error': result['error']}, result.get('status', 400))
+
+        return json_response({
+            'message': 'User registered successfully',
+            'access_token': tokens.create_access_token(result['user_id']),
+            'user_id': result['user_id'],
+            'email': email,
+            'name': name
+        }, 201)
+
+    except Exception as e:
+        return json_response({'error': 'Registration failed: ' + str(e)}, 500)
+
+@app.post('/login')
+async def login(request: Request):
+    try:
+        data = await request.json()
+        email = data.get('email')
+        password = data.get('password')
+
+        if not email or not password:
+            return json_response({'error': 'Email and password are required'}, 400)
+
+        result = await login_user_async(email, password)
+
+        if result.get('error'):
+            return json_response({'error': result['error']}, result.get('status', 401))
+
+        return json_response({
+            'message': 'Login successful',
+            'access_token': tokens.create_access_token(result['user_id']),
+            'user_id': result['user_id'],
+            'email': email,
+            'name': result['name']
+        })
+
+    except Exception as e:
+        return json_response({'error': 'Login failed: ' + str(e)}, 500)
+
+@app.get('/profile')
+async def get_profile(user_id: str = Depends(current_user)):
+    try:
+        user = await get_user_by_id_async(user_id)
+
+        if not user:
+            return json_response({'error': 'User not found'}, 404)
+
+        return json_response({
+            'user_id': str(user['_id']),
+            'email': user['email'],
+            'name': user.get('name', ''),
+            'created_at': user.get('created_at', '')
+        })
+
+    except Exception as e:
+        return json_response({'error': 'Failed to fetch profile: ' + str(e)}, 500)
+
+# --- Uploads ---------------------------------------------------------------
+
+def status_url_for(request):
+    return lambda filename: str(request.url_for('processing_status', filename=filename))
+
+@app.post('/upload')
+async def upload_memory(request: Request, user_id: str = Depends(current_user)):
+    # Multipart bodies are spooled to temporary files while parsing
+    async with request.form() as form:
+        file = form.get('file')
+        if not isinstance(file, UploadFile):
+            return json_response({'error': 'No file provided'}, 400)
+        if not file.filename:
+            return json_response({'error': 'No file selected'}, 400)
+
+        # Validate file type
+        if not allowed_upload(file.filename):
+            return json_response({'error': 'Invalid file type. Please upload audio or video files.'}, 400)
+
+        # Queue for processing by the ingestion worker pool
+        details = {'profile': True} if JOB_PROFILING and request.query_params.get('profile') == '1' else None
+        entry = await run_in_threadpool(
+            api_common.enqueue_upload, user_id, file.filename, file.file, status_url_for(request), details
+        )
+
+    return json_response({
+        'message': 'Memory upload started',
+        'filename': entry['filename'],
+        'status_url': entry['status_url']
+    })
+
+@app.post('/upload/batch')
+async def upload_batch(request: Request, user_id: str = Depends(current_user)):
+    """Upload several files at once, as with app.py."""
+    async with request.form(max_files=MAX_BATCH_FILES + 1) as form:
+        uploads = [f for f in form.getlist('files') if isinstance(f, UploadFile) and f.filename]
+        if not uploads:
+            return json_response({'error': 'No files provided'}, 400)
+        if len(uploads) > MAX_BATCH_FILES:
+            return json_response({'error': f'At most {MAX_BATCH_FILES} files per batch'}, 400)
+
+        accepted, rejected = await run_in_threadpool(
+            api_common.enqueue_batch, user_id, [(upload.filename, upload.file) for upload in uploads],
+            status_url_for(request)
+        )
+
+    return json_response({
+        'message': f'{len(accepted)} uploads started',
+        'uploads': accepted,
+        'rejected': rejected
+    }, 202 if accepted else 400)
+
+# Resumable chunked uploads, as in app.py
+def upload_session_response(request, session, status=200):
+    upload_url = lambda upload_id: str(request.url_for('upload_chunk', upload_id=upload_id))
+    return json_response(api_common.upload_session_body(session, upload_url, status_url_for(request)), status)
+
+def upload_error_response(e):
+    return json_response(dict(e.details, error=str(e)), e.status)
+
+@app.post('/uploads')
+async def create_upload(request: Request, user_id: str = Depends(current_user)):
+    data = await json_body(request)
+    name, size = data.get('filename', ''), data.get('size')
+    if not allowed_upload(name):
+        return json_response({'error': 'Invalid file type. Please upload audio or video files.'}, 400)
+    if not isinstance(size, int):
+        return json_response({'error': 'File size in bytes is required'}, 400)
+
+    filename, filepath = upload_destination(user_id, name)
+    try:
+        session = await run_in_threadpool(upload_sessions.create_session, user_id, filename, filepath, size)
+    except upload_sessions.UploadError as e:
+        return upload_error_response(e)
+    return upload_session_response(request, session, 201)
+
+@app.get('/uploads/{upload_id}')
+async def get_upload(request: Request, upload_id: str, user_id: str = Depends(current_user)):
+    try:
+        session = await run_in_threadpool(upload_sessions.get_session, upload_id, user_id)
+    except upload_sessions.UploadError as e:
+        return upload_error_response(e)
+    return upload_session_response(request, session)
+
+@app.put('/uploads/{upload_id}')
+async def upload_chunk(request: Request, upload_id: str, user_id: str = Depends(current_user)):
+    offset = number_arg(request.headers, 'upload-offset', None)
+    length = number_arg(request.headers, 'content-length', None)
+    if offset is None or length is None:
+        return json_response({'error': 'Upload-Offset and Content-Length headers are required'}, 400)
+
+    def store_chunk(body, rest):
+        body.write(rest)
+        body.seek(0)
+        session = upload_sessions.write_chunk(upload_id, user_id, offset, body, length)
+        if session['status'] == 'complete':
+            api_common.queue_completed_upload(session, user_id)
+        return session
+
+    # The chunk is received without holding a thread. Every COPY_BUFFER bytes
+    # go to the spool file (on disk past that size) from the thread pool, and
+    # the rest is written there with the chunk at its offset
+    with tempfile.SpooledTemporaryFile(max_size=upload_sessions.COPY_BUFFER) as body:
+        blocks, buffered = [], 0
+        async for block in request.stream():
+            blocks.append(block)
+            buffered += len(block)
+            if buffered >= upload_sessions.COPY_BUFFER:
+                await run_in_threadpool(body.write, b''.join(blocks))
+                blocks, buffered = [], 0
+        try:
+            session = await run_in_threadpool(store_chunk, body, b''.join(blocks))
+        except upload_sessions.UploadError as e:
+            return upload_error_response(e)
+    return upload_session_response(request, session)
+
+@app.delete('/uploads/{upload_id}')
+async def abort_upload(upload_id: str, user_id: str = Depends(current_user)):
+    try:
+        await run_in_threadpool(upload_sessions.abort_session, upload_id, user_id)
+    except upload_sessions.UploadError as e:
+        return upload_error_response(e)
+    return json_response({'message': 'Upload aborted'})
+
+# --- Progress --------------------------------------------------------------
+
+@app.get('/processing-status/{filename}')
+async def processing_status(request: Request, filename: str, user_id: str = Depends(current_user)):
+    """Current job status, with the same ?wait= long-poll as app.py."""
+    # Verify the file belongs to the user
+    if not filename.startswith(user_id + '_'):
+        return json_response({'error': 'Access denied'}, 403)
+
+    wait = min(max(number_arg(request.query_params, 'wait', 0, float), 0), LONG_POLL_MAX_SECONDS)
+    if wait:
+        revision, status = await progress_events.watcher.wait_async(filename, request.query_params.get('since'), wait)
+    else:
+        revision, status = await run_in_threadpool(progress_events.load_status, filename)
+    return json_response(dict(status, revision=revision))
+
+@app.post('/processing-status/{filename}/stream-token')
+async def processing_stream_token(filename: str, user_id: str = Depends(current_user)):
+    """A short-lived ?token= for this job's event stream (EventSource cannot set headers)."""
+    if not filename.startswith(user_id + '_'):
+        return json_response({'error': 'Access denied'}, 403)
+    return json_response({
+        'token': tokens.create_stream_token(user_id, filename),
+        'expires_in': int(tokens.STREAM_TOKEN_EXPIRES.total_seconds())
+    })
+
+@app.get('/processing-status/{filename}/events')
+async def processing_events(request: Request, filename: str):
+    """Server-Sent Events stream of a job's status changes and partial transcript."""
+    user_id = tokens.stream_identity(request.headers, request.query_params, filename)
+    if not filename.startswith(user_id + '_'):
+        return json_response({'error': 'Access denied'}, 403)
+
+    return StreamingResponse(
+        progress_events.job_events_async(filename),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# --- Listings and search ---------------------------------------------------
+
+def frame_url_for(request):
+    return lambda frame, size='full': str(request.url_for('serve_frame', filename=variant_name(frame, size)))
+
+async def cached_json(request, user_id, build):
+    """app.py's cached_json, with `build` a coroutine function."""
+    key = api_common.cache_key(request.url.path, request.query_params)
+    # Read the version first: a write during build() then leaves this entry unreachable
+    version = await async_store.get_user_version(user_id)
+    body = response_cache.get(user_id, version, key)
+    if body is None:
+        body = await build()
+        response_cache.put(user_id, version, key, body)
+    return Response(body, media_type='application/json')
+
+@app.get('/search')
+async def search(request: Request, user_id: str = Depends(current_user)):
+    """
+    Ranked search. Scores blend text and vector similarity in Python, so
+    ?cursor= is not keyset pagination in the database: every page runs the
+    whole search again and skips results ranked at or above the cursor.
+    Later pages mostly come from the response cache until the user's
+    memories change.
+    """
+    query = request.query_params.get('query')
+    if not query or len(query.strip()) < 2:
+        return json_response({'error': 'Search query must be at least 2 characters long'}, 400)
+    try:
+        paginated, limit, cursor, projection, compact = listing_args(request.query_params)
+        after = api_common.search_cursor(cursor)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+
+    async def build():
+        results = api_common.page_search_results(
+            await async_store.search_memory(query, user_id, projection), after, limit
+        )
+        return ''.join(api_common.memories_json(
+            results, api_common.search_cursor_key, paginated, limit, compact, frame_url_for(request)
+        ))
+
+    return await cached_json(request, user_id, build)
+
+@app.get('/search/segments')
+async def search_segments_route(request: Request, user_id: str = Depends(current_user)):
+    query = request.query_params.get('query')
+    if not query or len(query.strip()) < 2:
+        return json_response({'error': 'Search query must be at least 2 characters long'}, 400)
+    limit = min(max(number_arg(request.query_params, 'limit', 20), 1), 100)
+    frame_url = frame_url_for(request)
+
+    async def build():
+        results = await async_store.search_segments(query, user_id, limit=limit)
+
+        # One thumbnail per hit instead of the memory's whole keyframe list
+        for segment in results:
+            keyframe = segment.pop('keyframe')
+            segment['thumbnail'] = frame_url(keyframe, 'thumb') if keyframe else None
+        return json.dumps(results)
+
+    return await cached_json(request, user_id, build)
+
+@app.get('/memories')
+async def get_memories(request: Request, user_id: str = Depends(current_user)):
+    try:
+        paginated, limit, cursor, projection, compact = listing_args(request.query_params)
+        memories = await async_store.iter_user_memories(user_id, limit=limit, cursor=cursor, projection=projection)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+
+    body = api_common.memories_json_async(
+        memories, api_common.listing_cursor_key, paginated, limit, compact, frame_url_for(request)
+    )
+    if not paginated:
+        # A whole archive is streamed as the cursor yields it, not cached
+        return StreamingResponse(body, media_type='application/json')
+
+    async def build():
+        return ''.join([chunk async for chunk in body])
+
+    return await cached_json(request, user_id, build)
+
+@app.get('/stats')
+async def memory_stats(user_id: str = Depends(current_user)):
+    # One document read; kept up to date by every save and delete
+    return json_response(await async_store.get_memory_stats(user_id))
+
+# --- Operations ------------------------------------------------------------
+
+@app.get('/metrics')
+async def metrics_endpoint(request: Request):
+    if not api_common.operator_authorized(request.headers.get('authorization'), app.debug):
+        return json_response({'error': 'Unauthorized'}, 401)
+    return Response(await run_in_threadpool(metrics.render), media_type='text/plain; version=0.0.4')
+
+@app.get('/cache/stats')
+async def cache_stats(request: Request):
+    if not api_common.operator_authorized(request.headers.get('authorization'), app.debug):
+        return json_response({'error': 'Unauthorized'}, 401)
+    # Counters are per API process
+    return json_response(response_cache.stats())
+
+@app.delete('/delete/{memory_id}')
+async def delete(memory_id: str, user_id: str = Depends(current_user)):
+    deleted_count = await run_in_threadpool(delete_memory, memory_id, user_id)
+
+    if deleted_count > 0:
+        return json_response({'message': 'Memory deleted successfully'})
+    else:
+        return json_response({'error': 'Memory not found or access denied'}, 404)
+
+@app.post('/memories/delete')
+async def delete_batch(request: Request, user_id: str = Depends(current_user)):
+    """Delete many memories in one request: {"ids": [...]}. Files are removed in the background."""
+    ids = (await json_body(request)).get('ids')
+    error = api_common.delete_ids_error(ids)
+    if error:
+        return json_response({'error': error}, 400)
+
+    deleted = await run_in_threadpool(delete_memories, ids, user_id)
+    deleted_set = set(deleted)
+    return json_response({
+        'deleted': deleted,
+        'not_found': [i for i in ids if i not in deleted_set]
+    })
+
+@app.get('/frames/{filename}')
+async def serve_frame(request: Request, filename: str):
+    # Same caching as app.py: content-hashed frames are immutable and keyed by
+    # their hash; Range requests are handled by FileResponse
+    path = os.path.join(FRAMES_FOLDER, filename)
+    if filename != os.path.basename(filename) or filename.startswith('.'):
+        return json_response({'error': 'Not found'}, 404)
+    try:
+        stat = await anyio.Path(path).stat()
+    except OSError:
+        return json_response({'error': 'Not found'}, 404)
+
+    immutable = is_hashed_frame(filename)
+    etag = os.path.splitext(filename)[0] if immutable else f"{int(stat.st_mtime)}-{stat.st_size}"
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': f'public, max-age={FRAME_MAX_AGE}, immutable' if immutable else 'public, max-age=3600',
+    }
+    if etag in [tag.strip().removeprefix('W/').strip('"') for tag in request.headers.get('if-none-match', '').split(',')]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, headers=headers, stat_result=stat)
+
+@app.get('/health')
+async def health_check():
+    return json_response({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi_app:app', port=5000, reload=True)
@@ -0,0 +1,112 @@
+"""
+Access tokens for the ASGI app, interchangeable with Flask-JWT-Extended's.
+
+Tokens are HS256 JWTs signed with JWT_SECRET_KEY, with the user id as the
+`sub` claim and `type: access`, so a token issued by either app is accepted
+by the other. Failures carry the status and message Flask-JWT-Extended
+would answer with.
+
+EventSource cannot set headers, so the progress stream takes its token in
+the query string, where it ends up in proxy and access logs. That token is
+a separate `type: stream` JWT, valid for one job's stream and only for a
+couple of minutes (it is checked when the stream connects), never the
+24-hour access token.
+"""
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+import jwt
+from dotenv import load_dotenv
+
+load_dotenv()
+
+JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'fallback-secret-key-change-in-production')
+JWT_ALGORITHM = 'HS256'
+ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
+STREAM_TOKEN_EXPIRES = timedelta(minutes=2)
+QUERY_STRING_NAME = 'token'   # EventSource cannot set headers
+
+class TokenError(Exception):
+    def __init__(self, message, status=422):
+        super().__init__(message)
+        self.status = status
+
+def create_access_token(identity):
+    """A signed access token for `identity` (the user id string)."""
+    now = datetime.now(timezone.utc)
+    claims = {
+        'fresh': False,
+        'iat': now,
+        'jti': str(uuid.uuid4()),
+        'type': 'access',
+        'sub': identity,
+        'nbf': now,
+        'csrf': str(uuid.uuid4()),
+        'exp': now + ACCESS_TOKEN_EXPIRES,
+    }
+    return jwt.encode(claims, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+def create_stream_token(identity, filename):
+    """A short-lived token that only opens the progress stream of `filename`."""
+    now = datetime.now(timezone.utc)
+    claims = {
+        'iat': now,
+        'jti': str(uuid.uuid4()),
+        'type': 'stream',
+        'sub': identity,
+        'job': filename,
+        'nbf': now,
+        'exp': now + STREAM_TOKEN_EXPIRES,
+    }
+    return jwt.encode(claims, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+def _decode(token):
+    try:
+        return jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise TokenError('Token has expired', 401)
+    except jwt.InvalidSignatureError:
+        raise TokenError('Signature verification failed')
+    except jwt.InvalidTokenError as e:
+        raise TokenError(str(e))
+
+def decode_access_token(token):
+    """Return the identity of a valid access token; raises TokenError otherwise."""
+    claims = _decode(token)
+    if claims.get('type') == 'stream':
+        # What app.py's token_verification_loader answers
+        raise TokenError('User claims verification failed', 400)
+    if claims.get('type') != 'access':
+        raise TokenError('Only non-refresh tokens are allowed')
+    return claims['sub']
+
+def decode_stream_token(token, filename):
+    """Return the identity of a valid stream token for `filename`; raises TokenError otherwise."""
+    claims = _decode(token)
+    if claims.get('type') != 'stream' or claims.get('job') != filename:
+        raise TokenError('Only stream tokens for this job are allowed in the query string', 401)
+    return claims['sub']
+
+def stream_identity(headers, query_params, filename):
+    """
+    The user id for the progress stream of `filename`: a bearer access token
+    in the headers, or a stream token as ?token=.
+    """
+    if headers.get('authorization') is not None:
+        return identity_from(headers)
+    token = query_params.get(QUERY_STRING_NAME)
+    if not token:
+        raise TokenError("Missing JWT in headers or query_string "
+                         f"(Missing Authorization Header; Missing '{QUERY_STRING_NAME}' query parameter)", 401)
+    return decode_stream_token(token, filename)
+
+def identity_from(headers):
+    """The user id of the request's bearer token."""
+    header = headers.get('authorization')
+    if header is None:
+        raise TokenError('Missing Authorization Header', 401)
+    scheme, _, token = header.partition(' ')
+    if scheme != 'Bearer' or not token:
+        raise TokenError("Missing 'Bearer' type in 'Authorization' header. "
+                         "Expected 'Authorization: Bearer <JWT>'", 401)
+    return decode_access_token(token)
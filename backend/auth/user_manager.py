@@ -1,76 +1,251 @@
-from pymongo import MongoClient
+import asyncio
+from anyio import to_thread
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 import bcrypt
 from datetime import datetime
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from memory_processor.db import get_async_db, get_db
 
 load_dotenv()
 
-# MongoDB Atlas connection
-client = MongoClient(os.environ.get('MONGO_ATLAS_URI', 'mongodb://localhost:27017/'))
-db = client['memory_db']
-users_collection = db['users']
+# bcrypt cost factor for new hashes (2^rounds iterations). Existing hashes
+# with another cost are upgraded transparently on the next login.
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+# bcrypt runs in a small pool, so a burst of logins cannot occupy every core;
+# beyond BCRYPT_MAX_PENDING queued hashes, requests are turned away instead of
+# piling up. Under Flask the request thread waits for its hash, so this also
+# caps the web threads parked on bcrypt: keep it below the threads per process
+# (the ASGI app awaits the hash without holding a thread).
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+BCRYPT_MAX_PENDING = int(os.environ.get('BCRYPT_MAX_PENDING', 16))
+# Resolved users (without password hashes) are cached per process
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 60))
+USER_CACHE_ENTRIES = int(os.environ.get('USER_CACHE_ENTRIES', 1024))
+
+BUSY_ERROR = {'error': 'Server is busy, please try again', 'status': 503}
+
+_email_index_ready = False
+
+def get_users_collection():
+    """Return the users collection, creating the unique email index until that succeeds."""
+    global _email_index_ready
+    users = get_db()['users']
+    if not _email_index_ready:
+        try:
+            users.create_index('email', unique=True)
+            _email_index_ready = True
+        except OperationFailure as e:
+            # Existing duplicate emails must be merged before the index can be built
+            print(f"[Auth] Could not create unique email index: {e}")
+    return users
+
+# --- bcrypt off the request threads ----------------------------------------
+
+_bcrypt_pool = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix='bcrypt')
+_bcrypt_slots = threading.BoundedSemaphore(BCRYPT_MAX_PENDING)
+
+def _submit_bcrypt(fn, *args):
+    """Queue a bcrypt call in the bounded pool; returns its future, or None if the pool is saturated."""
+    if not _bcrypt_slots.acquire(blocking=False):
+        return None
+    try:
+        future = _bcrypt_pool.submit(fn, *args)
+    except Exception:
+        _bcrypt_slots.release()
+        raise
+    future.add_done_callback(lambda _: _bcrypt_slots.release())
+    return future
+
+def _bcrypt(fn, *args):
+    """Run a bcrypt call in the pool and wait for it; None if the pool is saturated."""
+    future = _submit_bcrypt(fn, *args)
+    return None if future is None else future.result()
+
+async def _bcrypt_async(fn, *args):
+    """_bcrypt for the ASGI app: the result is awaited instead of holding a thread."""
+    future = _submit_bcrypt(fn, *args)
+    return None if future is None else await asyncio.wrap_future(future)
+
+def _hash_password(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
+
+def _check_password(password, hashed):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed)
+
+def _hash_rounds(hashed):
+    # $2b$12$... -> 12
+    try:
+        return int(hashed.split(b'$')[2])
+    except (IndexError, ValueError):
+        return None
+
+# --- User cache ------------------------------------------------------------
+
+_user_cache = OrderedDict()   # user id -> (expires_at, user)
+_user_cache_lock = threading.Lock()
+
+def _cache_get(user_id):
+    with _user_cache_lock:
+        entry = _user_cache.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            _user_cache.pop(user_id, None)
+            return None
+        _user_cache.move_to_end(user_id)
+        return dict(entry[1])
+
+def _cache_put(user_id, user):
+    with _user_cache_lock:
+        _user_cache[user_id] = (time.monotonic() + USER_CACHE_TTL, user)
+        _user_cache.move_to_end(user_id)
+        while len(_user_cache) > USER_CACHE_ENTRIES:
+            _user_cache.popitem(last=False)
+
+def invalidate_user(user_id):
+    with _user_cache_lock:
+        _user_cache.pop(str(user_id), None)
+
+# --- Accounts --------------------------------------------------------------
+
+def _insert_user(email, hashed_password, name):
+    users = get_users_collection()
+    # Without the unique index only this check (racy between two sign-ups) stops duplicates
+    if not _email_index_ready and users.find_one({'email': email}, {'_id': 1}):
+        return {'error': 'User already exists with this email'}
+
+    # Create user document
+    user = {
+        'email': email,
+        'password': hashed_password,
+        'name': name,
+        'created_at': datetime.now(),
+        'updated_at': datetime.now()
+    }
+
+    # Insert user; the unique email index rejects existing accounts atomically
+    try:
+        result = users.insert_one(user)
+    except DuplicateKeyError:
+        return {'error': 'User already exists with this email'}
+
+    return {
+        'user_id': str(result.inserted_id),
+        'email': email,
+        'name': name
+    }
+
+def _find_user(email):
+    # Served by the unique email index
+    return get_users_collection().find_one({'email': email}, {'password': 1, 'email': 1, 'name': 1})
+
+def _store_upgraded_hash(user, upgraded):
+    """Replace a hash made with another cost factor (skipped if the pool was saturated)."""
+    if upgraded is None:
+        return
+    get_users_collection().update_one(
+        {'_id': user['_id']}, {'$set': {'password': upgraded, 'updated_at': datetime.now()}}
+    )
+    invalidate_user(user['_id'])
+
+def _login_result(user):
+    return {
+        'user_id': str(user['_id']),
+        'email': user['email'],
+        'name': user.get('name', '')
+    }
 
 def register_user(email, password, name):
     """Register a new user"""
     try:
-        # Check if user already exists
-        if users_collection.find_one({'email': email}):
-            return {'error': 'User already exists with this email'}
-        
         # Hash password
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-        
-        # Create user document
-        user = {
-            'email': email,
-            'password': hashed_password,
-            'name': name,
-            'created_at': datetime.now(),
-            'updated_at': datetime.now()
-        }
-        
-        # Insert user
-        result = users_collection.insert_one(user)
-        
-        return {
-            'user_id': str(result.inserted_id),
-            'email': email,
-            'name': name
-        }
-        
+        hashed_password = _bcrypt(_hash_password, password)
+        if hashed_password is None:
+            return dict(BUSY_ERROR)
+        return _insert_user(email, hashed_password, name)
+    except Exception as e:
+        return {'error': f'Registration failed: {str(e)}'}
+
+async def register_user_async(email, password, name):
+    """register_user for the ASGI app: the hash is awaited, the insert runs in the thread pool"""
+    try:
+        hashed_password = await _bcrypt_async(_hash_password, password)
+        if hashed_password is None:
+            return dict(BUSY_ERROR)
+        return await to_thread.run_sync(_insert_user, email, hashed_password, name)
     except Exception as e:
         return {'error': f'Registration failed: {str(e)}'}
 
 def login_user(email, password):
     """Authenticate user login"""
     try:
-        # Find user by email
-        user = users_collection.find_one({'email': email})
-        
+        user = _find_user(email)
         if not user:
             return {'error': 'Invalid email or password'}
-        
+
         # Verify password
-        if not bcrypt.checkpw(password.encode('utf-8'), user['password']):
+        valid = _bcrypt(_check_password, password, user['password'])
+        if valid is None:
+            return dict(BUSY_ERROR)
+        if not valid:
             return {'error': 'Invalid email or password'}
-        
-        return {
-            'user_id': str(user['_id']),
-            'email': user['email'],
-            'name': user.get('name', '')
-        }
-        
+
+        if _hash_rounds(user['password']) != BCRYPT_ROUNDS:
+            _store_upgraded_hash(user, _bcrypt(_hash_password, password))
+        return _login_result(user)
+    except Exception as e:
+        return {'error': f'Login failed: {str(e)}'}
+
+async def login_user_async(email, password):
+    """login_user for the ASGI app: hashes are awaited, database calls run in the thread pool"""
+    try:
+        user = await to_thread.run_sync(_find_user, email)
+        if not user:
+            return {'error': 'Invalid email or password'}
+
+        valid = await _bcrypt_async(_check_password, password, user['password'])
+        if valid is None:
+            return dict(BUSY_ERROR)
+        if not valid:
+            return {'error': 'Invalid email or password'}
+
+        if _hash_rounds(user['password']) != BCRYPT_ROUNDS:
+            upgraded = await _bcrypt_async(_hash_password, password)
+            await to_thread.run_sync(_store_upgraded_hash, user, upgraded)
+        return _login_result(user)
     except Exception as e:
         return {'error': f'Login failed: {str(e)}'}
 
 def get_user_by_id(user_id):
-    """Get user by ID"""
+    """Get user by ID (without the password hash), cached for USER_CACHE_TTL seconds"""
+    user = _cache_get(user_id)
+    if user is not None:
+        return user
     try:
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
+        user = get_users_collection().find_one({'_id': ObjectId(user_id)}, {'password': 0})
         if user:
             user['_id'] = str(user['_id'])  # Convert ObjectId to string
+            _cache_put(user_id, user)
+            return dict(user)
         return user
     except:
-        return None
\ No newline at end of file
+        return None
+
+async def get_user_by_id_async(user_id):
+    """get_user_by_id for the ASGI app: same cache, lookups through the async client"""
+    user = _cache_get(user_id)
+    if user is not None:
+        return user
+    try:
+        user = await get_async_db()['users'].find_one({'_id': ObjectId(user_id)}, {'password': 0})
+    except Exception:
+        return None
+    if user:
+        user['_id'] = str(user['_id'])
+        _cache_put(user_id, user)
+        return dict(user)
+    return user
@@ -0,0 +1,623 @@
+"""
+Offline benchmark suite for the ingestion and search paths, with baselines.
+
+Generates synthetic fixtures in a scratch directory (tone sequences,
+speech-like modulated noise, near-silence, and videos with scene changes or
+a single static shot), then times the real code of each stage against local
+stand-ins, so nothing touches the network or a real database:
+
+  Mongo         an in-memory mongomock client (or --mongo-uri; a throwaway
+                memory_bench database is dropped afterwards)
+  Gemini        a model object that answers after --gemini-latency seconds
+  googletrans   a Translator that answers after --translate-latency seconds
+
+Stages (each runs in a fresh interpreter, so peak RSS is per stage):
+
+  transcribe       transcribe_audio on each audio fixture (decode, silence
+                   check, Whisper; the longest one goes through long-form mode)
+  keyframes        extract_timed_keyframes on each video fixture
+  summarize        summarize_content on short and map-reduce sized transcripts,
+                   plus a cached one
+  summarize_local  the TextRank fallback on up to 30k-word transcripts
+  translate        background translation of a batch of pending memories
+  save             save_memory (document, segments, trigram and vector index)
+  search           search_memory over a --corpus sized archive
+
+Reported per stage: operations, p50/p95/p99 latency, throughput and peak RSS.
+With --stub-models, Whisper and the embedding model are replaced by cheap
+deterministic stand-ins too, which isolates this repository's code from
+model inference time (long-form mode is not exercised then: its pool
+processes load the real engine). Timings are only comparable with baselines
+saved on the same machine with the same options.
+
+Usage (from backend/; needs ffmpeg for the transcribe stage):
+    python benchmarks/regression_suite.py [--stages save,search] [--repeats 5] [--stub-models]
+    python benchmarks/regression_suite.py --stub-models --save-baseline benchmarks/baseline.json
+    python benchmarks/regression_suite.py --stub-models --compare benchmarks/baseline.json [--tolerance 0.2]
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import wave
+import zlib
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+STAGES = ('transcribe', 'keyframes', 'summarize', 'summarize_local', 'translate', 'save', 'search')
+SAMPLE_RATE = 16000
+VIDEO_FPS = 25
+VIDEO_SIZE = (640, 360)
+USER_ID = 'benchmark-suite'
+RESULT_PREFIX = 'RESULT '
+RSS_SLACK_MB = 16     # peak RSS differences below this are noise
+LATENCY_SLACK_MS = 1  # so are latency differences below this
+
+VOCABULARY = (
+    "budget finance meeting quarter revenue project design review travel family birthday dinner holiday "
+    "weather garden music concert lecture chapter history science experiment result deadline contract "
+    "invoice schedule interview hospital doctor recipe kitchen football morning evening team client "
+    "market report launch plan idea question answer problem solution account payment office school"
+).split()
+QUERIES = ["budget", "quarter revenue", "finanse", "birthdya dinner", "udget", "zebra crossing"]
+
+
+# --- Fixtures --------------------------------------------------------------
+
+def synthetic_text(rng, words):
+    """Sentences of 6-18 vocabulary words, `words` words in total."""
+    sentences = []
+    while words > 0:
+        length = min(words, int(rng.integers(6, 19)))
+        sentence = ' '.join(rng.choice(VOCABULARY, length))
+        sentences.append(sentence[0].upper() + sentence[1:] + '.')
+        words -= length
+    return ' '.join(sentences)
+
+
+def write_wav(path, samples):
+    pcm = (np.clip(samples, -1, 1) * 32767).astype('<i2')
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(pcm.tobytes())
+
+
+def tone_audio(rng, seconds):
+    """One-second tones at random pitches, each with its first two harmonics."""
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    tones = []
+    for _ in range(int(seconds)):
+        pitch = rng.uniform(200, 1000)
+        tones.append(0.3 * np.sin(2 * np.pi * pitch * t) + 0.1 * np.sin(4 * np.pi * pitch * t)
+                     + 0.05 * np.sin(6 * np.pi * pitch * t))
+    return np.concatenate(tones)
+
+
+def speech_like_audio(rng, seconds):
+    """
+    Utterances of voiced, syllable-modulated noise separated by pauses; some
+    pauses are long enough to split long-form chunks.
+    """
+    audio = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    position = 0
+    while position < len(audio):
+        length = int(rng.uniform(1.0, 4.0) * SAMPLE_RATE)
+        t = np.arange(length) / SAMPLE_RATE
+        pitch = rng.uniform(110, 220)
+        voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+        noise = np.convolve(rng.standard_normal(length), np.ones(8) / 8, mode='same')
+        envelope = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t), 0, None) ** 0.5
+        utterance = (0.15 * voiced + 0.2 * noise) * envelope
+        end = min(position + length, len(audio))
+        audio[position:end] = utterance[:end - position]
+        position = end + int(rng.choice([0.3, 0.6, 1.2, 2.5]) * SAMPLE_RATE)
+    return audio
+
+
+def scene_video(path, rng, seconds, scene_seconds):
+    """Gradient scenes with moving shapes; a new scene every `scene_seconds`."""
+    import cv2
+    width, height = VIDEO_SIZE
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), VIDEO_FPS, VIDEO_SIZE)
+    if not writer.isOpened():
+        raise RuntimeError(f"OpenCV cannot write {path}")
+    ramp = np.linspace(0, 1, width, dtype=np.float32)[None, :, None]
+    background = None
+    for index in range(int(seconds * VIDEO_FPS)):
+        if index % int(scene_seconds * VIDEO_FPS) == 0:
+            start, stop = rng.integers(0, 256, 3), rng.integers(0, 256, 3)
+            background = np.broadcast_to(start + (stop - start) * ramp, (height, width, 3)).astype(np.uint8)
+            shapes = [(rng.integers(0, width), rng.integers(0, height), rng.integers(20, 80),
+                       tuple(int(c) for c in rng.integers(0, 256, 3))) for _ in range(4)]
+        frame = background.copy()
+        for x, y, size, color in shapes:
+            x = int(x + index * 2) % width
+            cv2.rectangle(frame, (x, int(y)), (x + int(size), int(y + size)), color, -1)
+        frame = cv2.add(frame, rng.integers(0, 8, frame.shape, dtype=np.uint8))
+        writer.write(frame)
+    writer.release()
+
+
+def build_fixtures(directory, seed, media_seconds, long_form):
+    """Write the fixtures (deterministic for a seed) and return their manifest."""
+    rng = np.random.default_rng(seed)
+    audio = [
+        ('tones', tone_audio(rng, 20)),
+        ('speech', speech_like_audio(rng, media_seconds)),
+        ('near_silence', 1e-4 * rng.standard_normal(20 * SAMPLE_RATE)),
+    ]
+    if long_form:
+        audio.append(('speech_long', speech_like_audio(rng, 3 * media_seconds)))
+    manifest = {"audio": [], "video": []}
+    for name, samples in audio:
+        path = os.path.join(directory, f"{name}.wav")
+        write_wav(path, samples)
+        manifest['audio'].append({"name": name, "path": path, "seconds": len(samples) / SAMPLE_RATE})
+    for name, scene_seconds in (('scenes', 5), ('static', media_seconds)):
+        path = os.path.join(directory, f"{name}.mp4")
+        scene_video(path, rng, media_seconds, scene_seconds)
+        manifest['video'].append({"name": name, "path": path, "seconds": media_seconds})
+    return manifest
+
+
+# --- Stand-ins ---------------------------------------------------------------
+
+class OfflineGemini:
+    """Answers generate_content with the last words of the prompt after a fixed delay."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def generate_content(self, prompt):
+        time.sleep(self.latency)
+        return types.SimpleNamespace(text=' '.join(prompt.split()[-60:]))
+
+
+class OfflineTranslator:
+    """googletrans.Translator replacement: one fixed delay per call, text returned unchanged."""
+
+    latency = 0.0
+
+    def translate(self, texts, dest='en'):
+        time.sleep(self.latency)
+        return [types.SimpleNamespace(text=text, src='es', dest=dest) for text in texts]
+
+
+class HashingEncoder:
+    """SentenceTransformer replacement: normalized bag-of-words hashes, no model download."""
+
+    dimensions = 384
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.encode()) % self.dimensions] += 1
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+def stub_engine_class():
+    from memory_processor.transcription_engines import TranscriptionEngine
+
+    class StubEngine(TranscriptionEngine):
+        """Whisper replacement: 2.5 deterministic words per second of audio, one segment per 5 s."""
+
+        name = 'stub'
+
+        def transcribe(self, audio, task="translate"):
+            seconds = len(audio) / SAMPLE_RATE
+            rng = np.random.default_rng(len(audio))
+            segments = [
+                {"start": start, "end": min(start + 5, seconds), "text": synthetic_text(rng, 12)}
+                for start in np.arange(0, seconds, 5.0)
+            ]
+            return {"text": ' '.join(s['text'] for s in segments), "language": "en", "segments": segments}
+
+    return StubEngine
+
+
+def mongo_stand_in():
+    """
+    An in-memory mongomock client. mongomock's bulk_write does not accept the
+    UpdateOne operations of current pymongo, so those are replayed one by one.
+    """
+    import mongomock
+    from pymongo import UpdateOne
+
+    bulk_write = mongomock.collection.Collection.bulk_write
+
+    def compatible_bulk_write(self, requests, ordered=True, **kwargs):
+        try:
+            return bulk_write(self, requests, ordered=ordered, **kwargs)
+        except TypeError:
+            for request in requests:
+                if not isinstance(request, UpdateOne):
+                    raise
+                self.update_one(request._filter, request._doc, upsert=request._upsert)
+
+    mongomock.collection.Collection.bulk_write = compatible_bulk_write
+    return mongomock.MongoClient()
+
+
+def install_stand_ins(args, workdir):
+    from memory_processor import (
+        audio_transcriber, db, frame_extractor, memory_store, summarizer, transcription_engines, vector_index
+    )
+
+    if not args.mongo_uri:
+        db._client = mongo_stand_in()
+    frames = os.path.join(workdir, 'frames')
+    os.makedirs(frames, exist_ok=True)
+    frame_extractor.FRAMES_FOLDER = memory_store.FRAMES_FOLDER = frames
+
+    summarizer.GEMINI_API_KEY = 'offline'
+    summarizer._model = OfflineGemini(args.gemini_latency)
+    OfflineTranslator.latency = args.translate_latency
+    sys.modules['googletrans'] = types.SimpleNamespace(Translator=OfflineTranslator)
+
+    if args.stub_models:
+        # The stub engine lives in this process, so no transcription pool
+        audio_transcriber.TRANSCRIBE_PROCESSES = 0
+        vector_index._model = HashingEncoder()
+        key = (transcription_engines.TRANSCRIBE_ENGINE, transcription_engines.WHISPER_MODEL_SIZE)
+        transcription_engines._engines[key] = stub_engine_class()()
+
+
+# --- Stages ------------------------------------------------------------------
+# Each returns (work items, throughput unit). An item is timed by calling
+# run(); prepare(), when present, runs untimed before each call.
+
+class StageSkipped(Exception):
+    pass
+
+
+def transcribe_stage(args, manifest, rng):
+    if shutil.which('ffmpeg') is None:
+        raise StageSkipped('ffmpeg not found')
+    from memory_processor.audio_transcriber import transcribe_audio
+
+    def run(path):
+        result = transcribe_audio(path)
+        if result['transcript'].startswith('Transcription failed'):
+            raise RuntimeError(result['transcript'])
+
+    return [
+        {"label": fixture['name'], "run": lambda path=fixture['path']: run(path), "units": fixture['seconds']}
+        for fixture in manifest['audio']
+    ], 'media s/s'
+
+
+def keyframes_stage(args, manifest, rng):
+    from memory_processor import frame_extractor
+
+    def prepare():
+        # Frames are content-addressed: start empty so every call writes them
+        shutil.rmtree(frame_extractor.FRAMES_FOLDER, ignore_errors=True)
+        os.makedirs(frame_extractor.FRAMES_FOLDER)
+
+    return [
+        {"label": fixture['name'], "prepare": prepare, "units": fixture['seconds'],
+         "run": lambda path=fixture['path']: frame_extractor.extract_timed_keyframes(path)}
+        for fixture in manifest['video']
+    ], 'media s/s'
+
+
+def summarize_stage(args, manifest, rng):
+    from memory_processor.summarizer import SUMMARY_CHUNK_CHARS, summarize_content
+    short = synthetic_text(rng, 400)
+    long = synthetic_text(rng, 3 * SUMMARY_CHUNK_CHARS // 6)
+    counter = itertools.count()
+
+    def fresh(text):
+        # A new transcript every call, so the summary cache never answers
+        return lambda: summarize_content(f"Recording {next(counter)}. {text}")
+
+    return [
+        {"label": "short", "run": fresh(short), "units": 400},
+        {"label": "map_reduce", "run": fresh(long), "units": len(long.split())},
+        {"label": "cached", "run": lambda: summarize_content(short), "units": 400},
+    ], 'words/s'
+
+
+def summarize_local_stage(args, manifest, rng):
+    from memory_processor.summarizer import fallback_summarize
+    return [
+        {"label": f"{words}_words", "units": words,
+         "run": lambda text=synthetic_text(rng, words): fallback_summarize(text, max_sentences=5, max_words=150)}
+        for words in (400, 6000, 30000)
+    ], 'words/s'
+
+
+def translate_stage(args, manifest, rng):
+    from memory_processor.memory_store import save_memory
+    from memory_processor.translation_service import BackgroundTranslator
+    translator = BackgroundTranslator()
+    batch = []
+    counter = itertools.count()
+
+    def prepare():
+        batch[:] = [
+            save_memory(manifest['audio'][0]['path'], f"Grabación {next(counter)}. {synthetic_text(rng, 300)}",
+                        "summary", [], USER_ID, detected_language='es', translation_pending=True)
+            for _ in range(args.batch)
+        ]
+
+    return [{"label": "batch", "prepare": prepare, "run": lambda: translator._translate_batch(batch),
+             "units": args.batch}], 'memories/s'
+
+
+def save_stage(args, manifest, rng):
+    from memory_processor.memory_store import save_memory
+    counter = itertools.count()
+    audio = manifest['audio'][1]
+
+    def run():
+        text = f"Recording {next(counter)}. {synthetic_text(rng, 600)}"
+        words = text.split()
+        segments = [{"start": i * 2.0, "end": i * 2.0 + 2, "text": ' '.join(words[i * 5:i * 5 + 5])}
+                    for i in range(len(words) // 5)]
+        save_memory(audio['path'], text, ' '.join(words[:40]), [], USER_ID,
+                    segments=segments, duration=audio['seconds'])
+
+    return [{"label": "memory", "run": run, "units": 1} for _ in range(args.batch)], 'memories/s'
+
+
+def search_stage(args, manifest, rng):
+    from memory_processor import trigram_index, vector_index
+    from memory_processor.memory_store import get_collection, search_memory
+    # The archive is bulk loaded (as the index rebuild tools do); one save_memory
+    # per document would spend minutes in the stand-in's unindexed upserts
+    memories = []
+    for i in range(args.corpus):
+        text = synthetic_text(rng, 120)
+        memories.append({"user_id": USER_ID, "filename": f"bench_{i}.wav", "transcript": f"Recording {i}. {text}",
+                         "translated_transcript": None, "summary": ' '.join(text.split()[:20]), "keyframes": []})
+    get_collection().insert_many(memories)
+    trigram_index.rebuild_user_index(USER_ID, memories)
+    vector_index.rebuild_user_index(USER_ID, ((m['_id'], m['summary'], m['transcript']) for m in memories))
+    return [
+        {"label": query, "run": lambda query=query: search_memory(query, USER_ID), "units": 1}
+        for query in QUERIES
+    ], 'queries/s'
+
+
+STAGE_SETUP = {
+    'transcribe': transcribe_stage,
+    'keyframes': keyframes_stage,
+    'summarize': summarize_stage,
+    'summarize_local': summarize_local_stage,
+    'translate': translate_stage,
+    'save': save_stage,
+    'search': search_stage,
+}
+
+
+# --- Measurement ---------------------------------------------------------------
+
+def peak_rss_mb():
+    """Peak RSS of this process and of its (waited-for) child processes."""
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024   # bytes on macOS, KiB on Linux
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / scale
+
+
+def run_stage(stage, args):
+    """Runs inside the stage's own interpreter; returns the stage's measurements."""
+    with open(os.path.join(args.workdir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    install_stand_ins(args, args.workdir)
+    rng = np.random.default_rng(args.seed + STAGES.index(stage))
+
+    try:
+        items, unit = STAGE_SETUP[stage](args, manifest, rng)
+    except StageSkipped as e:
+        return {"stage": stage, "skipped": str(e)}
+
+    # One untimed pass loads models and fills first-use caches
+    for item in items:
+        if item.get('prepare'):
+            item['prepare']()
+        item['run']()
+    setup_rss = peak_rss_mb()
+
+    samples, units = [], 0
+    for _ in range(args.repeats):
+        for item in items:
+            if item.get('prepare'):
+                item['prepare']()
+            started = time.perf_counter()
+            item['run']()
+            samples.append(time.perf_counter() - started)
+            units += item['units']
+
+    p50, p95, p99 = np.percentile(np.array(samples) * 1000, [50, 95, 99])
+    return {
+        "stage": stage,
+        "operations": len(samples),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "throughput": round(units / sum(samples), 2),
+        "unit": unit,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rss_growth_mb": round(peak_rss_mb() - setup_rss, 1),
+    }
+
+
+def stage_env(args):
+    """Environment of a stage process: everything it writes goes to the scratch directory."""
+    scratch = lambda name: os.path.join(args.workdir, name)
+    env = dict(
+        os.environ,
+        METRICS_DIR=scratch('metrics'),
+        PROFILE_DIR=scratch('profiles'),
+        VECTOR_INDEX_DIR=scratch('vector_index'),
+        JOBS_DB_PATH=scratch('jobs.sqlite3'),
+        LONG_FORM_MIN_SECONDS=str(2 * args.media_seconds),
+        SUMMARY_MODE='gemini',
+        # The request budget is a production safeguard; here it would only measure the sleep
+        SUMMARY_REQUESTS_PER_MINUTE='1000000',
+    )
+    if args.mongo_uri:
+        env.update(MONGO_ATLAS_URI=args.mongo_uri, MONGO_DB_NAME='memory_bench')
+    return env
+
+
+def launch_stage(stage, args):
+    command = [sys.executable, os.path.abspath(__file__), '--child', stage, '--workdir', args.workdir,
+               '--repeats', str(args.repeats), '--seed', str(args.seed), '--batch', str(args.batch),
+               '--corpus', str(args.corpus), '--media-seconds', str(args.media_seconds),
+               '--gemini-latency', str(args.gemini_latency), '--translate-latency', str(args.translate_latency)]
+    if args.stub_models:
+        command.append('--stub-models')
+    if args.mongo_uri:
+        command += ['--mongo-uri', args.mongo_uri]
+    result = subprocess.run(command, cwd=BACKEND_DIR, env=stage_env(args), capture_output=True, text=True)
+    for line in reversed(result.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    output = (result.stdout + result.stderr).strip().splitlines()
+    return {"stage": stage, "failed": '\n'.join(output[-15:]) or f"exit code {result.returncode}"}
+
+
+# --- Baselines -----------------------------------------------------------------
+
+def config(args):
+    """Options that change what is measured; baselines only compare under the same ones."""
+    return {
+        "repeats": args.repeats, "seed": args.seed, "batch": args.batch, "corpus": args.corpus,
+        "media_seconds": args.media_seconds, "gemini_latency": args.gemini_latency,
+        "translate_latency": args.translate_latency, "stub_models": args.stub_models,
+        "mongo": 'uri' if args.mongo_uri else 'mongomock',
+    }
+
+
+def compare(results, baseline, tolerance, rss_tolerance):
+    """Print the change against the baseline per stage; returns the regressions."""
+    regressions = []
+    previous = {result['stage']: result for result in baseline['results']}
+    print(f"\n{'stage':<16}{'p50 change':>12}{'p95 change':>12}{'RSS change':>12}")
+    for result in results:
+        before = previous.get(result['stage'])
+        if 'p50_ms' not in result or before is None or 'p50_ms' not in before:
+            print(f"{result['stage']:<16}{'not compared':>12}")
+            continue
+        changes = []
+        for field, allowed, slack in (('p50_ms', tolerance, LATENCY_SLACK_MS),
+                                      ('p95_ms', tolerance, LATENCY_SLACK_MS),
+                                      ('peak_rss_mb', rss_tolerance, RSS_SLACK_MB)):
+            change = result[field] / before[field] - 1 if before[field] else 0.0
+            changes.append(f"{change * 100:+.1f}%")
+            if change > allowed and result[field] - before[field] > slack:
+                regressions.append(f"{result['stage']} {field}: {before[field]} -> {result[field]}")
+        print(f"{result['stage']:<16}" + ''.join(f"{change:>12}" for change in changes))
+    return regressions
+
+
+def print_results(results):
+    print(f"{'stage':<16}{'ops':>6}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}"
+          f"{'throughput':>22}{'peak RSS (MB)':>15}")
+    for result in results:
+        if 'p50_ms' not in result:
+            reason = result.get('skipped') and f"skipped: {result['skipped']}" or 'FAILED'
+            print(f"{result['stage']:<16}  {reason}")
+            continue
+        throughput = f"{result['throughput']:.1f} {result['unit']}"
+        print(f"{result['stage']:<16}{result['operations']:>6}{result['p50_ms']:>11.1f}{result['p95_ms']:>11.1f}"
+              f"{result['p99_ms']:>11.1f}{throughput:>22}{result['peak_rss_mb']:>15.0f}")
+    for result in results:
+        if 'failed' in result:
+            print(f"\n--- {result['stage']} failed ---\n{result['failed']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', default=','.join(STAGES), help='comma-separated subset of the stages')
+    parser.add_argument('--repeats', type=int, default=5, help='timed passes over each stage\'s work items')
+    parser.add_argument('--seed', type=int, default=1234, help='seed for fixtures and synthetic text')
+    parser.add_argument('--media-seconds', type=int, default=60, help='length of the speech and video fixtures')
+    parser.add_argument('--batch', type=int, default=5, help='memories per save pass and per translation batch')
+    parser.add_argument('--corpus', type=int, default=300, help='memories in the archive the search stage queries')
+    parser.add_argument('--gemini-latency', type=float, default=0.2, help='seconds per stand-in Gemini call')
+    parser.add_argument('--translate-latency', type=float, default=0.1, help='seconds per stand-in googletrans call')
+    parser.add_argument('--stub-models', action='store_true', help='replace Whisper and the embedding model as well')
+    parser.add_argument('--mongo-uri', help='use this MongoDB server instead of mongomock')
+    parser.add_argument('--workdir', help='scratch directory (default: a temporary one, removed afterwards)')
+    parser.add_argument('--save-baseline', metavar='PATH', help='write the results as a baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare with a baseline; exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p50/p95 latency increase (0.2 = 20%%)')
+    parser.add_argument('--rss-tolerance', type=float, default=0.2, help='allowed peak RSS increase')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_stage(args.child, args)
+        if args.mongo_uri:
+            from memory_processor import db
+            db.get_client().drop_database('memory_bench')
+        print(RESULT_PREFIX + json.dumps(result))
+        return 0
+
+    stages = args.stages.split(',')
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['config'] != config(args):
+            print(f"Baseline {args.compare} was recorded with different options: {baseline['config']}")
+            return 1
+
+    temporary = args.workdir is None
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix='memory-bench-')
+    os.makedirs(args.workdir, exist_ok=True)
+    try:
+        manifest = build_fixtures(args.workdir, args.seed, args.media_seconds, long_form=not args.stub_models)
+        with open(os.path.join(args.workdir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+        results = []
+        for stage in stages:
+            print(f"[Benchmark] Running {stage}...", flush=True)
+            results.append(launch_stage(stage, args))
+    finally:
+        if temporary:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+
+    print()
+    print_results(results)
+    failed = any('failed' in result for result in results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({"config": config(args), "machine": platform.node(), "python": platform.python_version(),
+                       "recorded": time.strftime('%Y-%m-%d %H:%M:%S'), "results": results}, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.rss_tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + '\n  '.join(regressions))
+            return 1
+        print("\nNo regressions against the baseline.")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Startup cost of the web app in each process role.
+
+Each scenario runs in a fresh interpreter and reports the wall time to import
+app.py and the peak resident memory of that process:
+
+  api             APP_ROLE=api: what a web worker serving /login, /search and
+                  /memories pays; no ML imports, no Mongo or index work
+  all             APP_ROLE=all: API plus in-process ingestion workers (imports
+                  the ingestion stack, model still loads on first job)
+  all+model       APP_ROLE=all and the transcription model loaded, i.e. what
+                  every web worker paid when the model loaded at import time
+
+Usage (from backend/):
+    python benchmarks/startup_time.py [--runs 3]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import resource, sys, time
+started = time.perf_counter()
+import app
+if sys.argv[1] == 'model':
+    from memory_processor.transcription_engines import get_engine
+    get_engine()
+elapsed = time.perf_counter() - started
+heavy = sorted(m for m in ('torch', 'whisper', 'cv2', 'librosa', 'google.generativeai') if m in sys.modules)
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, ','.join(heavy) or '-')
+"""
+
+SCENARIOS = [
+    ('api', {'APP_ROLE': 'api'}, 'none'),
+    ('all', {'APP_ROLE': 'all', 'INGEST_WORKERS': '0'}, 'none'),
+    ('all+model', {'APP_ROLE': 'all', 'INGEST_WORKERS': '0'}, 'model'),
+]
+
+
+def measure(env_overrides, mode):
+    env = dict(os.environ, **env_overrides)
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE, mode], cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Probe failed:\n{result.stderr.strip()}")
+    output = result.stdout.strip().splitlines()[-1]
+    seconds, max_rss_kb, heavy = output.split()
+    return float(seconds), int(max_rss_kb) / 1024, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3, help='runs per scenario (best time is reported)')
+    parser.add_argument('--scenarios', default=','.join(name for name, _, _ in SCENARIOS))
+    args = parser.parse_args()
+
+    wanted = args.scenarios.split(',')
+    print(f"{'scenario':<12}{'import (s)':>12}{'peak RSS (MB)':>16}  heavy modules loaded")
+    for name, env, mode in SCENARIOS:
+        if name not in wanted:
+            continue
+        runs = [measure(env, mode) for _ in range(args.runs)]
+        seconds = min(run[0] for run in runs)
+        rss = max(run[1] for run in runs)
+        print(f"{name:<12}{seconds:>12.2f}{rss:>16.0f}  {runs[0][2]}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Compare transcription engines and model sizes on a fixed local audio set.
+
+Every audio file in the directory is decoded once (16 kHz mono); a text file
+with the same name (e.g. meeting.wav + meeting.txt) is used as the reference
+transcript for word error rate. Reports the real-time factor (processing time
+divided by audio duration, lower is faster) and WER for each combination.
+
+Usage (from backend/):
+    python benchmarks/transcription_benchmark.py bench_audio/ \
+        --engines whisper,whisper-int8,faster-whisper --sizes base,small,medium
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_processor.audio_transcriber import decode_audio
+from memory_processor.transcription_engines import ENGINES, benchmark_engine, get_engine
+
+AUDIO_EXTENSIONS = {'.wav', '.mp3', '.m4a', '.flac', '.ogg', '.mp4', '.mov', '.mkv'}
+
+
+def load_samples(directory):
+    samples = []
+    for entry in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(entry)
+        if ext.lower() not in AUDIO_EXTENSIONS:
+            continue
+        reference_path = os.path.join(directory, stem + '.txt')
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path, encoding='utf-8') as f:
+                reference = f.read()
+        samples.append((entry, decode_audio(os.path.join(directory, entry)), reference))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('audio_dir')
+    parser.add_argument('--engines', default='whisper,whisper-int8', help=f"comma-separated, from: {', '.join(ENGINES)}")
+    parser.add_argument('--sizes', default='medium', help='comma-separated Whisper model sizes')
+    parser.add_argument('--task', default='transcribe', choices=['transcribe', 'translate'],
+                        help='use transcribe when references are in the spoken language')
+    parser.add_argument('--json', help='also write the full results to this file')
+    args = parser.parse_args()
+
+    samples = load_samples(args.audio_dir)
+    if not samples:
+        print(f"No audio files found in {args.audio_dir}")
+        return 1
+
+    results = []
+    print(f"{'engine':<16}{'size':<10}{'RTF':>8}{'WER':>8}")
+    for name in args.engines.split(','):
+        for size in args.sizes.split(','):
+            engine = get_engine(name, size)
+            result = benchmark_engine(engine, samples, task=args.task)
+            results.append(result)
+            wer = f"{result['wer'] * 100:.1f}%" if result['wer'] is not None else 'n/a'
+            print(f"{name:<16}{size:<10}{result['rtf']:>8.3f}{wer:>8}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Substring search latency: trigram postings vs. the old regex collection scan.
+
+Fills a throwaway user with synthetic memories at each archive size, builds
+the trigram postings, then times both paths for a set of substring and
+misspelled queries. The benchmark user's data is removed afterwards.
+
+Usage (from backend/; uses MONGO_ATLAS_URI, or an in-memory mongomock
+database with --mongomock):
+    python benchmarks/trigram_search.py [--sizes 1000,10000,100000] [--words 80] [--mongomock]
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_processor import db, memory_store, trigram_index
+
+USER_ID = 'benchmark-trigram'
+VOCABULARY = (
+    "budget finance meeting quarter revenue project design review travel family birthday dinner "
+    "holiday weather garden music concert lecture chapter history science experiment result "
+    "deadline contract invoice schedule interview hospital doctor recipe kitchen football"
+).split()
+SYLLABLES = "ka lo mi ren tus vel dor pha qui zen bra sto gil fre wun ost yar pen cul".split()
+QUERIES = ["budget", "udge", "quarter revenue", "finanse", "birthdya dinner", "zebra"]
+REPEATS = 5
+
+
+def synthetic_vocabulary(rng, size=5000):
+    """The real words queried for, plus made-up words so trigrams are as varied as in speech."""
+    made_up = {''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(size)}
+    return VOCABULARY + sorted(made_up)
+
+
+def synthetic_memories(count, words, vocabulary, rng):
+    for i in range(count):
+        text = ' '.join(rng.choice(vocabulary) for _ in range(words))
+        yield {
+            "user_id": USER_ID,
+            "filename": f"bench_{i}.mp3",
+            "transcript": text,
+            "translated_transcript": None,
+            "summary": ' '.join(text.split()[:12]),
+            "keyframes": [],
+            "upload_date": datetime.now(),
+        }
+
+
+def regex_search(query):
+    """The pre-trigram fallback: three unanchored regexes over every document."""
+    pattern = re.escape(query)
+    return list(memory_store.get_collection().find({
+        "user_id": USER_ID,
+        "$or": [
+            {"transcript": {"$regex": pattern, "$options": "i"}},
+            {"translated_transcript": {"$regex": pattern, "$options": "i"}},
+            {"summary": {"$regex": pattern, "$options": "i"}},
+        ]
+    }, {"_id": 1}))
+
+
+def trigram_search(query):
+    return trigram_index.search(USER_ID, query)
+
+
+def time_query(search, query):
+    samples = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        hits = search(query)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000, len(hits)
+
+
+def cleanup():
+    memory_store.get_collection().delete_many({"user_id": USER_ID})
+    memory_store.get_db()[trigram_index.COLLECTION].delete_many({"user_id": USER_ID})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--words', type=int, default=80, help='words per synthetic transcript')
+    parser.add_argument('--mongomock', action='store_true', help='run against an in-memory database')
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        db._client = mongomock.MongoClient()
+
+    rng = random.Random(0)
+    vocabulary = synthetic_vocabulary(rng)
+    try:
+        for size in (int(s) for s in args.sizes.split(',')):
+            cleanup()
+            for start in range(0, size, 1000):
+                batch = list(synthetic_memories(min(1000, size - start), args.words, vocabulary, rng))
+                memory_store.get_collection().insert_many(batch)
+            started = time.perf_counter()
+            trigram_index.rebuild_user_index(
+                USER_ID, memory_store.get_collection().find({"user_id": USER_ID}, {f: 1 for f in trigram_index.INDEXED_FIELDS})
+            )
+            build_seconds = time.perf_counter() - started
+
+            print(f"\n=== {size} memories ({args.words} words each), postings built in {build_seconds:.1f}s ===")
+            print(f"{'query':<20}{'regex ms':>10}{'hits':>8}{'trigram ms':>12}{'hits':>8}{'speedup':>9}")
+            for query in QUERIES:
+                regex_ms, regex_hits = time_query(regex_search, query)
+                trigram_ms, trigram_hits = time_query(trigram_search, query)
+                print(f"{query:<20}{regex_ms:>10.1f}{regex_hits:>8}{trigram_ms:>12.1f}{trigram_hits:>8}"
+                      f"{regex_ms / max(trigram_ms, 1e-6):>8.1f}x")
+    finally:
+        cleanup()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
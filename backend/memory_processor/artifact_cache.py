@@ -0,0 +1,46 @@
+import os
+from datetime import datetime
+from memory_processor.memory_store import get_db, FRAMES_FOLDER
+from memory_processor.transcription_engines import TRANSCRIBE_ENGINE, WHISPER_MODEL_SIZE
+
+# Derived artifacts are only reusable if they were produced by the same
+# pipeline, so the cache key includes the content hash and this version.
+# Bump PIPELINE_REVISION whenever a stage changes its output.
+PIPELINE_REVISION = 5
+PIPELINE_VERSION = f"{PIPELINE_REVISION}-{TRANSCRIBE_ENGINE}-{WHISPER_MODEL_SIZE}"
+
+def _cache_collection():
+    return get_db()['artifact_cache']
+
+def _key(content_hash):
+    return f"{content_hash}:{PIPELINE_VERSION}"
+
+def lookup(content_hash):
+    """
+    Return cached artifacts for this content, or None. Keyframes are dropped
+    from the hit if any of their files has since been deleted, so the caller
+    re-extracts them instead of referencing missing frames.
+    """
+    entry = _cache_collection().find_one({"_id": _key(content_hash)})
+    if entry is None:
+        return None
+
+    frames = entry.get('keyframes', []) + ([entry['contact_sheet']['file']] if entry.get('contact_sheet') else [])
+    if not all(os.path.exists(os.path.join(FRAMES_FOLDER, frame)) for frame in frames):
+        entry.pop('keyframes', None)
+        entry.pop('keyframe_times', None)
+        entry.pop('contact_sheet', None)
+    return entry
+
+def store(content_hash, artifacts):
+    """
+    Remember a finished pipeline's outputs (transcript, summary,
+    translated_transcript, detected_language, segments, keyframes, ...) for this content.
+    """
+    document = dict(artifacts)
+    document.update({
+        "content_hash": content_hash,
+        "pipeline_version": PIPELINE_VERSION,
+        "updated_at": datetime.now(),
+    })
+    _cache_collection().replace_one({"_id": _key(content_hash)}, document, upsert=True)
@@ -0,0 +1,182 @@
+"""
+Background cleanup of deleted memories' artifacts.
+
+Deleting a memory only removes its document and its transcript segments
+(indexed writes, so segment search never returns a deleted memory); the
+upload file, frame files and search index entries are handed to a
+collector thread in the same process. Work queued there is lost if the
+process dies, so a periodic sweep (run by worker processes) also removes
+files in uploads/ and frames/ that no memory, job or upload session refers
+to any more, segments of memories that no longer exist, and stale upload
+sessions. Files younger than GC_GRACE_SECONDS are never swept, so uploads
+and frames still being processed are safe. To sweep once by hand, run from
+backend/:
+    python -m memory_processor.artifact_gc --sweep [--dry-run]
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from bson import ObjectId
+from memory_processor import job_queue, trigram_index, vector_index
+from memory_processor.frame_files import frame_variants
+from memory_processor.memory_store import FRAMES_FOLDER, get_db, release_frames
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'uploads')
+GC_SWEEP_INTERVAL = float(os.environ.get('GC_SWEEP_INTERVAL', 3600))
+GC_GRACE_SECONDS = float(os.environ.get('GC_GRACE_SECONDS', 24 * 3600))
+
+# Fields of a deleted memory the cleanup (and the stats update) needs
+CLEANUP_FIELDS = {
+    "user_id": 1, "filepath": 1, "keyframes": 1, "contact_sheet": 1, "duration": 1, "storage_bytes": 1,
+    "detected_language": 1, **{field: 1 for field in trigram_index.INDEXED_FIELDS},
+}
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def cleanup_memory(memory):
+    """Remove everything derived from a deleted memory document."""
+    if memory.get('filepath'):
+        _remove(memory['filepath'])
+    # Keyframes are only deleted once no other memory shares them
+    contact_sheet = memory.get('contact_sheet')
+    release_frames(memory.get('keyframes', []) + ([contact_sheet['file']] if contact_sheet else []))
+    trigram_index.remove_memory(memory)
+    vector_index.remove_memory(memory['user_id'], memory['_id'])
+
+class Collector:
+    """Cleans up deleted memories on a background thread, in deletion order."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def schedule(self, memories):
+        for memory in memories:
+            self.queue.put(memory)
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='artifact-gc', daemon=True)
+                self.thread.start()
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def _run(self):
+        while True:
+            memory = self.queue.get()
+            try:
+                cleanup_memory(memory)
+            except Exception as e:
+                # Anything left behind is picked up by the next sweep
+                print(f"[Artifact GC] Cleanup of memory {memory['_id']} failed: {e}")
+
+collector = Collector()
+
+def schedule_cleanup(memories):
+    """Queue deleted memory documents (with CLEANUP_FIELDS) for background cleanup."""
+    collector.schedule(memories)
+
+# --- Orphan sweep ----------------------------------------------------------
+
+def _old_files(folder, cutoff):
+    try:
+        entries = list(os.scandir(folder))
+    except FileNotFoundError:
+        return []
+    return [entry for entry in entries if entry.is_file() and entry.stat().st_mtime < cutoff]
+
+def sweep(grace=GC_GRACE_SECONDS, dry_run=False):
+    """Remove unreferenced upload and frame files, orphaned segments and stale upload sessions."""
+    from memory_processor import upload_sessions
+    cutoff = time.time() - grace
+    db = get_db()
+    removed = {"uploads": 0, "frames": 0, "segments": 0}
+
+    if not dry_run:
+        upload_sessions.expire_stale_sessions()
+
+    referenced_uploads, referenced_frames, memory_ids = set(), set(), set()
+    for memory in db['memories'].find({}, {"filepath": 1, "keyframes": 1, "contact_sheet": 1}):
+        memory_ids.add(memory['_id'])
+        if memory.get('filepath'):
+            referenced_uploads.add(os.path.basename(memory['filepath']))
+        for frame in memory.get('keyframes', []) + ([memory['contact_sheet']['file']] if memory.get('contact_sheet') else []):
+            referenced_frames.update(frame_variants(frame))
+    for ref in db['frame_refs'].find({"refs": {"$gt": 0}}, {"_id": 1}):
+        referenced_frames.update(frame_variants(ref['_id']))
+    # Jobs still queued or running, and unfinished resumable uploads
+    active = job_queue._connect().execute(
+        "SELECT filepath FROM jobs WHERE status IN ('queued', 'processing')"
+    ).fetchall()
+    referenced_uploads.update(os.path.basename(row['filepath']) for row in active)
+    sessions = upload_sessions._connect().execute(
+        "SELECT filepath FROM upload_sessions WHERE status IN ('uploading', 'complete')"
+    ).fetchall()
+    referenced_uploads.update(os.path.basename(row['filepath']) for row in sessions)
+
+    for folder, referenced, kind in ((UPLOAD_FOLDER, referenced_uploads, "uploads"),
+                                     (FRAMES_FOLDER, referenced_frames, "frames")):
+        for entry in _old_files(folder, cutoff):
+            if entry.name in referenced or entry.name.startswith('.'):
+                continue
+            if not dry_run:
+                _remove(entry.path)
+            removed[kind] += 1
+
+    # Deletes interrupted between claiming and removing their memories: release the claim
+    stale_claim = ObjectId.from_datetime(datetime.fromtimestamp(time.time() - 600, timezone.utc))
+    if not dry_run:
+        db['memories'].update_many({"deleting": {"$lt": stale_claim}}, {"$unset": {"deleting": ""}})
+
+    orphaned = [memory_id for memory_id in db['memory_segments'].distinct('memory_id') if memory_id not in memory_ids]
+    if orphaned:
+        if not dry_run:
+            db['memory_segments'].delete_many({"memory_id": {"$in": orphaned}})
+        removed['segments'] = len(orphaned)
+
+    print(f"[Artifact GC] Sweep {'(dry run) ' if dry_run else ''}removed {removed['uploads']} uploads, "
+          f"{removed['frames']} frame files, segments of {removed['segments']} memories")
+    return removed
+
+_sweeper = None
+
+def start_sweeper(interval=GC_SWEEP_INTERVAL):
+    """Run the orphan sweep every `interval` seconds in this process (once per process)."""
+    global _sweeper
+    if _sweeper is not None or interval <= 0:
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                sweep()
+            except Exception as e:
+                print(f"[Artifact GC] Sweep failed: {e}")
+
+    _sweeper = threading.Thread(target=loop, name='artifact-sweeper', daemon=True)
+    _sweeper.start()
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove files and records left behind by deleted memories")
+    parser.add_argument('--sweep', action='store_true', help='sweep orphaned files and segments once')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would be removed')
+    parser.add_argument('--grace', type=float, default=GC_GRACE_SECONDS, help='ignore files younger than this (seconds)')
+    args = parser.parse_args()
+    if not args.sweep:
+        parser.print_help()
+        return 1
+    sweep(grace=args.grace, dry_run=args.dry_run)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
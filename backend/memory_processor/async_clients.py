@@ -0,0 +1,85 @@
+"""
+Non-blocking HTTP clients for the network calls made while ingesting:
+Gemini summaries (SUMMARY_CLIENT=http) and translation (TRANSLATION_CLIENT=http).
+
+Each process runs one asyncio event loop on a background thread with one
+pooled httpx.AsyncClient. Synchronous code (pipeline stages, the background
+translator) hands it coroutines with run(), so concurrent requests share
+the loop instead of each holding a thread while waiting on the network: all
+chunk prompts of a map-reduce summary and all text pieces of a translation
+batch are in flight together, sent from one thread.
+"""
+import asyncio
+import os
+import threading
+from collections import namedtuple
+
+GEMINI_API_URL = os.environ.get('GEMINI_API_URL', 'https://generativelanguage.googleapis.com/v1beta')
+TRANSLATE_API_URL = os.environ.get('TRANSLATE_API_URL', 'https://translate.googleapis.com/translate_a/single')
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', 60))
+# Translation requests in flight at once, per process
+TRANSLATE_CONCURRENCY = int(os.environ.get('TRANSLATE_CONCURRENCY', 8))
+
+# Same fields googletrans returns
+Translation = namedtuple('Translation', ['text', 'src'])
+
+class TooManyRequests(Exception):
+    """HTTP 429 from an upstream API (the summarizer backs off on this)."""
+
+_loop = None
+_loop_lock = threading.Lock()
+_client = None
+_translate_slots = None
+
+def _get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='async-io', daemon=True).start()
+    return _loop
+
+def run(coro, timeout=None):
+    """Run a coroutine on the I/O loop from synchronous code and return its result."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
+
+def _http():
+    # Created on the I/O loop, on first use
+    global _client
+    if _client is None:
+        import httpx
+        _client = httpx.AsyncClient(timeout=HTTP_TIMEOUT)
+    return _client
+
+def _check(response):
+    if response.status_code == 429:
+        raise TooManyRequests(f"429 Too Many Requests: {response.text[:200]}")
+    response.raise_for_status()
+    return response.json()
+
+async def gemini_generate(model, api_key, prompt):
+    """Text of Gemini's answer to one prompt (generateContent REST call)."""
+    data = _check(await _http().post(
+        f"{GEMINI_API_URL}/models/{model}:generateContent",
+        params={"key": api_key},
+        json={"contents": [{"parts": [{"text": prompt}]}]},
+    ))
+    try:
+        return ''.join(part.get('text', '') for part in data['candidates'][0]['content']['parts'])
+    except (KeyError, IndexError):
+        return ''
+
+async def _translate_one(text, dest):
+    async with _translate_slots:
+        data = _check(await _http().get(
+            TRANSLATE_API_URL, params={"client": "gtx", "sl": "auto", "tl": dest, "dt": "t", "q": text}
+        ))
+    # [[[translated, original, ...], ...], None, source_language, ...]
+    return Translation(''.join(sentence[0] for sentence in data[0] if sentence[0]), data[2])
+
+async def translate(texts, dest='en'):
+    """Translate texts concurrently (at most TRANSLATE_CONCURRENCY requests at a time), in order."""
+    global _translate_slots
+    if _translate_slots is None:
+        _translate_slots = asyncio.Semaphore(TRANSLATE_CONCURRENCY)
+    return await asyncio.gather(*(_translate_one(text, dest) for text in texts))
@@ -0,0 +1,116 @@
+"""
+Async read paths of the memory store, for the ASGI app (asgi_app.py).
+
+Listing, search, stats and version lookups query Mongo through the process's
+AsyncMongoClient, so a request waiting on the database holds no thread.
+Ranking, snippets and cursors reuse memory_store's helpers, so results are
+identical to the Flask app's. Embedding a query is CPU work and runs in a
+worker thread; writes (saves, deletes) stay on the synchronous store.
+"""
+import asyncio
+import re
+from bson import ObjectId
+from memory_processor import db, memory_store, trigram_index, user_stats
+
+_indexes_ready = False
+
+async def _collection(name):
+    """An async collection handle, creating the indexes once per process (with the sync client)."""
+    global _indexes_ready
+    if not _indexes_ready:
+        await asyncio.to_thread(memory_store.ensure_indexes)
+        _indexes_ready = True
+    return db.get_async_db()[name]
+
+async def get_user_version(user_id):
+    """Async memory_store.get_user_version."""
+    state = await db.get_async_db()['user_state'].find_one({"_id": user_id}, {"version": 1})
+    return state['version'] if state else 0
+
+async def iter_user_memories(user_id, limit=None, cursor=None, projection=None):
+    """
+    Async cursor over a user's memories, newest first (see
+    memory_store.iter_user_memories). Raises ValueError for a bad cursor
+    before any query is sent.
+    """
+    query, projection = memory_store.listing_query(user_id, cursor, projection)
+    results = (await _collection('memories')).find(query, projection).sort(memory_store.LISTING_SORT)
+    if limit:
+        results = results.limit(limit)
+    return results
+
+async def _trigram_search(user_id, query):
+    grams = trigram_index.query_trigrams(query)
+    if not grams:
+        return []
+    postings = await db.get_async_db()[trigram_index.COLLECTION].find(
+        {"user_id": user_id, "gram": {"$in": list(grams)}}, {"gram": 1, "memory_ids": 1}
+    ).to_list(None)
+    return trigram_index.rank_postings(grams, postings)
+
+async def _text_matches(query, user_id, projection=None):
+    memories = await _collection('memories')
+    try:
+        results = await memories.find(
+            {"user_id": user_id, "$text": {"$search": query}},
+            dict(projection or {}, score={"$meta": "textScore"})
+        ).sort([("score", {"$meta": "textScore"})]).to_list(None)
+    except Exception as e:
+        print(f"[Memory Store] Text search failed, using the trigram index: {e}")
+        results = []
+
+    if not results:
+        similarities = dict(await _trigram_search(user_id, query))
+        results = await memories.find(
+            {"_id": {"$in": list(similarities)}, "user_id": user_id}, projection
+        ).to_list(None)
+        for memory in results:
+            memory['score'] = similarities[memory['_id']]
+    return memory_store.scale_text_scores(results)
+
+async def search_memory(query, user_id, projection=None):
+    """Async memory_store.search_memory: keyword and semantic matches, ranked by the hybrid score."""
+    if memory_store.SEMANTIC_SEARCH:
+        # The query is embedded in a thread while the keyword search waits on Mongo
+        matches, similar = await asyncio.gather(
+            _text_matches(query, user_id, projection),
+            asyncio.to_thread(memory_store.semantic_matches, query, user_id),
+        )
+    else:
+        matches, similar = await _text_matches(query, user_id, projection), {}
+
+    missing = [ObjectId(memory_id) for memory_id in similar if memory_id not in matches]
+    if missing:
+        memories = await _collection('memories')
+        async for memory in memories.find({"_id": {"$in": missing}, "user_id": user_id}, projection):
+            matches[str(memory['_id'])] = (memory, 0.0)
+
+    memories = memory_store.rank_matches(matches, similar)
+    print(f"[Memory Store] Found {len(memories)} memories for user {user_id} matching query: '{query}' "
+          f"({len(similar)} semantic)")
+    return memories
+
+async def search_segments(query, user_id, limit=20):
+    """Async memory_store.search_segments."""
+    segments = await _collection('memory_segments')
+    try:
+        results = await segments.find(
+            {"user_id": user_id, "$text": {"$search": query}},
+            {"score": {"$meta": "textScore"}}
+        ).sort([("score", {"$meta": "textScore"})]).limit(limit).to_list(None)
+    except Exception:
+        results = await segments.find(
+            {"user_id": user_id, "text": {"$regex": re.escape(query), "$options": "i"}}
+        ).sort([("memory_id", -1), ("index", 1)]).limit(limit).to_list(None)
+
+    found = [memory_store.present_segment(segment, query) for segment in results]
+    print(f"[Memory Store] Found {len(found)} segments for user {user_id} matching query: '{query}'")
+    return found
+
+async def get_memory_stats(user_id):
+    """Async memory_store.get_memory_stats; a first-time rebuild runs in a thread."""
+    state = await db.get_async_db()['user_state'].find_one({"_id": user_id}, {"stats": 1}) or {}
+    stats = state.get('stats') or {}
+    if not stats.get('complete'):
+        return await asyncio.to_thread(user_stats.get_stats, user_id)
+    return user_stats.format_stats(stats)
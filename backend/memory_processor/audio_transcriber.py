@@ -1,47 +1,301 @@
-import whisper
-import librosa
+import multiprocessing
+import os
+import subprocess
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from memory_processor import job_queue, metrics
+from memory_processor.transcription_engines import get_engine
 
-# Load Whisper model once (global model load, not inside function)
-model = whisper.load_model("medium")
+# Whisper works on 16 kHz mono float32, so uploads are decoded once to that
+# format and the same buffer is shared by the silence check and the model.
+SAMPLE_RATE = 16000
+RMS_FRAME_LENGTH = 2048            # same analysis window librosa.feature.rms used
+SILENCE_BLOCK_SECONDS = 10         # RMS is evaluated this much audio at a time
 
-def is_audio_silent(filepath, threshold=-40):
+# Long-form mode: recordings at least this long are split at voice-activity
+# boundaries and the speech chunks are transcribed in parallel processes.
+LONG_FORM_MIN_SECONDS = float(os.environ.get('LONG_FORM_MIN_SECONDS', 600))
+# Model processes shared by all ingestion workers of this process. Each holds
+# one copy of the model, and with the pool enabled every transcription runs
+# there, so the worker process itself never loads one. Defaults to the
+# transcribe stage limit, the number of transcriptions allowed at once.
+# 0 transcribes in the calling thread (long-form chunks one by one).
+TRANSCRIBE_PROCESSES = int(os.environ.get('TRANSCRIBE_PROCESSES', job_queue.STAGE_LIMITS['transcribe']))
+MAX_CHUNK_SECONDS = 30             # Whisper's native window
+MAX_CHUNK_GAP_SECONDS = 2.0        # longer pauses start a new chunk and are dropped
+VAD_FRAME_SECONDS = 0.03
+VAD_THRESHOLD_DB = -45
+VAD_HANGOVER_SECONDS = 0.3         # keep a little audio around each speech burst
+VAD_MIN_SPEECH_SECONDS = 0.25
+
+def decode_audio(filepath, sr=SAMPLE_RATE):
+    """
+    Decode the first audio track of a file to mono float32 at `sr` Hz in a
+    single ffmpeg pass. Video streams are never decoded.
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-threads", "0",
+        "-i", filepath,
+        "-map", "0:a:0", "-vn", "-sn", "-dn",
+        "-ac", "1", "-ar", str(sr), "-f", "f32le", "-"
+    ]
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to decode audio: {result.stderr.decode(errors='ignore').strip()}")
+    return np.frombuffer(result.stdout, np.float32)
+
+def is_audio_silent(audio, threshold=-40):
     """
-    Checks if the audio file is silent or too quiet to process.
-    Uses RMS amplitude to calculate loudness.
+    Checks if the audio is silent or too quiet to process.
+    Walks the decoded samples block by block and stops at the first block
+    whose RMS loudness reaches the threshold. Accepts a decoded buffer or a
+    file path.
     """
     try:
-        y, sr = librosa.load(filepath, sr=None)
-        rms = librosa.feature.rms(y=y)[0]
-        max_rms_db = librosa.amplitude_to_db([max(rms)])[0]
+        if isinstance(audio, str):
+            audio = decode_audio(audio)
+
+        # Loudness threshold as a linear RMS amplitude (dB relative to full scale)
+        threshold_rms = 10 ** (threshold / 20)
+        block = SILENCE_BLOCK_SECONDS * SAMPLE_RATE // RMS_FRAME_LENGTH * RMS_FRAME_LENGTH
+        max_rms = 0.0
+
+        for start in range(0, len(audio), block):
+            frames = audio[start:start + block]
+            usable = len(frames) // RMS_FRAME_LENGTH * RMS_FRAME_LENGTH
+            if usable == 0:
+                frames = np.pad(frames, (0, RMS_FRAME_LENGTH - len(frames)))
+                usable = RMS_FRAME_LENGTH
+            frames = frames[:usable].reshape(-1, RMS_FRAME_LENGTH)
+            block_rms = float(np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1)).max())
+            max_rms = max(max_rms, block_rms)
+            if max_rms >= threshold_rms:
+                return False
 
-        print(f"[Audio Check] Max RMS (dB): {max_rms_db}")
-        return max_rms_db < threshold
+        max_rms_db = 20 * np.log10(max(max_rms, 1e-5))
+        print(f"[Audio Check] Max RMS (dB): {max_rms_db:.1f}")
+        return True
     except Exception as e:
         print(f"[Audio Check] Error checking silence: {e}")
         return False  # Assume not silent if check fails
 
-def transcribe_audio(filepath):
+def detect_speech_regions(audio, sr=SAMPLE_RATE):
+    """
+    Energy-based voice-activity detection. Returns (start, end) sample ranges
+    that contain speech; everything else is treated as silence.
+    """
+    frame = int(VAD_FRAME_SECONDS * sr)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return []
+
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms_db = 20 * np.log10(np.maximum(np.sqrt(np.mean(np.square(frames), axis=1)), 1e-5))
+
+    # Adapt to the recording: speech must clear both the absolute threshold
+    # and the noise floor (a low percentile of frame loudness) by 10 dB.
+    threshold = max(VAD_THRESHOLD_DB, float(np.percentile(rms_db, 10)) + 10)
+    speech = rms_db > threshold
+
+    # Hangover: extend every speech frame by a few frames on both sides
+    hangover = int(VAD_HANGOVER_SECONDS / VAD_FRAME_SECONDS)
+    if hangover:
+        speech = np.convolve(speech, np.ones(2 * hangover + 1), mode='same') > 0
+
+    edges = np.diff(np.concatenate(([0], speech.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    min_frames = int(VAD_MIN_SPEECH_SECONDS / VAD_FRAME_SECONDS)
+    return [(int(s) * frame, int(e) * frame) for s, e in zip(starts, ends) if e - s >= min_frames]
+
+def plan_chunks(regions, sr=SAMPLE_RATE):
+    """
+    Group speech regions into chunks of at most MAX_CHUNK_SECONDS. Pauses
+    longer than MAX_CHUNK_GAP_SECONDS end a chunk, so long silences are never
+    sent to the model; regions longer than a chunk are split.
+    """
+    max_len = MAX_CHUNK_SECONDS * sr
+    max_gap = int(MAX_CHUNK_GAP_SECONDS * sr)
+    chunks = []
+    current = None
+
+    for start, end in regions:
+        while end - start > max_len:
+            if current:
+                chunks.append(current)
+                current = None
+            chunks.append((start, start + max_len))
+            start += max_len
+
+        if current and start - current[1] <= max_gap and end - current[0] <= max_len:
+            current = (current[0], end)
+        else:
+            if current:
+                chunks.append(current)
+            current = (start, end)
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _init_chunk_worker(threads):
+    # Split the cores between pool processes instead of each grabbing them all
+    get_engine(threads=threads)
+
+def _transcribe_window(audio, translate=False):
     """
-    Transcribes audio to English, automatically detecting language and translating.
+    Transcribe in the spoken language. With `translate`, non-English speech
+    gets a second, local Whisper pass that translates it to English.
+    Returns (text, language, english_text_or_None, segments), where segments
+    are [{"start", "end", "text"}, ...] in seconds from the start of `audio`.
     """
-    if is_audio_silent(filepath):
-        return "Audio is too silent, please provide clearer audio."
+    engine = get_engine()
+    result = engine.transcribe(audio, task="transcribe")
+    text, language = result['text'], result['language']
+    segments = [
+        {"start": round(float(s['start']), 2), "end": round(float(s['end']), 2), "text": s['text'].strip()}
+        for s in result.get('segments', []) if s['text'].strip()
+    ]
+
+    english = None
+    if translate and text:
+        english = text if language == 'en' else engine.transcribe(audio, task="translate")['text']
+    return text, language, english, segments
+
+def _transcribe_chunk(audio_chunk, translate):
+    """Runs inside a pool process, using the engine loaded by the initializer."""
+    return _transcribe_window(audio_chunk, translate)
+
+_chunk_pool = None
+
+def _get_chunk_pool():
+    global _chunk_pool
+    if _chunk_pool is None:
+        threads = max(1, (os.cpu_count() or 1) // TRANSCRIBE_PROCESSES)
+        _chunk_pool = ProcessPoolExecutor(
+            max_workers=TRANSCRIBE_PROCESSES,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_chunk_worker,
+            initargs=(threads,)
+        )
+    return _chunk_pool
+
+def _engine_ready():
+    return get_engine().name
+
+def preload_engine():
+    """Load the model where transcriptions will run: in the pool processes, or here without a pool."""
+    if TRANSCRIBE_PROCESSES > 0:
+        pool = _get_chunk_pool()
+        for future in [pool.submit(_engine_ready) for _ in range(TRANSCRIBE_PROCESSES)]:
+            future.result()
+    else:
+        get_engine()
+
+def transcribe_long_form(audio, on_progress=None, translate=False):
+    """
+    Transcribe a long recording: drop silence, split the speech at
+    voice-activity boundaries and transcribe the chunks in parallel.
+    `on_progress(done, total, partial_text)` receives the transcript stitched
+    so far (in recording order) each time a chunk finishes.
+    Returns (transcript, detected_language, english_transcript_or_None, segments),
+    with segment times relative to the whole recording.
+    """
+    chunks = plan_chunks(detect_speech_regions(audio))
+    speech_seconds = sum(end - start for start, end in chunks) / SAMPLE_RATE
+    print(f"[Transcriber] Long-form: {len(chunks)} chunks, {speech_seconds:.0f}s of speech "
+          f"out of {len(audio) / SAMPLE_RATE:.0f}s")
+    if not chunks:
+        return "", "unknown", None, []
+
+    if TRANSCRIBE_PROCESSES > 0:
+        pool = _get_chunk_pool()
+        futures = {
+            pool.submit(_transcribe_chunk, audio[start:end], translate): i
+            for i, (start, end) in enumerate(chunks)
+        }
+        finished = ((futures[future], future.result()) for future in as_completed(futures))
+    else:
+        finished = ((i, _transcribe_window(audio[start:end], translate)) for i, (start, end) in enumerate(chunks))
+
+    texts = [None] * len(chunks)
+    english = [None] * len(chunks)
+    segments = [None] * len(chunks)
+    languages = Counter()
+    stitched = 0
+    done = 0
+    for index, (text, language, english_text, chunk_segments) in finished:
+        texts[index], english[index] = text, english_text
+        # Chunk segment times are relative to the chunk; shift them onto the recording
+        offset = chunks[index][0] / SAMPLE_RATE
+        segments[index] = [
+            {"start": round(s['start'] + offset, 2), "end": round(s['end'] + offset, 2), "text": s['text']}
+            for s in chunk_segments
+        ]
+        languages[language] += 1
+        done += 1
+
+        # Only the contiguous prefix is reported, so partial text reads in order
+        while stitched < len(texts) and texts[stitched] is not None:
+            stitched += 1
+        if on_progress:
+            on_progress(done, len(chunks), ' '.join(t for t in texts[:stitched] if t))
+
+    transcript = ' '.join(t for t in texts if t)
+    english_transcript = ' '.join(t for t in english if t) if translate else None
+    return transcript, languages.most_common(1)[0][0], english_transcript, [s for chunk in segments for s in chunk]
+
+def transcribe_audio(filepath, on_progress=None, translate=False):
+    """
+    Transcribes audio in its spoken language, keeping the language Whisper
+    detected. With `translate`, non-English audio is also translated to
+    English locally by Whisper (no network translator).
+    Recordings longer than LONG_FORM_MIN_SECONDS use the chunked long-form mode,
+    reporting partial transcripts through `on_progress`.
+
+    Returns {"transcript", "language", "translated_transcript", "duration", "segments"};
+    translated_transcript is None when no English text was produced here, and
+    segments are the timestamped pieces of the transcript.
+    """
+    def outcome(transcript, language="unknown", english=None, duration=0.0, segments=()):
+        return {"transcript": transcript, "language": language,
+                "translated_transcript": english, "duration": duration, "segments": list(segments)}
 
     try:
-        # Transcribe with Whisper (auto-detect language + translate to English)
-        result = model.transcribe(filepath, task="translate")
+        # Decode once; the same samples feed the silence check and Whisper
+        with metrics.stage_timer('decode'):
+            audio = decode_audio(filepath)
+    except Exception as e:
+        print(f"[Transcriber] Audio decoding failed: {e}")
+        return outcome(f"Transcription failed: {str(e)}")
 
-        english_transcript = result.get('text', '').strip()
-        detected_language = result.get('language', 'unknown')
+    duration = len(audio) / SAMPLE_RATE
+    with metrics.stage_timer('silence_check'):
+        silent = is_audio_silent(audio)
+    if silent:
+        return outcome("Audio is too silent, please provide clearer audio.", duration=duration)
+
+    try:
+        if len(audio) >= LONG_FORM_MIN_SECONDS * SAMPLE_RATE:
+            transcript, detected_language, english, segments = transcribe_long_form(audio, on_progress, translate)
+        else:
+            # Transcribe with Whisper (auto-detect language, keep the original wording)
+            if TRANSCRIBE_PROCESSES > 0:
+                window = _get_chunk_pool().submit(_transcribe_chunk, audio, translate).result()
+            else:
+                window = _transcribe_window(audio, translate)
+            transcript, detected_language, english, segments = window
 
         print(f"[Transcriber] Detected Language: {detected_language}")
-        print(f"[Transcriber] Transcription (English): {english_transcript}")
+        print(f"[Transcriber] Transcription: {transcript}")
 
-        if not english_transcript:
-            return "No speech detected in the audio."
+        if not transcript:
+            return outcome("No speech detected in the audio.", duration=duration)
 
-        return english_transcript
+        return outcome(transcript, detected_language, english, duration, segments)
 
     except Exception as e:
         print(f"[Transcriber] Transcription failed: {e}")
-        return f"Transcription failed: {str(e)}"
+        return outcome(f"Transcription failed: {str(e)}", duration=duration)
@@ -0,0 +1,75 @@
+import os
+import threading
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# One MongoClient per process, shared by the memory store, the auth layer
+# and the background services. The client is thread-safe and pools its
+# connections; size the pool to the threads that query concurrently
+# (web threads + ingestion workers + background translator).
+MONGO_URI = os.environ.get('MONGO_ATLAS_URI', 'mongodb://localhost:27017/')
+MONGO_DB_NAME = os.environ.get('MONGO_DB_NAME', 'memory_db')
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 50))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+MONGO_MAX_IDLE_MS = int(os.environ.get('MONGO_MAX_IDLE_MS', 300000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 10000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000))
+
+# Created on first use, not at import, so API-only processes start fast and
+# without network round trips
+_client = None
+_client_lock = threading.Lock()
+_async_client = None
+
+def _client_options():
+    return dict(
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        appname='memory-augmentation',
+    )
+
+def get_client():
+    """Return the process-wide MongoClient, connecting on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # MongoDB Atlas connection
+                _client = MongoClient(MONGO_URI, **_client_options())
+    return _client
+
+def get_db():
+    """Return the application database (memory_db)."""
+    return get_client()[MONGO_DB_NAME]
+
+def get_async_client():
+    """
+    Return the process-wide AsyncMongoClient used by the ASGI app, with the
+    same pool settings. It belongs to the event loop it is first used on, so
+    only call this from that loop.
+    """
+    global _async_client
+    if _async_client is None:
+        from pymongo import AsyncMongoClient
+        _async_client = AsyncMongoClient(MONGO_URI, **_client_options())
+    return _async_client
+
+def get_async_db():
+    """Async handle on the application database (memory_db)."""
+    return get_async_client()[MONGO_DB_NAME]
+
+def pool_stats():
+    """Configured pool limits, for diagnostics."""
+    return {
+        "max_pool_size": MONGO_MAX_POOL_SIZE,
+        "min_pool_size": MONGO_MIN_POOL_SIZE,
+        "max_idle_ms": MONGO_MAX_IDLE_MS,
+        "wait_queue_timeout_ms": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "connected": _client is not None,
+        "async_connected": _async_client is not None,
+    }
@@ -1,6 +1,10 @@
 import cv2
+import hashlib
+import heapq
+import numpy as np
 import os
-import uuid
+import threading
+from memory_processor.frame_files import FRAME_FORMAT, VARIANT_QUALITY, VARIANT_WIDTHS, variant_name
 
 # Set absolute path for frames folder to avoid relative path issues
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # This points to 'memory_processor'
@@ -9,33 +13,211 @@ FRAMES_FOLDER = os.path.join(BASE_DIR, '..', 'frames')
 # Ensure frames folder exists
 os.makedirs(FRAMES_FOLDER, exist_ok=True)
 
-def extract_keyframes(video_path):
+# Audio-only uploads have no frames; they are skipped without opening cv2
+AUDIO_EXTENSIONS = {'.mp3', '.wav', '.m4a', '.aac', '.flac', '.ogg'}
+
+# Sampling engine settings
+SAMPLE_INTERVAL_SECONDS = float(os.environ.get('KEYFRAME_SAMPLE_SECONDS', 0.5))   # inspect 2 frames per second
+SCENE_CHANGE_THRESHOLD = float(os.environ.get('KEYFRAME_SCENE_THRESHOLD', 0.30))  # histogram distance, 0..1
+MAX_GAP_SECONDS = float(os.environ.get('KEYFRAME_MAX_GAP_SECONDS', 60))            # keep one frame per long static shot
+DUPLICATE_HASH_DISTANCE = int(os.environ.get('KEYFRAME_DUPLICATE_DISTANCE', 6))    # dHash bits, out of 64
+MAX_KEYFRAMES = int(os.environ.get('MAX_KEYFRAMES', 24))
+SEEK_MIN_STRIDE = 90     # beyond this many frames, seeking is cheaper than grabbing
+HISTOGRAM_BINS = 32
+CONTACT_SHEET = os.environ.get('KEYFRAME_CONTACT_SHEET', '1') == '1'   # one sprite image per memory
+CONTACT_SHEET_COLUMNS = 6
+
+def is_audio_only(path):
+    return os.path.splitext(path)[1].lower() in AUDIO_EXTENSIONS
+
+def frame_signature(frame):
+    """
+    Cheap per-frame features on a downscaled grayscale copy:
+    a normalized intensity histogram and a 64-bit difference hash.
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (64, 36), interpolation=cv2.INTER_AREA)
+    histogram = np.bincount((small >> 3).ravel(), minlength=HISTOGRAM_BINS).astype(np.float32)
+    histogram /= histogram.sum()
+
+    tiny = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    dhash = (tiny[:, 1:] > tiny[:, :-1]).ravel()
+    return histogram, dhash
+
+def histogram_distance(a, b):
+    """Total variation distance between two normalized histograms (0 = identical, 1 = disjoint)."""
+    return 0.5 * float(np.abs(a - b).sum())
+
+def is_near_duplicate(histogram, dhash, kept_histograms, kept_hashes):
+    """
+    A frame is a near-duplicate of a kept frame when both its structure (dHash
+    Hamming distance) and its tones (histogram distance) match. Compared
+    against every kept frame at once.
+    """
+    if not kept_hashes:
+        return False
+    hash_distances = np.count_nonzero(np.asarray(kept_hashes) != dhash, axis=1)
+    histogram_distances = 0.5 * np.abs(np.asarray(kept_histograms) - histogram).sum(axis=1)
+    matches = (hash_distances <= DUPLICATE_HASH_DISTANCE) & (histogram_distances < SCENE_CHANGE_THRESHOLD / 2)
+    return bool(matches.any())
+
+def sample_frames(cap, stride):
+    """
+    Yield (frame_index, frame) for every `stride`-th frame. Frames in between
+    are skipped with grab() (no colour conversion / copy), or with a seek when
+    the stride is long enough that demuxing them is wasted work.
+    """
+    index = 0
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            return
+        yield index, frame
+
+        if stride >= SEEK_MIN_STRIDE:
+            index += stride
+            cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        else:
+            for _ in range(stride - 1):
+                if not cap.grab():
+                    return
+            index += stride
+
+def resize_to_width(image, width):
+    """Downscale (never upscale) to at most `width` pixels wide, keeping the aspect ratio."""
+    height, current = image.shape[:2]
+    if current <= width:
+        return image
+    return cv2.resize(image, (width, max(1, round(height * width / current))), interpolation=cv2.INTER_AREA)
+
+def encode_frame(image, size):
+    ok, encoded = cv2.imencode(
+        f'.{FRAME_FORMAT}', resize_to_width(image, VARIANT_WIDTHS[size]),
+        [cv2.IMWRITE_WEBP_QUALITY, VARIANT_QUALITY[size]]
+    )
+    return encoded.tobytes() if ok else None
+
+def write_frame(full_data):
+    """
+    Write a keyframe in every size under its content-hashed name and return
+    the full variant's filename. Identical frames map to the same files.
+    """
+    frame_filename = f"{hashlib.sha256(full_data).hexdigest()[:16]}.{FRAME_FORMAT}"
+    image = cv2.imdecode(np.frombuffer(full_data, np.uint8), cv2.IMREAD_COLOR)
+    for size in VARIANT_WIDTHS:
+        data = full_data if size == 'full' else encode_frame(image, size)
+        path = os.path.join(FRAMES_FOLDER, variant_name(frame_filename, size))
+        if data is not None and not os.path.exists(path):
+            _write_file(path, data)
+    return frame_filename
+
+def _write_file(path, data):
+    """Write then rename, so a concurrent reader (or a crash) never leaves half a file at an immutable URL."""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def build_contact_sheet(keyframes, columns=CONTACT_SHEET_COLUMNS):
+    """
+    Tile the thumbnails of `keyframes` into one image, so a grid of a
+    memory's frames loads in a single request. Returns {"file", "columns",
+    "rows", "tile_width", "tile_height", "count"} (tiles are laid out row by
+    row in keyframe order), or None when there is nothing to tile.
+    """
+    tiles = [cv2.imread(os.path.join(FRAMES_FOLDER, variant_name(frame, 'thumb'))) for frame in keyframes]
+    tiles = [tile for tile in tiles if tile is not None]
+    if not tiles:
+        return None
+
+    tile_width = VARIANT_WIDTHS['thumb']
+    tile_height = max(tile.shape[0] for tile in tiles)
+    columns = min(columns, len(tiles))
+    rows = -(-len(tiles) // columns)
+    sheet = np.zeros((rows * tile_height, columns * tile_width, 3), np.uint8)
+    for i, tile in enumerate(tiles):
+        top, left = (i // columns) * tile_height, (i % columns) * tile_width
+        sheet[top:top + tile.shape[0], left:left + tile.shape[1]] = tile
+
+    ok, encoded = cv2.imencode(f'.{FRAME_FORMAT}', sheet, [cv2.IMWRITE_WEBP_QUALITY, VARIANT_QUALITY['thumb']])
+    if not ok:
+        return None
+    data = encoded.tobytes()
+    sheet_filename = f"{hashlib.sha256(data).hexdigest()[:16]}_sheet.{FRAME_FORMAT}"
+    _write_file(os.path.join(FRAMES_FOLDER, sheet_filename), data)
+    return {"file": sheet_filename, "columns": columns, "rows": rows,
+            "tile_width": tile_width, "tile_height": tile_height, "count": len(tiles)}
+
+def extract_keyframes(video_path, max_keyframes=MAX_KEYFRAMES):
+    """
+    Pick up to `max_keyframes` representative frames using scene-change
+    detection and write them in thumb, medium and full sizes. Returns a list
+    of (full size) frame filenames.
+    """
+    return [frame for frame, _ in extract_timed_keyframes(video_path, max_keyframes)]
+
+def extract_timed_keyframes(video_path, max_keyframes=MAX_KEYFRAMES):
+    """
+    Same as extract_keyframes, but returns (filename, seconds) pairs giving
+    each frame's position in the video.
+    """
+    if is_audio_only(video_path):
+        print(f"[Frame Extractor] Skipping audio-only file: {video_path}")
+        return []
+
     cap = cv2.VideoCapture(video_path)
 
     if not cap.isOpened():
         print(f"[Frame Extractor] Error: Unable to open video file: {video_path}")
         return []
 
-    count = 0
-    keyframes = []
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    stride = max(1, int(round(fps * SAMPLE_INTERVAL_SECONDS)))
+    max_gap = max(1, int(fps * MAX_GAP_SECONDS))
+
+    # Min-heap of (score, frame_index, encoded_full_frame): when over the cap, the
+    # least distinctive candidate is dropped, so memory stays bounded.
+    candidates = []
+    kept_histograms = []
+    kept_hashes = []
+    previous_histogram = None
+    last_kept_index = None
+    sampled = 0
 
-    # Generate unique prefix to avoid frame name conflicts across uploads
-    unique_prefix = str(uuid.uuid4())[:8]  # Short UUID (8 chars)
+    for index, frame in sample_frames(cap, stride):
+        sampled += 1
+        histogram, dhash = frame_signature(frame)
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
+        if previous_histogram is None:
+            score = float('inf')  # always keep the opening shot
+        else:
+            score = histogram_distance(histogram, previous_histogram)
+            # Until a frame is kept (the opening one may fail to encode) every frame is a candidate
+            recent = last_kept_index is not None and index - last_kept_index < max_gap
+            if score < SCENE_CHANGE_THRESHOLD and recent:
+                previous_histogram = histogram
+                continue
+        previous_histogram = histogram
 
-        if count % 30 == 0:  # Save every 30th frame (adjustable)
-            frame_filename = f'{unique_prefix}_frame_{count}.jpg'
-            frame_path = os.path.join(FRAMES_FOLDER, frame_filename)
-            cv2.imwrite(frame_path, frame)
-            keyframes.append(frame_filename)  # Only filename (no full path)
+        if is_near_duplicate(histogram, dhash, kept_histograms, kept_hashes):
+            continue
 
-        count += 1
+        encoded = encode_frame(frame, 'full')
+        if encoded is None:
+            continue
+        kept_histograms.append(histogram)
+        kept_hashes.append(dhash)
+        last_kept_index = index
+
+        heapq.heappush(candidates, (score, index, encoded))
+        if len(candidates) > max_keyframes:
+            heapq.heappop(candidates)
 
     cap.release()
 
-    print(f"[Frame Extractor] Extracted {len(keyframes)} keyframes from {video_path}")
-    return keyframes  # List of filenames like ['abcd1234_frame_0.jpg', 'abcd1234_frame_30.jpg']
+    keyframes = []
+    for _, index, data in sorted(candidates, key=lambda c: c[1]):
+        keyframes.append((write_frame(data), round(index / fps, 2)))  # Only filename (no full path)
+
+    print(f"[Frame Extractor] Kept {len(keyframes)} keyframes out of {sampled} sampled frames from {video_path}")
+    return keyframes  # Pairs like [('3f9a0c2b71d4e85a.webp', 0.0), ('b81c4e07a2f9d366.webp', 15.0)]
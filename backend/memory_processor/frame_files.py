@@ -0,0 +1,31 @@
+import os
+
+# Keyframes are written in several sizes next to each other:
+#   <hash>.webp          full (longest side capped)
+#   <hash>_medium.webp   detail views
+#   <hash>_thumb.webp    grid tiles
+# Memories store only the full name; the other sizes are derived from it.
+# Names are the content hash of the full image, so a URL never changes
+# content and can be cached forever. This module has no image dependencies,
+# so the API process can use it without loading OpenCV.
+FRAME_FORMAT = 'webp'
+VARIANT_WIDTHS = {"thumb": 240, "medium": 640, "full": 1280}
+VARIANT_QUALITY = {"thumb": 70, "medium": 75, "full": 80}
+
+def variant_name(frame, size):
+    """Filename of a size variant of a stored keyframe."""
+    if size == 'full' or not is_hashed_frame(frame):
+        return frame  # frames from before variants existed only have one size
+    base, ext = os.path.splitext(frame)
+    return f"{base}_{size}{ext}"
+
+def frame_variants(frame):
+    """Every file belonging to a stored keyframe (or contact sheet)."""
+    if not is_hashed_frame(frame) or frame.endswith(f"_sheet.{FRAME_FORMAT}"):
+        return [frame]
+    return [variant_name(frame, size) for size in VARIANT_WIDTHS]
+
+def is_hashed_frame(filename):
+    """True for content-addressed (immutable) frame files."""
+    base, ext = os.path.splitext(filename)
+    return ext == f".{FRAME_FORMAT}" and len(base.split('_')[0]) == 16
@@ -0,0 +1,328 @@
+"""
+Shared Whisper inference server.
+
+One long-lived process owns the model; web and ingestion workers send audio
+over a local socket with InferenceClient (or TRANSCRIBE_ENGINE=remote) instead
+of each loading their own copy. Audio is decoded in 30-second windows, and
+windows from all concurrent requests are batched into a single forward pass.
+As in whisper.transcribe, each window starts where the last complete segment
+of the previous one ended, and segments keep Whisper's own timestamps.
+
+The socket is protected by a shared secret: INFERENCE_AUTHKEY, or when that
+is unset a random key the server writes next to the socket on startup
+(INFERENCE_SOCKET + '.key', readable only by the deployment's user).
+
+Run from backend/:
+    python -m memory_processor.inference_server           # start the server
+    python -m memory_processor.inference_server --stats   # print queue depth and latency
+"""
+import argparse
+import os
+import queue
+import secrets
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+
+INFERENCE_SOCKET = os.environ.get('INFERENCE_SOCKET', '/tmp/memory-app-whisper.sock')
+INFERENCE_AUTHKEY = os.environ.get('INFERENCE_AUTHKEY', '').encode() or None
+INFERENCE_MAX_BATCH = int(os.environ.get('INFERENCE_MAX_BATCH', 8))
+INFERENCE_BATCH_WAIT_MS = float(os.environ.get('INFERENCE_BATCH_WAIT_MS', 50))
+# Engine the server itself loads (TRANSCRIBE_ENGINE=remote points clients here)
+INFERENCE_ENGINE = os.environ.get('INFERENCE_ENGINE', 'whisper')
+
+SAMPLE_RATE = 16000
+WINDOW_SECONDS = 30
+WINDOW_SAMPLES = WINDOW_SECONDS * SAMPLE_RATE
+TIME_PRECISION = 0.02   # seconds per Whisper timestamp token
+
+
+def _key_path(address):
+    return address + '.key'
+
+
+def client_authkey(address=INFERENCE_SOCKET):
+    """INFERENCE_AUTHKEY, or the key the running server generated."""
+    if INFERENCE_AUTHKEY:
+        return INFERENCE_AUTHKEY
+    try:
+        with open(_key_path(address), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        raise RuntimeError(f"No inference server key at {_key_path(address)}: start the server "
+                           "or set INFERENCE_AUTHKEY")
+
+
+def _server_authkey(address):
+    if INFERENCE_AUTHKEY:
+        return INFERENCE_AUTHKEY
+    key = secrets.token_bytes(32)
+    fd = os.open(_key_path(address), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+class InferenceClient:
+    """Small client for web/ingestion workers; needs neither torch nor whisper."""
+
+    def __init__(self, address=INFERENCE_SOCKET, authkey=None):
+        self.address = address
+        self.authkey = authkey
+
+    def _request(self, message):
+        # One connection per request keeps the client safe to share between
+        # threads; the key is read each time, as a restarted server has a new one
+        authkey = self.authkey or client_authkey(self.address)
+        with Client(self.address, family='AF_UNIX', authkey=authkey) as conn:
+            conn.send(message)
+            reply = conn.recv()
+        if not reply['ok']:
+            raise RuntimeError(f"Inference server error: {reply['error']}")
+        return reply['result']
+
+    def transcribe(self, audio, task="translate"):
+        """Transcribe 16 kHz mono float32 audio; returns the engine result dict."""
+        return self._request({"op": "transcribe", "audio": audio, "task": task})
+
+    def stats(self):
+        return self._request({"op": "stats"})
+
+
+class BatchScheduler:
+    """
+    Collects 30-second mel windows from every connection and decodes them in
+    batches of up to `max_batch`, waiting at most `max_wait` seconds for a
+    batch to fill. Each window resolves to (tokens with timestamps, language,
+    silent). Only this scheduler's thread touches the model.
+    """
+
+    def __init__(self, model, max_batch=INFERENCE_MAX_BATCH, max_wait=INFERENCE_BATCH_WAIT_MS / 1000):
+        import whisper
+        self.whisper = whisper
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.windows = 0
+
+    def submit(self, mel, task):
+        future = Future()
+        self.queue.put((mel, task, future))
+        return future
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Decoding options are per batch, so group windows by task
+            by_task = {}
+            for item in batch:
+                by_task.setdefault(item[1], []).append(item)
+            for task, items in by_task.items():
+                self._decode(task, items)
+
+    def _decode(self, task, items):
+        import torch
+        try:
+            mels = torch.stack([mel for mel, _, _ in items]).to(self.model.device)
+            options = self.whisper.DecodingOptions(task=task, fp16=False)
+            with torch.no_grad():
+                results = self.whisper.decode(self.model, mels, options)
+        except Exception as e:
+            for _, _, future in items:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.windows += len(items)
+        for (_, _, future), result in zip(items, results):
+            # Same no-speech rule whisper.transcribe applies
+            silent = result.no_speech_prob > 0.6 and result.avg_logprob < -1.0
+            future.set_result((list(result.tokens), result.language, silent))
+
+
+class InferenceServer:
+    def __init__(self, engine_name=None, model_size=None):
+        import whisper
+        from whisper.tokenizer import get_tokenizer
+        from memory_processor.transcription_engines import get_engine
+
+        engine = get_engine(engine_name or INFERENCE_ENGINE, model_size)
+        if not hasattr(engine, 'model') or not hasattr(engine.model, 'dims'):
+            raise RuntimeError(f"Engine '{engine.name}' cannot be batched; use whisper or whisper-int8")
+
+        self.whisper = whisper
+        self.engine = engine
+        self.tokenizer = get_tokenizer(engine.model.is_multilingual, num_languages=engine.model.num_languages)
+        self.scheduler = BatchScheduler(engine.model)
+        self.started_at = time.time()
+        self.in_flight = 0
+        self.requests = 0
+        self.latencies = deque(maxlen=1000)
+        self.lock = threading.Lock()
+
+    def _mel(self, window):
+        return self.whisper.log_mel_spectrogram(self.whisper.pad_or_trim(window), self.engine.model.dims.n_mels)
+
+    def _split_segments(self, tokens):
+        """
+        Cut one window's tokens into (start, end, tokens) segments at its
+        timestamp tokens, as whisper.transcribe does. Also returns how many
+        samples the window consumed: all of it, or up to the last complete
+        segment when the window ended mid-segment.
+        """
+        begin = self.tokenizer.timestamp_begin
+        is_timestamp = [token >= begin for token in tokens]
+        seconds = lambda token: (token - begin) * TIME_PRECISION
+        # Two timestamps in a row end one segment and start the next
+        slices = [i + 1 for i in range(len(tokens) - 1) if is_timestamp[i] and is_timestamp[i + 1]]
+        single_timestamp_ending = is_timestamp[-2:] == [False, True]
+
+        if not slices:
+            stamps = [token for token in tokens if token >= begin]
+            end = seconds(stamps[-1]) if stamps and stamps[-1] != begin else WINDOW_SECONDS
+            return [(0.0, end, tokens)], WINDOW_SAMPLES
+
+        if single_timestamp_ending:
+            slices.append(len(tokens))
+        segments, last = [], 0
+        for current in slices:
+            piece = tokens[last:current]
+            segments.append((seconds(piece[0]), seconds(piece[-1]), piece))
+            last = current
+        if single_timestamp_ending:
+            return segments, WINDOW_SAMPLES
+        # The rest of the window is decoded again as the start of the next one
+        consumed = int(seconds(tokens[last - 1]) * SAMPLE_RATE)
+        return segments, consumed if consumed > 0 else WINDOW_SAMPLES
+
+    def transcribe(self, audio, task):
+        """
+        Decode `audio` window by window. A request has one window in flight
+        at a time; windows of concurrent requests share batches.
+        """
+        segments = []
+        languages = Counter()
+        seek = 0
+        while seek < max(len(audio), 1):
+            window = audio[seek:seek + WINDOW_SAMPLES]
+            tokens, language, silent = self.scheduler.submit(self._mel(window), task).result()
+            offset, window_end = seek / SAMPLE_RATE, (seek + len(window)) / SAMPLE_RATE
+            if silent:
+                seek += WINDOW_SAMPLES
+                continue
+
+            window_segments, consumed = self._split_segments(tokens)
+            for start, end, text_tokens in window_segments:
+                text = self.tokenizer.decode(text_tokens).strip()
+                if text:
+                    segments.append({"start": round(offset + start, 2),
+                                     "end": round(min(offset + end, window_end), 2), "text": text})
+                    languages[language] += 1
+            seek += consumed
+
+        return {
+            "text": ' '.join(s['text'] for s in segments),
+            "language": languages.most_common(1)[0][0] if languages else 'unknown',
+            "segments": segments,
+        }
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            in_flight, requests = self.in_flight, self.requests
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+
+        return {
+            "engine": self.engine.name,
+            "model_size": self.engine.model_size,
+            "uptime_seconds": round(time.time() - self.started_at),
+            "queue_depth": self.scheduler.queue.qsize(),
+            "in_flight_requests": in_flight,
+            "requests": requests,
+            "batches": self.scheduler.batches,
+            "avg_batch_size": round(self.scheduler.windows / self.scheduler.batches, 2) if self.scheduler.batches else 0,
+            "latency_p50_seconds": percentile(0.5),
+            "latency_p95_seconds": percentile(0.95),
+        }
+
+    def handle(self, conn):
+        with conn:
+            try:
+                message = conn.recv()
+            except EOFError:
+                return
+
+            try:
+                if message['op'] == 'stats':
+                    conn.send({"ok": True, "result": self.stats()})
+                    return
+
+                with self.lock:
+                    self.in_flight += 1
+                started = time.perf_counter()
+                try:
+                    result = self.transcribe(message['audio'], message.get('task', 'translate'))
+                finally:
+                    with self.lock:
+                        self.in_flight -= 1
+                        self.requests += 1
+                        self.latencies.append(time.perf_counter() - started)
+                conn.send({"ok": True, "result": result})
+            except Exception as e:
+                print(f"[Inference Server] Request failed: {e}")
+                conn.send({"ok": False, "error": str(e)})
+
+    def serve(self, address=INFERENCE_SOCKET, authkey=None):
+        if os.path.exists(address):
+            os.remove(address)  # stale socket from a previous run
+        authkey = authkey or _server_authkey(address)
+
+        threading.Thread(target=self.scheduler.run, name='inference-batcher', daemon=True).start()
+        with Listener(address, family='AF_UNIX', authkey=authkey) as listener:
+            os.chmod(address, 0o600)
+            print(f"[Inference Server] Serving {self.engine.name} ({self.engine.model_size}) on {address}, "
+                  f"max batch {self.scheduler.max_batch}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    print(f"[Inference Server] Rejected connection: {e}")
+                    continue
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared Whisper inference server")
+    parser.add_argument('--stats', action='store_true', help='print stats of the running server and exit')
+    parser.add_argument('--engine', help='whisper or whisper-int8 (default: INFERENCE_ENGINE)')
+    parser.add_argument('--model-size', help='default: WHISPER_MODEL_SIZE')
+    args = parser.parse_args()
+
+    if args.stats:
+        for key, value in InferenceClient().stats().items():
+            print(f"{key}: {value}")
+        return 0
+
+    InferenceServer(args.engine, args.model_size).serve()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import json
+import os
+from memory_processor.audio_transcriber import transcribe_audio
+from memory_processor.frame_extractor import CONTACT_SHEET, build_contact_sheet, extract_timed_keyframes
+from memory_processor.memory_store import save_memory
+from memory_processor.summarizer import summarize_content
+from memory_processor import artifact_cache, job_queue, metrics
+from memory_processor.translation_service import TRANSLATION_MODE, english_text, request_translation
+from memory_processor.pipeline import Pipeline, Stage
+
+def build_ingestion_pipeline(filepath, user_id, save=True, max_workers=None, on_transcript_progress=None,
+                             content_hash=None, probe=None, name='pipeline', degraded=None):
+    """
+    Stage graph for one upload. Transcription and keyframe extraction only need
+    the uploaded file, so they run side by side; summarization and translation
+    start as soon as the transcript is ready. With `save=False` the graph stops
+    before the database write (used for benchmarking); `max_workers=1` runs the
+    stages one after another. `on_transcript_progress` receives partial
+    transcripts from long-form transcription. `probe` is the stream info
+    gathered while a chunked upload was still arriving. `name` prefixes the
+    stage threads' names (so a profiler can pick out one job's threads).
+    `degraded`, if given, is a set that collects the names of stages whose
+    output is only a stand-in (the local summary after Gemini failed), which
+    must not be cached or checkpointed.
+    """
+    def transcribe(inputs):
+        if probe and not probe.get('has_audio'):
+            return {"transcript": "No audio track found in the file.", "language": "unknown",
+                    "translated_transcript": None, "duration": probe.get('duration') or 0.0, "segments": []}
+        # Transcribe in the spoken language; offline mode also translates locally
+        with job_queue.stage_slot('transcribe'):
+            return transcribe_audio(
+                filepath, on_progress=on_transcript_progress, translate=(TRANSLATION_MODE == 'offline')
+            )
+
+    def summarize(inputs):
+        transcription = inputs['transcribe']
+        # Generate summary using Gemini (from the English text when it is already known)
+        with job_queue.stage_slot('summarize'):
+            summary, fallback = summarize_content(english_text(transcription) or transcription['transcript'])
+        if fallback and degraded is not None:
+            degraded.add('summarize')
+        return summary
+
+    def translate(inputs):
+        # English text if already known; None means it is left to the background translator
+        transcription = inputs['transcribe']
+        return [english_text(transcription), transcription['language']]
+
+    def frames(inputs):
+        if probe and not probe.get('has_video'):
+            # Known from the upload probe: nothing to extract, so OpenCV never opens the file
+            return {"keyframes": [], "keyframe_times": [], "contact_sheet": None}
+        with job_queue.stage_slot('frames'):
+            keyframes = extract_timed_keyframes(filepath)
+            names = [os.path.basename(frame) for frame, _ in keyframes]
+            contact_sheet = build_contact_sheet(names) if CONTACT_SHEET and len(names) > 1 else None
+        return {
+            "keyframes": names,
+            "keyframe_times": [seconds for _, seconds in keyframes],
+            "contact_sheet": contact_sheet,
+        }
+
+    def store(inputs):
+        translated_transcript, detected_language = inputs['translate']
+        pending = translated_transcript is None and TRANSLATION_MODE == 'async'
+        frames = inputs['frames']
+        # Save memory with user_id
+        with job_queue.stage_slot('save'):
+            memory_id = save_memory(
+                filepath, inputs['transcribe']['transcript'], inputs['summarize'], frames['keyframes'], user_id,
+                translated_transcript=translated_transcript, detected_language=detected_language,
+                content_hash=content_hash, translation_pending=pending,
+                segments=inputs['transcribe']['segments'], keyframe_times=frames['keyframe_times'],
+                contact_sheet=frames.get('contact_sheet'), duration=inputs['transcribe']['duration']
+            )
+        if pending:
+            request_translation(memory_id)
+        return str(memory_id)
+
+    stages = [
+        Stage('transcribe', transcribe, label='Transcribing audio', weight=5),
+        Stage('frames', frames, label='Extracting keyframes', weight=2),
+        Stage('summarize', summarize, deps=['transcribe'], label='Summarizing content', weight=1),
+        Stage('translate', translate, deps=['transcribe'], label='Translating transcript', weight=1),
+    ]
+    if save:
+        stages.append(Stage('save', store, deps=['summarize', 'translate', 'frames'], label='Saving to database', weight=1))
+    return Pipeline(stages, max_workers=max_workers, name=name)
+
+def cached_stage_outputs(content_hash):
+    """Map a cache hit for this content onto the pipeline's stage outputs."""
+    cached = artifact_cache.lookup(content_hash) if content_hash else None
+    if cached is None:
+        return {}
+
+    outputs = {
+        "transcribe": {
+            "transcript": cached['transcript'],
+            "language": cached['detected_language'],
+            "translated_transcript": cached['translated_transcript'],
+            "duration": cached.get('duration', 0.0),
+            "segments": cached.get('segments', []),
+        },
+        "summarize": cached['summary'],
+        "translate": [cached['translated_transcript'], cached['detected_language']],
+    }
+    # Missing when the frame files are gone; the frames stage then runs again
+    if 'keyframes' in cached:
+        outputs['frames'] = {
+            "keyframes": cached['keyframes'],
+            "keyframe_times": cached.get('keyframe_times', []),
+            "contact_sheet": cached.get('contact_sheet'),
+        }
+    print(f"[Pipeline] Cache hit for content {content_hash[:12]}, reusing {', '.join(outputs)}")
+    return outputs
+
+def process_memory_async(job):
+    """
+    Process one queued memory job. Raises on failure so the queue can retry it.
+    Jobs uploaded with profiling requested run under the sampling profiler.
+    """
+    details = json.loads(job.get('details') or '{}')
+    thread_prefix = f"pipeline-{job['id']}"
+    metrics.JOBS_IN_FLIGHT.inc()
+    try:
+        if details.get('profile'):
+            with metrics.profile_job(job['id'], thread_prefix) as profile_path:
+                _process_job(job, details, thread_prefix)
+            job_queue.update_details(job['id'], profile=profile_path)
+        else:
+            _process_job(job, details, thread_prefix)
+        metrics.JOBS_TOTAL.inc(outcome='completed')
+    except Exception:
+        metrics.JOBS_TOTAL.inc(outcome='failed')
+        raise
+    finally:
+        metrics.JOBS_IN_FLIGHT.dec()
+
+def _process_job(job, details, thread_prefix):
+    filepath, filename, user_id = job['filepath'], job['id'], job['user_id']
+    content_hash = job.get('content_hash')
+    probe = details.get('probe')
+
+    # Stage outputs come from the content-addressed cache when this exact file
+    # was processed before, and from the checkpoint of an interrupted attempt
+    completed = cached_stage_outputs(content_hash)
+    completed.update(job_queue.load_checkpoint(filename))
+
+    degraded = set()
+
+    def on_progress(stages, fraction, running):
+        message = (', '.join(running) + '...') if running else "Finishing up..."
+        job_queue.update_status(filename, "processing", 10 + int(fraction * 85), message, stages=stages)
+
+    def on_stage_done(name, output):
+        # A retry of the job gets another chance at a stage that fell back
+        if name not in degraded:
+            job_queue.save_checkpoint(filename, name, output)
+
+    def on_transcript_progress(done, total, partial_text):
+        job_queue.update_details(
+            filename, message=f"Transcribing audio ({done}/{total} chunks)...",
+            transcription={"chunks_done": done, "chunks_total": total},
+            partial_transcript=partial_text
+        )
+
+    pipeline = build_ingestion_pipeline(
+        filepath, user_id, on_transcript_progress=on_transcript_progress, content_hash=content_hash, probe=probe,
+        name=thread_prefix, degraded=degraded
+    )
+    outputs, timings = pipeline.run(completed=completed, on_progress=on_progress, on_stage_done=on_stage_done)
+    # Stages restored from the cache or a checkpoint have no timing and are not observed
+    for name, timing in timings.items():
+        if name != 'total':
+            metrics.STAGE_SECONDS.observe(timing['seconds'], stage=name)
+
+    # Cache the artifacts if anything was computed, unless a stage only
+    # produced an error placeholder or stand-in that a re-upload should retry
+    computed = set(timings) - {'total', 'save'}
+    failed = outputs['transcribe']['transcript'].startswith("Transcription failed") or bool(degraded)
+    if content_hash and computed and not failed:
+        translated_transcript, detected_language = outputs['translate']
+        artifact_cache.store(content_hash, {
+            "transcript": outputs['transcribe']['transcript'],
+            "duration": outputs['transcribe']['duration'],
+            "segments": outputs['transcribe']['segments'],
+            "summary": outputs['summarize'],
+            "translated_transcript": translated_transcript,
+            "detected_language": detected_language,
+            "keyframes": outputs['frames']['keyframes'],
+            "keyframe_times": outputs['frames']['keyframe_times'],
+            "contact_sheet": outputs['frames'].get('contact_sheet'),
+        })
+
+    # One structured line per job, for log-based analysis
+    print("[Pipeline] " + json.dumps({
+        "event": "job_completed",
+        "job": filename,
+        "stages": {name: timing['seconds'] for name, timing in timings.items() if name != 'total'},
+        "reused": sorted(completed),
+        **timings['total'],
+    }))
+
+    job_queue.update_status(
+        filename, "completed", 100, "Memory processed successfully",
+        memory_id=outputs['save'], timings=timings
+    )
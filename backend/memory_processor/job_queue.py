@@ -0,0 +1,349 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Job state lives in a local SQLite file so it survives restarts and is shared
+# by every gunicorn worker on the host (no extra services needed).
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+JOBS_DB_PATH = os.environ.get('JOBS_DB_PATH', os.path.join(BASE_DIR, '..', 'jobs.sqlite3'))
+
+# Worker pool and retry configuration
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 2))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 300))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 2.0))
+
+# Per-stage concurrency limits. Whisper is the heaviest stage, so by default
+# only one transcription runs per WHISPER_CORES_PER_JOB cores. The limits
+# apply per process: every process that runs ingestion workers (APP_ROLE=all
+# web workers, worker.py) gets its own set, so size them for the host divided
+# by the number of such processes.
+CPU_COUNT = os.cpu_count() or 1
+WHISPER_CORES_PER_JOB = int(os.environ.get('WHISPER_CORES_PER_JOB', 4))
+STAGE_LIMITS = {
+    'transcribe': int(os.environ.get('STAGE_LIMIT_TRANSCRIBE', max(1, CPU_COUNT // WHISPER_CORES_PER_JOB))),
+    'summarize': int(os.environ.get('STAGE_LIMIT_SUMMARIZE', 4)),
+    'frames': int(os.environ.get('STAGE_LIMIT_FRAMES', max(1, CPU_COUNT // 2))),
+    'save': int(os.environ.get('STAGE_LIMIT_SAVE', 4)),
+}
+_stage_semaphores = {name: threading.BoundedSemaphore(limit) for name, limit in STAGE_LIMITS.items()}
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _connect():
+    """Return this thread's SQLite connection, creating the schema on first use."""
+    global _schema_ready
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(JOBS_DB_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _local.conn = conn
+
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        id TEXT PRIMARY KEY,
+                        user_id TEXT NOT NULL,
+                        filepath TEXT NOT NULL,
+                        content_hash TEXT,
+                        status TEXT NOT NULL,
+                        progress INTEGER NOT NULL DEFAULT 0,
+                        message TEXT,
+                        details TEXT NOT NULL DEFAULT '{}',
+                        checkpoint TEXT NOT NULL DEFAULT '{}',
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        max_attempts INTEGER NOT NULL,
+                        lease_until REAL NOT NULL DEFAULT 0,
+                        created_at REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    )
+                """)
+                conn.execute('CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status, created_at)')
+                _schema_ready = True
+    return conn
+
+
+@contextmanager
+def _transaction():
+    """Run a block inside an IMMEDIATE transaction (takes the write lock up front)."""
+    conn = _connect()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def enqueue(job_id, filepath, user_id, content_hash=None, message="File uploaded, waiting for a worker...",
+            details=None):
+    """
+    Add an ingestion job to the queue. The job id is the stored upload filename.
+    `details` (e.g. the upload's probe result) start off the job's status payload.
+    """
+    now = time.time()
+    with _transaction() as conn:
+        conn.execute(
+            """INSERT INTO jobs (id, user_id, filepath, content_hash, status, progress, message, details,
+                                 max_attempts, created_at, updated_at)
+               VALUES (?, ?, ?, ?, 'queued', 10, ?, ?, ?, ?, ?)""",
+            (job_id, user_id, filepath, content_hash, message, json.dumps(details or {}), JOB_MAX_ATTEMPTS, now, now)
+        )
+    _work_available.set()
+    print(f"[Job Queue] Enqueued job {job_id} for user: {user_id}")
+
+
+def claim_next():
+    """
+    Atomically claim the oldest runnable job: either queued, or processing with
+    an expired lease (its worker died mid-run). Returns the job row or None.
+    """
+    now = time.time()
+    with _transaction() as conn:
+        # Abandoned jobs that already used their last attempt are not retried
+        conn.execute(
+            """UPDATE jobs SET status = 'error', progress = 100, updated_at = ?,
+                      message = 'Processing failed: worker stopped responding'
+               WHERE status = 'processing' AND lease_until < ? AND attempts >= max_attempts""",
+            (now, now)
+        )
+        row = conn.execute(
+            """SELECT * FROM jobs
+               WHERE (status = 'queued' OR (status = 'processing' AND lease_until < ?))
+                 AND attempts < max_attempts
+               ORDER BY created_at LIMIT 1""",
+            (now,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        resumed = row['status'] == 'processing'
+        conn.execute(
+            """UPDATE jobs SET status = 'processing', attempts = attempts + 1,
+                      lease_until = ?, updated_at = ? WHERE id = ?""",
+            (now + JOB_LEASE_SECONDS, now, row['id'])
+        )
+
+    job = dict(row)
+    job['status'] = 'processing'
+    job['attempts'] += 1
+    if resumed:
+        print(f"[Job Queue] Resuming interrupted job {job['id']} (attempt {job['attempts']})")
+    return job
+
+
+def update_status(job_id, status, progress, message, **details):
+    """
+    Record a job's progress. Extra keyword arguments (e.g. memory_id) are merged
+    into the status payload returned by get_status. Also renews the job lease.
+    """
+    now = time.time()
+    with _transaction() as conn:
+        row = conn.execute('SELECT details FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return
+        merged = json.loads(row['details'])
+        merged.update(details)
+        conn.execute(
+            """UPDATE jobs SET status = ?, progress = ?, message = ?, details = ?,
+                      lease_until = ?, updated_at = ? WHERE id = ?""",
+            (status, progress, message, json.dumps(merged), now + JOB_LEASE_SECONDS, now, job_id)
+        )
+
+
+def update_details(job_id, message=None, **details):
+    """
+    Merge extra fields (e.g. a partial transcript) into a running job's status
+    without touching its overall status and progress.
+    """
+    now = time.time()
+    with _transaction() as conn:
+        row = conn.execute('SELECT message, details FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return
+        merged = json.loads(row['details'])
+        merged.update(details)
+        conn.execute(
+            'UPDATE jobs SET message = ?, details = ?, lease_until = ?, updated_at = ? WHERE id = ?',
+            (message or row['message'], json.dumps(merged), now + JOB_LEASE_SECONDS, now, job_id)
+        )
+
+
+def get_status(job_id):
+    """Return the client-facing status dict for a job, or None if unknown."""
+    row = _connect().execute(
+        'SELECT status, progress, message, details FROM jobs WHERE id = ?', (job_id,)
+    ).fetchone()
+    if row is None:
+        return None
+
+    status = {"status": row['status'], "progress": row['progress'], "message": row['message']}
+    status.update(json.loads(row['details']))
+    return status
+
+
+def data_version():
+    """
+    SQLite's change counter for this thread's connection: it moves whenever
+    another connection (any thread or process) commits to the jobs database.
+    """
+    return _connect().execute('PRAGMA data_version').fetchone()[0]
+
+
+def load_checkpoint(job_id):
+    """Return the stage outputs already saved for a job (used to resume retries)."""
+    row = _connect().execute('SELECT checkpoint FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    return json.loads(row['checkpoint']) if row else {}
+
+
+def save_checkpoint(job_id, key, value):
+    """Persist one stage's output so a retried job can skip that stage."""
+    with _transaction() as conn:
+        row = conn.execute('SELECT checkpoint FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return
+        checkpoint = json.loads(row['checkpoint'])
+        checkpoint[key] = value
+        conn.execute(
+            'UPDATE jobs SET checkpoint = ?, lease_until = ?, updated_at = ? WHERE id = ?',
+            (json.dumps(checkpoint), time.time() + JOB_LEASE_SECONDS, time.time(), job_id)
+        )
+
+
+def fail(job_id, error):
+    """
+    Mark a job attempt as failed. The job is requeued until it runs out of
+    attempts, after which it is reported as an error.
+    """
+    with _transaction() as conn:
+        row = conn.execute('SELECT attempts, max_attempts FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return
+        if row['attempts'] < row['max_attempts']:
+            status, progress = 'queued', 10
+            message = f"Attempt {row['attempts']} failed, retrying: {error}"
+        else:
+            status, progress = 'error', 100
+            message = f"Processing failed: {error}"
+        conn.execute(
+            'UPDATE jobs SET status = ?, progress = ?, message = ?, lease_until = 0, updated_at = ? WHERE id = ?',
+            (status, progress, message, time.time(), job_id)
+        )
+    if status == 'queued':
+        _work_available.set()
+    print(f"[Job Queue] Job {job_id} failed ({status}): {error}")
+
+
+def renew_lease(job_id):
+    """Extend a running job's lease so other workers don't treat it as abandoned."""
+    now = time.time()
+    _connect().execute(
+        "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'processing'",
+        (now + JOB_LEASE_SECONDS, job_id)
+    )
+
+
+@contextmanager
+def stage_slot(stage):
+    """
+    Limit how many jobs run a given stage at once in this process (not
+    host-wide; see STAGE_LIMITS). Stages without a configured limit run
+    unrestricted.
+    """
+    semaphore = _stage_semaphores.get(stage)
+    if semaphore is None:
+        yield
+        return
+    with semaphore:
+        yield
+
+
+_work_available = threading.Event()
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of ingestion threads that pull jobs from the queue.
+    `handler(job)` processes one job and raises on failure so it can be retried.
+    """
+
+    def __init__(self, handler, size=INGEST_WORKERS):
+        self.handler = handler
+        self.size = size
+        self.threads = []
+        self.running = set()
+        self.running_lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def start(self):
+        for i in range(self.size):
+            thread = threading.Thread(target=self._worker_loop, name=f'ingest-worker-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name='ingest-heartbeat', daemon=True)
+        heartbeat.start()
+        self.threads.append(heartbeat)
+        print(f"[Job Queue] Started {self.size} ingestion workers, stage limits: {STAGE_LIMITS}")
+
+    def stop(self):
+        self.stopping.set()
+        _work_available.set()
+
+    def _worker_loop(self):
+        while not self.stopping.is_set():
+            try:
+                job = claim_next()
+            except sqlite3.OperationalError as e:
+                print(f"[Job Queue] Could not claim job: {e}")
+                job = None
+
+            if job is None:
+                _work_available.wait(JOB_POLL_INTERVAL)
+                _work_available.clear()
+                continue
+
+            with self.running_lock:
+                self.running.add(job['id'])
+            try:
+                self.handler(job)
+            except Exception as e:
+                fail(job['id'], str(e))
+            finally:
+                with self.running_lock:
+                    self.running.discard(job['id'])
+
+    def _heartbeat_loop(self):
+        while not self.stopping.wait(JOB_LEASE_SECONDS / 3):
+            with self.running_lock:
+                job_ids = list(self.running)
+            for job_id in job_ids:
+                try:
+                    renew_lease(job_id)
+                except sqlite3.OperationalError as e:
+                    print(f"[Job Queue] Could not renew lease for {job_id}: {e}")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def start_workers(handler, size=INGEST_WORKERS):
+    """Start the process-wide worker pool once. A size of 0 disables local workers."""
+    global _pool
+    with _pool_lock:
+        if _pool is None and size > 0:
+            _pool = WorkerPool(handler, size)
+            _pool.start()
+    return _pool
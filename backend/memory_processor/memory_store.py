@@ -1,41 +1,159 @@
-from pymongo import MongoClient
+from pymongo import ReturnDocument
 from bson import ObjectId
-from googletrans import Translator
 from datetime import datetime
+import base64
+import json
 import os
+import re
 from dotenv import load_dotenv
+from memory_processor import db, trigram_index, user_stats, vector_index
+from memory_processor.frame_files import frame_variants
 
 load_dotenv()
 
-# MongoDB Atlas connection
-client = MongoClient(os.environ.get('MONGO_ATLAS_URI', 'mongodb://localhost:27017/'))
-db = client['memory_db']
-collection = db['memories']
+# Indexes are created on first use, not at import, so API-only processes
+# start fast and without network round trips.
+_indexes_ready = False
 
-# Create indexes for better search performance
-collection.create_index([("user_id", 1), ("upload_date", -1)])
-collection.create_index([("user_id", 1), ("transcript", "text"), ("translated_transcript", "text")])
+FRAMES_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frames')
 
-# Translator setup
-translator = Translator()
+# Hybrid search: share of the final score taken from the text score (the rest
+# is semantic similarity), and the nearest neighbours considered per query
+HYBRID_TEXT_WEIGHT = float(os.environ.get('HYBRID_TEXT_WEIGHT', 0.5))
+VECTOR_SEARCH_K = int(os.environ.get('VECTOR_SEARCH_K', 20))
+VECTOR_MIN_SIMILARITY = float(os.environ.get('VECTOR_MIN_SIMILARITY', 0.35))
+# Embedding a /search query loads the embedding model (PyTorch) in the process,
+# which API-only processes (APP_ROLE=api) avoid unless SEMANTIC_SEARCH=1
+SEMANTIC_SEARCH = os.environ.get(
+    'SEMANTIC_SEARCH', '0' if os.environ.get('APP_ROLE', 'all') == 'api' else '1'
+) == '1'
 
-def save_memory(filepath, transcript, summary, keyframes, user_id):
+SNIPPET_CHARS = 160   # longer segments are trimmed around the first match
+
+# Fields a client may select with ?fields= (filepath, user_id and
+# content_hash stay server-side), and what the compact list view loads
+MEMORY_FIELDS = {
+    "filename", "summary", "transcript", "translated_transcript", "detected_language",
+    "keyframes", "keyframe_times", "contact_sheet", "upload_date", "duration", "translation_status",
+}
+COMPACT_FIELDS = ["filename", "summary", "detected_language", "keyframes", "upload_date", "duration"]
+
+def get_db():
+    """Return the memory_db database (from the shared, pooled client)."""
+    return db.get_db()
+
+def ensure_indexes():
+    """Create the indexes the queries rely on (idempotent)."""
+    global _indexes_ready
+    collection = get_db()['memories']
+    # Create indexes for better search performance
+    # _id breaks ties between equal upload dates for keyset pagination
+    collection.create_index([("user_id", 1), ("upload_date", -1), ("_id", -1)])
+    collection.create_index([("user_id", 1), ("transcript", "text"), ("translated_transcript", "text")])
+    # Only memories still waiting for a background translation carry this field
+    collection.create_index("translation_status", sparse=True)
+    segments = get_db()['memory_segments']
+    segments.create_index([("user_id", 1), ("text", "text")])
+    segments.create_index("memory_id")
+    trigram_index.ensure_indexes()
+    _indexes_ready = True
+
+def get_collection():
+    """Return the memories collection, ensuring its indexes once per process."""
+    if not _indexes_ready:
+        ensure_indexes()
+    return get_db()['memories']
+
+def get_segments_collection():
+    """Return the collection of timestamped transcript segments (one document each)."""
+    if not _indexes_ready:
+        ensure_indexes()
+    return get_db()['memory_segments']
+
+def get_user_version(user_id):
+    """Counter that changes whenever any of the user's memories change (0 if never written)."""
+    state = get_db()['user_state'].find_one({"_id": user_id}, {"version": 1})
+    return state['version'] if state else 0
+
+def bump_user_version(user_id, increments=None):
+    """
+    Mark the user's memories as changed, invalidating their cached responses.
+    `increments` (e.g. stats counters) are applied in the same atomic update.
+    """
+    get_db()['user_state'].update_one({"_id": user_id}, {"$inc": dict(increments or {}, version=1)}, upsert=True)
+
+def retain_frames(keyframes):
+    """Count one more memory referencing each frame file."""
+    frame_refs = get_db()['frame_refs']
+    for frame in keyframes:
+        frame_refs.update_one({"_id": frame}, {"$inc": {"refs": 1}}, upsert=True)
+
+def unretain_frames(keyframes):
+    """Undo retain_frames for a memory that was never stored. Files are left to the sweep."""
+    frame_refs = get_db()['frame_refs']
+    for frame in keyframes:
+        frame_refs.update_one({"_id": frame}, {"$inc": {"refs": -1}})
+
+def release_frames(keyframes):
+    """
+    Drop one reference to each frame file and delete the files nobody uses any
+    more. Frames shared by deduplicated uploads survive until the last memory
+    referencing them is deleted.
+    """
+    frame_refs = get_db()['frame_refs']
+    for frame in keyframes:
+        ref = frame_refs.find_one_and_update(
+            {"_id": frame}, {"$inc": {"refs": -1}}, return_document=ReturnDocument.AFTER, upsert=True
+        )
+        if ref['refs'] > 0:
+            continue
+        frame_refs.delete_one({"_id": frame, "refs": {"$lte": 0}})
+        for filename in frame_variants(frame):
+            frame_path = os.path.join(FRAMES_FOLDER, filename)
+            if os.path.exists(frame_path):
+                os.remove(frame_path)
+
+def nearest_keyframe(seconds, keyframes, keyframe_times):
+    """The keyframe closest in time to `seconds`, or None for audio-only memories."""
+    if not keyframes or not keyframe_times:
+        return None
+    index = min(range(len(keyframe_times)), key=lambda i: abs(keyframe_times[i] - seconds))
+    return keyframes[index]
+
+def save_segments(memory_id, user_id, filename, segments, keyframes, keyframe_times):
+    """Store a memory's transcript segments, each with the keyframe nearest its midpoint."""
+    documents = [
+        {
+            "memory_id": memory_id,
+            "user_id": user_id,
+            "filename": filename,
+            "index": i,
+            "start": segment['start'],
+            "end": segment['end'],
+            "text": segment['text'],
+            "keyframe": nearest_keyframe((segment['start'] + segment['end']) / 2, keyframes, keyframe_times),
+        }
+        for i, segment in enumerate(segments)
+    ]
+    if documents:
+        get_segments_collection().insert_many(documents)
+
+def save_memory(filepath, transcript, summary, keyframes, user_id, translated_transcript=None,
+                detected_language="unknown", content_hash=None, translation_pending=False,
+                segments=None, keyframe_times=None, contact_sheet=None, duration=None):
     """
     Save a memory into the database with user association.
+    `transcript` is in the spoken language (`detected_language`) and
+    `translated_transcript` is its English text. With `translation_pending`
+    the English text is filled in later by the background translator.
+    `segments` ([{"start", "end", "text"}, ...]) are stored separately for
+    segment search; `keyframe_times` gives each keyframe's position in seconds,
+    and `contact_sheet` describes the optional sprite image of all keyframes.
+    `duration` is the decoded media length in seconds.
     """
     # Ensure transcript is string
     transcript = str(transcript)
 
-    # Translate transcript to English (fallback if translation fails)
-    try:
-        translation = translator.translate(transcript, dest='en')
-        translated_transcript = translation.text
-        detected_language = translation.src
-    except Exception as e:
-        print(f"[Memory Store] Translation failed: {e}")
-        translated_transcript = transcript
-        detected_language = "unknown"
-
     # Extract filename for display
     filename = os.path.basename(filepath)
     
@@ -47,53 +165,277 @@ def save_memory(filepath, transcript, summary, keyframes, user_id):
         "translated_transcript": translated_transcript,
         "detected_language": detected_language,
         "keyframes": keyframes,
+        "keyframe_times": keyframe_times or [],
+        "contact_sheet": contact_sheet,
         "user_id": user_id,
+        "content_hash": content_hash,
         "upload_date": datetime.now(),
-        "duration": len(transcript.split()) // 3  # Approximate duration in seconds (3 words per second)
+        # Approximated from the word count (3 words per second) when the media length is unknown
+        "duration": round(duration, 2) if duration is not None else len(transcript.split()) // 3,
+        "storage_bytes": user_stats.storage_bytes(filepath, keyframes, contact_sheet),
     }
+    if translation_pending:
+        memory["translation_status"] = "pending"
+
+    # Referenced before the insert, so a concurrent delete sharing a frame cannot remove it meanwhile
+    frames = keyframes + ([contact_sheet['file']] if contact_sheet else [])
+    retain_frames(frames)
+    user_stats.begin_write(user_id)
+    try:
+        result = get_collection().insert_one(memory)
+    except Exception:
+        unretain_frames(frames)
+        user_stats.cancel_write(user_id)
+        raise
 
-    result = collection.insert_one(memory)
-    print(f"[Memory Store] Memory saved with ID: {result.inserted_id} for user: {user_id}")
+    try:
+        save_segments(result.inserted_id, user_id, filename, segments or [], keyframes, keyframe_times)
+        print(f"[Memory Store] Memory saved with ID: {result.inserted_id} for user: {user_id}")
+
+        try:
+            trigram_index.add_memory(memory)
+        except Exception as e:
+            print(f"[Memory Store] Could not add memory {result.inserted_id} to the trigram index: {e}")
+
+        # The transcript is embedded in its spoken language; the model is multilingual
+        try:
+            vector_index.index_memory(user_id, result.inserted_id, summary, transcript)
+        except Exception as e:
+            print(f"[Memory Store] Could not index memory {result.inserted_id} for semantic search: {e}")
+
+        # Bumped last, so responses cached from here on include the new memory everywhere
+        bump_user_version(user_id, user_stats.finished_write(user_stats.memory_increments(memory)))
+    except Exception:
+        # The job queue retries a failed save, which must not find this attempt's memory
+        _discard_memory(memory, frames)
+        raise
     return result.inserted_id
 
-def search_memory(query, user_id):
+def _discard_memory(memory, frames):
+    """Undo a save that failed after its insert: document, segments, frame references, stats write."""
+    try:
+        get_collection().delete_one({"_id": memory['_id']})
+        get_segments_collection().delete_many({"memory_id": memory['_id']})
+        unretain_frames(frames)
+        user_stats.cancel_write(memory['user_id'])
+    except Exception as e:
+        print(f"[Memory Store] Could not roll back memory {memory['_id']}: {e}")
+    try:
+        trigram_index.remove_memory(memory)
+        vector_index.remove_memory(memory['user_id'], memory['_id'])
+    except Exception as e:
+        print(f"[Memory Store] Could not remove memory {memory['_id']} from the search indexes: {e}")
+
+def _text_matches(query, user_id, projection=None):
     """
-    Search for memories by matching query with user's content only.
+    Keyword matches as {memory_id: (memory, score)}, with scores scaled to 0..1.
+    When text search fails or finds nothing (e.g. a partial word or a typo),
+    the trigram index answers instead.
     """
     try:
         # Use MongoDB text search with user filter
-        results = collection.find(
+        results = list(get_collection().find(
             {
                 "user_id": user_id,
                 "$text": {"$search": query}
             },
-            {"score": {"$meta": "textScore"}}
-        ).sort([("score", {"$meta": "textScore"})])
-    except:
-        # Fallback to regex search with user filter
-        results = collection.find({
-            "user_id": user_id,
-            "$or": [
-                {"transcript": {"$regex": query, "$options": "i"}},
-                {"translated_transcript": {"$regex": query, "$options": "i"}},
-                {"summary": {"$regex": query, "$options": "i"}}
-            ]
-        }).sort("upload_date", -1)
+            dict(projection or {}, score={"$meta": "textScore"})
+        ).sort([("score", {"$meta": "textScore"})]))
+    except Exception as e:
+        print(f"[Memory Store] Text search failed, using the trigram index: {e}")
+        results = []
+
+    if not results:
+        similarities = dict(trigram_index.search(user_id, query))
+        results = list(get_collection().find(
+            {"_id": {"$in": list(similarities)}, "user_id": user_id}, projection
+        ))
+        for memory in results:
+            memory['score'] = similarities[memory['_id']]
 
+    return scale_text_scores(results)
+
+def scale_text_scores(results):
+    """{memory_id: (memory, score)} with text or trigram scores scaled to 0..1."""
+    top_score = max((memory.get('score', 1.0) for memory in results), default=1.0)
+    return {str(memory['_id']): (memory, memory.get('score', 1.0) / top_score) for memory in results}
+
+def search_memory(query, user_id, projection=None):
+    """
+    Search for memories by matching query with user's content only.
+    Keyword matches and semantically similar memories are merged and ranked
+    by a blend of text score and vector similarity. `projection` limits the
+    fields loaded for each hit.
+    """
+    matches = _text_matches(query, user_id, projection)
+    similar = semantic_matches(query, user_id)
+
+    # Fetch the semantic hits the text search did not find
+    missing = [ObjectId(memory_id) for memory_id in similar if memory_id not in matches]
+    if missing:
+        for memory in get_collection().find({"_id": {"$in": missing}, "user_id": user_id}, projection):
+            matches[str(memory['_id'])] = (memory, 0.0)
+
+    memories = rank_matches(matches, similar)
+    print(f"[Memory Store] Found {len(memories)} memories for user {user_id} matching query: '{query}' "
+          f"({len(similar)} semantic)")
+    return memories
+
+def semantic_matches(query, user_id):
+    """{memory_id: similarity} of the vector index's nearest memories above VECTOR_MIN_SIMILARITY."""
+    if not SEMANTIC_SEARCH:
+        return {}
+    try:
+        return {
+            memory_id: similarity
+            for memory_id, similarity in vector_index.search(user_id, query, k=VECTOR_SEARCH_K)
+            if similarity >= VECTOR_MIN_SIMILARITY
+        }
+    except Exception as e:
+        print(f"[Memory Store] Semantic search unavailable, using text search only: {e}")
+        return {}
+
+def rank_matches(matches, similar):
+    """
+    Merge keyword matches ({memory_id: (memory, text_score)}, every semantic
+    hit included) with vector similarities into a list ranked by the hybrid score.
+    """
     memories = []
-    for memory in results:
-        memory['_id'] = str(memory['_id'])
+    for memory_id, (memory, text_score) in matches.items():
+        vector_score = similar.get(memory_id, 0.0)
+        memory['_id'] = memory_id
+        memory['text_score'] = round(text_score, 4)
+        memory['vector_score'] = round(vector_score, 4)
+        memory['score'] = round(HYBRID_TEXT_WEIGHT * text_score + (1 - HYBRID_TEXT_WEIGHT) * vector_score, 4)
         memories.append(memory)
-
-    print(f"[Memory Store] Found {len(memories)} memories for user {user_id} matching query: '{query}'")
+    memories.sort(key=lambda memory: memory['score'], reverse=True)
     return memories
 
+def highlight(text, query, max_chars=SNIPPET_CHARS):
+    """
+    Return (snippet, highlights): `text` trimmed to about `max_chars` around
+    the first query term it contains, and [start, end] character offsets of
+    every term occurrence within the snippet.
+    """
+    terms = [re.escape(term) for term in re.findall(r'\w+', query) if len(term) > 1]
+    spans = [m.span() for m in re.finditer(r'\b(?:' + '|'.join(terms) + ')', text, re.IGNORECASE)] if terms else []
+
+    start, end = 0, len(text)
+    if len(text) > max_chars:
+        first = spans[0][0] if spans else 0
+        start = max(0, min(first - max_chars // 3, len(text) - max_chars))
+        end = start + max_chars
+    snippet = text[start:end]
+    prefix = '...' if start > 0 else ''
+    suffix = '...' if end < len(text) else ''
+
+    highlights = [
+        [a - start + len(prefix), min(b, end) - start + len(prefix)]
+        for a, b in spans if a >= start and a < end
+    ]
+    return prefix + snippet + suffix, highlights
+
+def search_segments(query, user_id, limit=20):
+    """
+    Search the user's transcript segments. Returns only the matching segments,
+    each with its memory, start/end time, a highlighted snippet and the
+    nearest keyframe, best matches first.
+    """
+    try:
+        results = list(get_segments_collection().find(
+            {"user_id": user_id, "$text": {"$search": query}},
+            {"score": {"$meta": "textScore"}}
+        ).sort([("score", {"$meta": "textScore"})]).limit(limit))
+    except Exception:
+        results = list(get_segments_collection().find(
+            {"user_id": user_id, "text": {"$regex": re.escape(query), "$options": "i"}}
+        ).sort([("memory_id", -1), ("index", 1)]).limit(limit))
+
+    segments = [present_segment(segment, query) for segment in results]
+    print(f"[Memory Store] Found {len(segments)} segments for user {user_id} matching query: '{query}'")
+    return segments
+
+def present_segment(segment, query):
+    """A segment search hit: its memory, time range, highlighted snippet and nearest keyframe."""
+    snippet, highlights = highlight(segment['text'], query)
+    return {
+        "memory_id": str(segment['memory_id']),
+        "filename": segment['filename'],
+        "start": segment['start'],
+        "end": segment['end'],
+        "snippet": snippet,
+        "highlights": highlights,
+        "keyframe": segment.get('keyframe'),
+        "score": round(segment.get('score', 1.0), 4),
+    }
+
+def memory_projection(fields=None, compact=False):
+    """
+    Mongo projection for a listing: the compact view's fields, the requested
+    `fields` (see MEMORY_FIELDS), or None for whole documents.
+    """
+    if compact:
+        return {field: 1 for field in COMPACT_FIELDS}
+    if fields:
+        unknown = set(fields) - MEMORY_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        return {field: 1 for field in fields}
+    return None
+
+def encode_cursor(value, memory_id):
+    """Opaque keyset cursor holding the sort key of the last item of a page."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, str(memory_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor: returns (value, memory_id); raises ValueError if malformed."""
+    try:
+        value, memory_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        ObjectId(memory_id)
+        return value, memory_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def iter_user_memories(user_id, limit=None, cursor=None, projection=None):
+    """
+    Lazily yield a user's memories, newest first, walking the
+    (user_id, upload_date, _id) index. `cursor` (from encode_cursor with the
+    last memory's upload_date and _id) continues after the previous page.
+    """
+    query, projection = listing_query(user_id, cursor, projection)
+    results = get_collection().find(query, projection).sort(LISTING_SORT)
+    if limit:
+        results = results.limit(limit)
+    return iter(results)
+
+LISTING_SORT = [("upload_date", -1), ("_id", -1)]
+
+def listing_query(user_id, cursor=None, projection=None):
+    """Filter and projection of a page of a user's memories, newest first; raises ValueError for a bad cursor."""
+    query = {"user_id": user_id}
+    if cursor:
+        upload_date, memory_id = decode_cursor(cursor)
+        try:
+            upload_date = datetime.fromisoformat(upload_date)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        query["$or"] = [
+            {"upload_date": {"$lt": upload_date}},
+            {"upload_date": upload_date, "_id": {"$lt": ObjectId(memory_id)}},
+        ]
+    if projection is not None:
+        projection = dict(projection, upload_date=1)
+    return query, projection
+
 def get_user_memories(user_id):
     """
     Fetch all memories for a specific user, sorted by date.
     """
     memories = []
-    for memory in collection.find({"user_id": user_id}).sort("upload_date", -1):
+    for memory in get_collection().find({"user_id": user_id}).sort("upload_date", -1):
         memory['_id'] = str(memory['_id'])
         memories.append(memory)
 
@@ -105,7 +447,7 @@ def get_all_memories():
     Fetch all memories (admin function - use with caution)
     """
     memories = []
-    for memory in collection.find().sort("upload_date", -1):
+    for memory in get_collection().find().sort("upload_date", -1):
         memory['_id'] = str(memory['_id'])
         memories.append(memory)
 
@@ -115,58 +457,75 @@ def get_all_memories():
 def delete_memory(memory_id, user_id):
     """
     Delete memory by its unique ID, only if it belongs to the user.
+    Its segments go with it; files and index entries are removed in the background.
     """
+    from memory_processor import artifact_gc
     try:
-        # Get memory first to verify ownership and remove associated files
-        memory = collection.find_one({"_id": ObjectId(memory_id), "user_id": user_id})
-        if memory:
-            # Remove the file from uploads
-            if os.path.exists(memory['filepath']):
-                os.remove(memory['filepath'])
-            
-            # Remove keyframes
-            for frame in memory.get('keyframes', []):
-                frame_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frames', frame)
-                if os.path.exists(frame_path):
-                    os.remove(frame_path)
-        
-        result = collection.delete_one({"_id": ObjectId(memory_id), "user_id": user_id})
-        if result.deleted_count > 0:
-            print(f"[Memory Store] Memory {memory_id} deleted successfully by user {user_id}.")
-        else:
+        # Delete atomically (ownership checked in the filter); cleanup happens off the request.
+        # A memory claimed by a batch delete is that request's to count and clean up.
+        query = {"_id": ObjectId(memory_id), "user_id": user_id, "deleting": {"$exists": False}}
+        user_stats.begin_write(user_id)
+        try:
+            memory = get_collection().find_one_and_delete(query, projection=artifact_gc.CLEANUP_FIELDS)
+        except Exception:
+            user_stats.cancel_write(user_id)
+            raise
+        if memory is None:
+            user_stats.cancel_write(user_id)
             print(f"[Memory Store] Memory {memory_id} not found or access denied for user {user_id}.")
-        return result.deleted_count
+            return 0
+        # Segment hits must not outlive the memory in responses cached under the new version
+        get_segments_collection().delete_many({"memory_id": memory['_id']})
+        bump_user_version(user_id, user_stats.finished_write(user_stats.memory_increments(memory, -1)))
+        artifact_gc.schedule_cleanup([memory])
+
+        print(f"[Memory Store] Memory {memory_id} deleted successfully by user {user_id}.")
+        return 1
     except Exception as e:
         print(f"[Memory Store] Error deleting memory {memory_id}: {e}")
         return 0
 
+def delete_memories(memory_ids, user_id):
+    """
+    Delete many of the user's memories at once. Returns the ids actually
+    deleted; ids that are unknown, invalid or owned by someone else are skipped.
+    Segments are removed here, files and index entries in the background.
+    """
+    from memory_processor import artifact_gc
+    ids = [ObjectId(memory_id) for memory_id in memory_ids if ObjectId.is_valid(memory_id)]
+    if not ids:
+        return []
+
+    # Claim the documents first, so a concurrent delete of the same ids cannot
+    # make both requests count (and clean up) the same memory
+    claim = ObjectId()
+    get_collection().update_many(
+        {"_id": {"$in": ids}, "user_id": user_id, "deleting": {"$exists": False}}, {"$set": {"deleting": claim}}
+    )
+    claimed = {"_id": {"$in": ids}, "deleting": claim}
+    memories = list(get_collection().find(claimed, artifact_gc.CLEANUP_FIELDS))
+    if not memories:
+        return []
+    user_stats.begin_write(user_id)
+    try:
+        get_collection().delete_many(claimed)
+    except Exception:
+        user_stats.cancel_write(user_id)
+        raise
+    get_segments_collection().delete_many({"memory_id": {"$in": [memory['_id'] for memory in memories]}})
+
+    increments = {}
+    for memory in memories:
+        for field, value in user_stats.memory_increments(memory, -1).items():
+            increments[field] = increments.get(field, 0) + value
+    bump_user_version(user_id, user_stats.finished_write(increments))
+    artifact_gc.schedule_cleanup(memories)
+    print(f"[Memory Store] {len(memories)} memories deleted by user {user_id}.")
+    return [str(memory['_id']) for memory in memories]
+
 def get_memory_stats(user_id):
     """
-    Get statistics about user's stored memories.
+    Get statistics about user's stored memories (count, duration, storage
+    bytes and per-language counts), read from the incrementally kept stats.
     """
-    total_memories = collection.count_documents({"user_id": user_id})
-    total_duration = collection.aggregate([
-        {"$match": {"user_id": user_id}},
-        {"$group": {
-            "_id": None,
-            "total_duration": {"$sum": "$duration"}
-        }}
-    ])
-    
-    total_duration = list(total_duration)
-    total_duration = total_duration[0]['total_duration'] if total_duration else 0
-    
-    # Count by language for this user
-    language_stats = collection.aggregate([
-        {"$match": {"user_id": user_id}},
-        {"$group": {
-            "_id": "$detected_language",
-            "count": {"$sum": 1}
-        }}
-    ])
-    
-    return {
-        "total_memories": total_memories,
-        "total_duration": total_duration,
-        "language_stats": list(language_stats)
-    }
\ No newline at end of file
+    return user_stats.get_stats(user_id)
\ No newline at end of file
@@ -0,0 +1,356 @@
+"""
+Process metrics in the Prometheus text format, without extra dependencies.
+
+Counters, gauges and histograms live in a per-process registry. Each process
+(gunicorn worker, worker.py) periodically writes a snapshot to METRICS_DIR,
+and the /metrics endpoint merges the snapshots of every process on the host,
+so ingestion metrics recorded by a separate worker show up next to the API's.
+Counters and histograms of exited processes stay in the totals: their
+snapshots are folded into one `retired.json` and deleted, so the directory
+does not grow with every restart. Their gauges are dropped. "Live" gauges
+(e.g. queue depth read from SQLite) are set just before rendering and never
+merged.
+
+The module also has a small sampling profiler that can be switched on for a
+single ingestion job.
+"""
+import fcntl
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+METRICS_DIR = os.environ.get(
+    'METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'metrics')
+)
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+PROFILE_DIR = os.environ.get(
+    'PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'profiles')
+)
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.01))
+RETIRED_SNAPSHOT = 'retired.json'   # summed counters and histograms of exited processes
+
+# Latency buckets (seconds) from fast API calls up to long transcriptions
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+class Metric:
+    def __init__(self, registry, name, help, kind, labels=(), buckets=None, live=False):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) if buckets else None
+        self.live = live
+        self.values = {}   # label values -> float, or [bucket counts..., sum, count] for histograms
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+class CounterMetric(Metric):
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.touch()
+
+class GaugeMetric(Metric):
+    def set(self, value, **labels):
+        with self.registry.lock:
+            self.values[self._key(labels)] = value
+        self.registry.touch()
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.touch()
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class HistogramMetric(Metric):
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+        self.registry.touch()
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.flusher = None
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(CounterMetric(self, name, help, 'counter', labels))
+
+    def gauge(self, name, help, labels=(), live=False):
+        return self._add(GaugeMetric(self, name, help, 'gauge', labels, live=live))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(HistogramMetric(self, name, help, 'histogram', labels, buckets=buckets))
+
+    def touch(self):
+        """Start the snapshot writer on the first update in this process."""
+        if self.flusher is None:
+            with self.lock:
+                if self.flusher is None:
+                    self.flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+                    self.flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"[Metrics] Could not write snapshot: {e}")
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: [[list(key), value if not isinstance(value, list) else list(value)]
+                       for key, value in metric.values.items()]
+                for name, metric in self.metrics.items() if not metric.live
+            }
+
+    def flush(self):
+        """Write this process's values for the /metrics endpoint of any process to merge."""
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def _add_snapshot(self, merged, snapshot, gauges=True):
+        """Sum a snapshot's entries into `merged` ({name: {key: value}})."""
+        for name, entries in snapshot.items():
+            metric = self.metrics.get(name)
+            if metric is None or (metric.kind == 'gauge' and not gauges):
+                continue
+            values = merged.setdefault(name, {})
+            for key, value in entries:
+                key = tuple(key)
+                current = values.get(key)
+                if current is None:
+                    values[key] = value
+                elif isinstance(value, list):
+                    values[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    values[key] = current + value
+
+    def _retire_dead(self):
+        """Fold the snapshots of exited processes into the retired snapshot and delete them."""
+        dead = [path for path in glob.glob(os.path.join(METRICS_DIR, '*.json'))
+                if os.path.basename(path) != RETIRED_SNAPSHOT and not _pid_alive(_snapshot_pid(path))]
+        if not dead:
+            return
+        retired_path = os.path.join(METRICS_DIR, RETIRED_SNAPSHOT)
+        # Every process renders /metrics, so only one may fold a given snapshot
+        with open(os.path.join(METRICS_DIR, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            retired = {}
+            self._add_snapshot(retired, _read_snapshot(retired_path) or {})
+            folded = []
+            for path in dead:
+                snapshot = _read_snapshot(path)
+                if snapshot is not None:
+                    self._add_snapshot(retired, snapshot, gauges=False)
+                    folded.append(path)
+            if not folded:
+                return
+            with open(f"{retired_path}.tmp", 'w') as f:
+                json.dump({name: [[list(key), value] for key, value in values.items()]
+                           for name, values in retired.items()}, f)
+            os.replace(f"{retired_path}.tmp", retired_path)
+            for path in folded:
+                os.remove(path)
+
+    def _merged(self):
+        """Values summed over every process's snapshot (this one read directly)."""
+        self.flush()
+        try:
+            self._retire_dead()
+        except OSError as e:
+            print(f"[Metrics] Could not fold snapshots of exited processes: {e}")
+        merged = {name: {} for name in self.metrics}
+        for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+            snapshot = _read_snapshot(path)
+            if snapshot is None:
+                continue
+            # A process that exited since the fold above: its gauges are gone
+            alive = os.path.basename(path) == RETIRED_SNAPSHOT or _pid_alive(_snapshot_pid(path))
+            self._add_snapshot(merged, snapshot, gauges=alive)
+        with self.lock:
+            for name, metric in self.metrics.items():
+                if metric.live:
+                    merged[name] = dict(metric.values)
+        return merged
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        merged = self._merged()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(merged[name].items()):
+                labels = list(zip(metric.labels, key))
+                if metric.kind != 'histogram':
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets, value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels + [('le', '+Inf')])} {value[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+        return '\n'.join(lines) + '\n'
+
+def _snapshot_pid(path):
+    return int(os.path.basename(path).split('.')[0])
+
+def _read_snapshot(path):
+    """A snapshot file's contents, or None if it is gone or half-written."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(pairs, escaped)) + '}'
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) and not float(value).is_integer() else str(int(value))
+
+registry = Registry()
+
+# --- Application metrics ----------------------------------------------------
+
+STAGE_SECONDS = registry.histogram(
+    'memory_stage_seconds', 'Time spent in each ingestion stage', labels=('stage',)
+)
+JOBS_TOTAL = registry.counter('memory_jobs_total', 'Ingestion job attempts by outcome', labels=('outcome',))
+JOBS_IN_FLIGHT = registry.gauge('memory_jobs_in_flight', 'Ingestion jobs currently being processed')
+QUEUE_JOBS = registry.gauge('memory_job_queue_jobs', 'Jobs in the ingestion queue by status', labels=('status',), live=True)
+REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', 'API request latency', labels=('method', 'route', 'status')
+)
+REQUESTS_IN_FLIGHT = registry.gauge('http_requests_in_flight', 'API requests currently being handled')
+
+def stage_timer(stage):
+    """Context manager timing one ingestion stage (or sub-stage, e.g. decode)."""
+    return STAGE_SECONDS.time(stage=stage)
+
+def render():
+    """Render every metric, refreshing the live queue gauges first."""
+    from memory_processor import job_queue
+    counts = dict(job_queue._connect().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+    for status in ('queued', 'processing', 'completed', 'error'):
+        QUEUE_JOBS.set(counts.get(status, 0), status=status)
+    return registry.render()
+
+# --- Sampling profiler --------------------------------------------------------
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of selected threads every `interval` seconds
+    and counts them in collapsed-stack form (one "thread;outer;...;inner N"
+    line per stack), which flame graph tools read directly.
+    """
+
+    def __init__(self, thread_filter, interval=PROFILE_INTERVAL):
+        self.thread_filter = thread_filter
+        self.interval = interval
+        self.stacks = _Tally()
+        self.samples = 0
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stopping.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, str(ident))
+                if ident == own or not self.thread_filter(ident, name):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[';'.join([name] + stack[::-1])] += 1
+            self.samples += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+@contextmanager
+def profile_job(job_id, thread_prefix):
+    """
+    Profile the calling thread plus threads named with `thread_prefix` (the
+    job's pipeline stages) while the block runs. Yields the path the
+    collapsed stacks are written to when the block exits. Work done in child
+    processes (long-form transcription) is not sampled.
+    """
+    caller = threading.get_ident()
+    profiler = SamplingProfiler(lambda ident, name: ident == caller or name.startswith(thread_prefix))
+    path = os.path.join(PROFILE_DIR, f"{job_id}.folded")
+    profiler.start()
+    try:
+        yield path
+    finally:
+        profiler.stop()
+        profiler.write(path)
+        print(f"[Metrics] Profiled job {job_id}: {profiler.samples} samples written to {path}")
@@ -0,0 +1,99 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class Stage:
+    """
+    One node of the ingestion graph. `func` receives a dict with the outputs of
+    the stages listed in `deps` and returns this stage's output. `weight` is the
+    stage's rough share of total work, used for progress reporting.
+    """
+
+    def __init__(self, name, func, deps=(), label=None, weight=1):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.label = label or name
+        self.weight = weight
+
+
+class Pipeline:
+    """
+    Runs a DAG of stages, starting each one as soon as all of its dependencies
+    have finished. Independent stages run concurrently on a thread pool.
+    """
+
+    def __init__(self, stages, max_workers=None, name='pipeline'):
+        self.stages = {stage.name: stage for stage in stages}
+        self.max_workers = max_workers or len(self.stages)
+        self.name = name  # prefix of the stage threads' names
+
+        for stage in stages:
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+
+    def run(self, completed=None, on_progress=None, on_stage_done=None):
+        """
+        Execute the graph and return (outputs, timings).
+
+        `completed` holds outputs already known (e.g. from a checkpoint); those
+        stages are skipped. `on_progress(states, percent, running_labels)` is
+        called on every stage transition, and `on_stage_done(name, output)`
+        after each stage finishes.
+        """
+        outputs = dict(completed or {})
+        states = {name: ('done' if name in outputs else 'pending') for name in self.stages}
+        timings = {}
+        total_weight = sum(stage.weight for stage in self.stages.values())
+        started_at = time.perf_counter()
+
+        def report():
+            if on_progress is None:
+                return
+            done_weight = sum(self.stages[name].weight for name, state in states.items() if state == 'done')
+            running = [self.stages[name].label for name, state in states.items() if state == 'running']
+            on_progress(dict(states), done_weight / total_weight, running)
+
+        def timed(stage, inputs):
+            stage_start = time.perf_counter()
+            result = stage.func(inputs)
+            return result, stage_start - started_at, time.perf_counter() - started_at
+
+        futures = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name) as executor:
+            while True:
+                # Launch every pending stage whose dependencies are satisfied
+                for name, stage in self.stages.items():
+                    if states[name] == 'pending' and all(states[dep] == 'done' for dep in stage.deps):
+                        inputs = {dep: outputs[dep] for dep in stage.deps}
+                        states[name] = 'running'
+                        futures[executor.submit(timed, stage, inputs)] = name
+                report()
+
+                if not futures:
+                    break
+
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = futures.pop(future)
+                    try:
+                        result, start, end = future.result()
+                    except Exception:
+                        for pending in futures:
+                            pending.cancel()
+                        raise
+                    outputs[name] = result
+                    states[name] = 'done'
+                    timings[name] = {"start": round(start, 3), "end": round(end, 3), "seconds": round(end - start, 3)}
+                    if on_stage_done is not None:
+                        on_stage_done(name, result)
+
+        wall = time.perf_counter() - started_at
+        serial = sum(timing['seconds'] for timing in timings.values())
+        timings['total'] = {
+            "wall_seconds": round(wall, 3),
+            "serial_seconds": round(serial, 3),
+            "speedup": round(serial / wall, 2) if wall > 0 else 1.0,
+        }
+        return outputs, timings
@@ -0,0 +1,230 @@
+"""
+Push-based job progress for the API.
+
+Workers write job status to the SQLite queue, possibly from other processes.
+Each API process runs one watcher thread that checks SQLite's data_version
+(a local counter that changes when any other connection commits, no query
+against the jobs table) and only re-reads the jobs someone is waiting on
+when it moved. Waiting requests (SSE streams and long-polls) sleep on a
+condition variable until their job's status actually changes, so nothing is
+sent to clients while a job is idle apart from rare SSE keep-alive comments.
+The watcher thread itself sleeps while nobody is subscribed. Coroutines (the
+ASGI app) wait on an asyncio event the watcher sets through their loop, so
+they hold no thread either.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from memory_processor import job_queue
+
+PROGRESS_CHECK_INTERVAL = float(os.environ.get('PROGRESS_CHECK_INTERVAL', 0.25))
+SSE_KEEPALIVE_SECONDS = float(os.environ.get('SSE_KEEPALIVE_SECONDS', 15))
+
+TERMINAL_STATUSES = ('completed', 'error', 'unknown')
+UNKNOWN_STATUS = {"status": "unknown", "progress": 0, "message": "No status available"}
+
+def load_status(job_id):
+    """Return (revision, status) for a job; the revision changes whenever the status does."""
+    status = job_queue.get_status(job_id) or dict(UNKNOWN_STATUS)
+    revision = hashlib.sha1(json.dumps(status, sort_keys=True).encode()).hexdigest()[:16]
+    return revision, status
+
+class JobWatcher:
+    """Wakes waiting requests when the status of the job they watch changes."""
+
+    def __init__(self, interval=PROGRESS_CHECK_INTERVAL):
+        self.interval = interval
+        self.cond = threading.Condition()
+        self.watched = {}   # job id -> {"revision", "status", "waiters"}
+        self.thread = None
+        self.checked_version = None   # data_version the watcher last re-read statuses at
+
+    def wait(self, job_id, since=None, timeout=30.0):
+        """
+        Block until the job's revision differs from `since` (returns at once
+        if it already does) or `timeout` passes. Returns (revision, status).
+        """
+        deadline = time.monotonic() + timeout
+        entry = None
+        while entry is None:
+            loaded = None if job_id in self.watched else load_status(job_id)
+            with self.cond:
+                entry = self._subscribe(job_id, loaded)
+        with self.cond:
+            try:
+                while _unchanged(entry, since):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                return entry['revision'], entry['status']
+            finally:
+                self._unsubscribe(job_id, entry)
+
+    async def wait_async(self, job_id, since=None, timeout=30.0):
+        """
+        Like wait(), but suspends the calling coroutine instead of blocking a
+        thread. The first status is read in a worker thread, so SQLite is
+        never queried on the event loop.
+        """
+        from anyio import to_thread
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        listener = (loop, changed)
+        deadline = loop.time() + timeout
+        entry = None
+        while entry is None:
+            loaded = None if job_id in self.watched else await to_thread.run_sync(load_status, job_id)
+            with self.cond:
+                entry = self._subscribe(job_id, loaded)
+                if entry is not None:
+                    entry['listeners'].add(listener)
+        try:
+            while True:
+                with self.cond:
+                    # Cleared under the lock: an update after this point sets it again
+                    changed.clear()
+                    revision, status = entry['revision'], entry['status']
+                    if not _unchanged(entry, since):
+                        return revision, status
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return revision, status
+                try:
+                    await asyncio.wait_for(changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self.cond:
+                entry['listeners'].discard(listener)
+                self._unsubscribe(job_id, entry)
+
+    def _subscribe(self, job_id, loaded):
+        """
+        Count a waiter on the job, starting to watch it with `loaded` (its
+        load_status(), read before taking the lock). Returns None if the job
+        is not watched and nothing was loaded; the caller loads and retries.
+        Called with the lock held.
+        """
+        entry = self.watched.get(job_id)
+        if entry is None:
+            if loaded is None:
+                return None
+            revision, status = loaded
+            entry = self.watched[job_id] = {"revision": revision, "status": status, "waiters": 0, "listeners": set()}
+            # A commit after `loaded` was read may be one the watcher has already checked
+            self.checked_version = None
+        entry['waiters'] += 1
+        self._ensure_thread()
+        self.cond.notify_all()  # wake the watcher if it was idle
+        return entry
+
+    def _unsubscribe(self, job_id, entry):
+        # Called with the lock held
+        entry['waiters'] -= 1
+        if entry['waiters'] == 0:
+            del self.watched[job_id]
+
+    def _ensure_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name='progress-watcher', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.watched:
+                    self.cond.wait()
+                    self.checked_version = None  # statuses may have changed while idle
+            time.sleep(self.interval)
+            try:
+                version = job_queue.data_version()
+                with self.cond:
+                    if version == self.checked_version:
+                        continue
+                    self.checked_version = version
+                    job_ids = list(self.watched)
+                updates = {job_id: load_status(job_id) for job_id in job_ids}
+            except Exception as e:
+                print(f"[Progress] Could not read job status: {e}")
+                continue
+
+            with self.cond:
+                changed = False
+                for job_id, (revision, status) in updates.items():
+                    entry = self.watched.get(job_id)
+                    if entry is not None and entry['revision'] != revision:
+                        entry['revision'], entry['status'] = revision, status
+                        changed = True
+                        for loop, event in entry['listeners']:
+                            loop.call_soon_threadsafe(event.set)
+                if changed:
+                    self.cond.notify_all()
+
+def _unchanged(entry, since):
+    return entry['revision'] == since and entry['status']['status'] not in TERMINAL_STATUSES
+
+watcher = JobWatcher()
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _status_frames(sent, revision, status):
+    """
+    SSE frames for a new status: a `status` event if anything but the partial
+    transcript changed, and a `transcript` event with the appended text.
+    `sent` tracks what the client already has and is updated.
+    """
+    frames = []
+    status = dict(status)
+    transcript = status.pop('partial_transcript', None) or ''
+    if status != sent['status']:
+        frames.append(format_event('status', dict(status, revision=revision)))
+        sent['status'] = status
+    if transcript != sent['transcript']:
+        if transcript.startswith(sent['transcript']):
+            offset = len(sent['transcript'])
+            frames.append(format_event('transcript', {"text": transcript[offset:], "offset": offset}))
+        else:
+            frames.append(format_event('transcript', {"text": transcript, "offset": 0}))
+        sent['transcript'] = transcript
+    return frames
+
+def job_events(job_id, keepalive=SSE_KEEPALIVE_SECONDS):
+    """
+    Server-Sent Events for one job: a `status` event for every change (stage
+    transitions, progress, message) and a `transcript` event carrying only
+    the text appended to the partial transcript since the last one. Ends
+    after the job completes or fails.
+    """
+    yield f"retry: {int(keepalive * 1000)}\n\n"
+    revision = None
+    sent = {"status": None, "transcript": ''}
+    while True:
+        new_revision, status = watcher.wait(job_id, revision, keepalive)
+        if new_revision == revision:
+            yield ": keep-alive\n\n"
+            continue
+        revision = new_revision
+        yield from _status_frames(sent, revision, status)
+        if status['status'] in TERMINAL_STATUSES:
+            return
+
+async def job_events_async(job_id, keepalive=SSE_KEEPALIVE_SECONDS):
+    """job_events as an async generator, for the ASGI app."""
+    yield f"retry: {int(keepalive * 1000)}\n\n"
+    revision = None
+    sent = {"status": None, "transcript": ''}
+    while True:
+        new_revision, status = await watcher.wait_async(job_id, revision, keepalive)
+        if new_revision == revision:
+            yield ": keep-alive\n\n"
+            continue
+        revision = new_revision
+        for frame in _status_frames(sent, revision, status):
+            yield frame
+        if status['status'] in TERMINAL_STATUSES:
+            return
@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Formatted search/list responses, per API process. Entries are keyed by the
+# user's data version (bumped by every save, delete and translation), so a
+# write makes all of that user's cached responses unreachable at once.
+RESPONSE_CACHE_ENTRIES = int(os.environ.get('RESPONSE_CACHE_ENTRIES', 1024))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 300))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a search query."""
+    return ' '.join((query or '').lower().split())
+
+class ResponseCache:
+    """Bounded LRU of response bodies with a TTL and hit-rate counters."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES, ttl=RESPONSE_CACHE_TTL,
+                 max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()   # (user_id, version, key) -> (expires_at, body)
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, user_id, version, key):
+        """Return the cached body, or None on a miss."""
+        cache_key = (user_id, version, key)
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._drop(cache_key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(cache_key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id, version, key, body):
+        if len(body) > self.max_bytes // 4:
+            return  # one huge response would push out everything else
+        cache_key = (user_id, version, key)
+        with self.lock:
+            if cache_key in self.entries:
+                self._drop(cache_key)
+            self.entries[cache_key] = (time.monotonic() + self.ttl, body)
+            self.size += len(body)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _drop(self, cache_key):
+        _, body = self.entries.pop(cache_key)
+        self.size -= len(body)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "expired": self.expired,
+                "evictions": self.evictions,
+            }
+
+response_cache = ResponseCache()
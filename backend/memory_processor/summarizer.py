@@ -1,6 +1,13 @@
+import asyncio
+import hashlib
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
 from dotenv import load_dotenv
-import google.generativeai as genai
 
 # Load .env file
 load_dotenv()
@@ -8,53 +15,397 @@ load_dotenv()
 # Get Gemini API key from environment variable
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-else:
+if not GEMINI_API_KEY:
     print("Gemini API key not found. Please set GEMINI_API_KEY in .env")
 
-def summarize_content(transcript, max_length=150):
+# How summaries are produced:
+#   gemini - Gemini, with the local extractive summarizer when it fails (default)
+#   local  - only the local extractive summarizer; never uses the network
+SUMMARY_MODE = os.environ.get('SUMMARY_MODE', 'gemini')
+SUMMARY_MODEL = os.environ.get('SUMMARY_MODEL', 'gemini-1.5-flash')
+# How Gemini is called:
+#   sdk  - the google-generativeai SDK, one blocking call per thread (default)
+#   http - async REST calls on the shared I/O loop (memory_processor.async_clients)
+SUMMARY_CLIENT = os.environ.get('SUMMARY_CLIENT', 'sdk')
+# Transcripts longer than this are summarized chunk by chunk, then the chunk
+# summaries are combined (map-reduce)
+SUMMARY_CHUNK_CHARS = int(os.environ.get('SUMMARY_CHUNK_CHARS', 12000))
+# Gemini calls in flight per process, and the per-process request budget
+SUMMARY_CONCURRENCY = int(os.environ.get('SUMMARY_CONCURRENCY', 4))
+SUMMARY_REQUESTS_PER_MINUTE = float(os.environ.get('SUMMARY_REQUESTS_PER_MINUTE', 15))
+SUMMARY_MAX_RETRIES = 3
+
+NO_TRANSCRIPT = "No transcript available for summarization"
+SILENT_TRANSCRIPT = "Audio is too silent, please provide clearer audio."
+
+_genai = None
+_model = None
+_model_lock = threading.Lock()
+
+def _get_genai():
+    """Import and configure the Gemini SDK on first use (it is slow to import)."""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        _genai = genai
+    return _genai
+
+def _get_model():
+    """One Gemini model client per process, shared by all jobs."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = _get_genai().GenerativeModel(SUMMARY_MODEL)
+    return _model
+
+# --- Rate limiting --------------------------------------------------------
+
+class RateLimiter:
     """
-    Generate a summary of the transcript using Google Gemini API
+    Token bucket shared by every Gemini call in the process, plus a cap on
+    concurrent calls. A rate-limit error (HTTP 429) pauses all callers, not
+    just the one that hit it.
     """
-    if not GEMINI_API_KEY:
-        return "Summary not available (Gemini API key not configured)"
-    
-    if not transcript or transcript.strip() == "" or transcript == "Audio is too silent, please provide clearer audio.":
-        return "No transcript available for summarization"
-    
-    try:
-        # Initialize Gemini model (fast and cost-efficient)
-        model = genai.GenerativeModel("gemini-1.5-flash")
 
-        # Create the summarization prompt
-        prompt = f"Please provide a concise summary of the following content in {max_length} words or less:\n\n{transcript}"
+    def __init__(self, per_minute=SUMMARY_REQUESTS_PER_MINUTE, concurrency=SUMMARY_CONCURRENCY):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.capacity = max(1.0, min(per_minute, concurrency))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+        self.concurrency = concurrency
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.async_slots = None   # created on the I/O loop
+
+    def _take_token(self):
+        """Take a token if one is available; otherwise return the seconds to wait for one."""
+        with self.lock:
+            now = time.monotonic()
+            if self.interval:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+            self.updated = now
+            wait = self.paused_until - now
+            if wait <= 0:
+                if not self.interval or self.tokens >= 1:
+                    self.tokens -= 1
+                    return 0
+                wait = (1 - self.tokens) * self.interval
+            return wait
+
+    def call(self, fn, *args):
+        # Wait for a token before taking a slot, so callers sleeping on the
+        # rate limit never keep a slot from one that could run now
+        while (wait := self._take_token()) > 0:
+            time.sleep(wait)
+        with self.slots:
+            return fn(*args)
+
+    async def call_async(self, fn, *args):
+        """call() for coroutine functions: waits for a token and a slot without blocking the loop."""
+        if self.async_slots is None:
+            self.async_slots = asyncio.Semaphore(self.concurrency)
+        while (wait := self._take_token()) > 0:
+            await asyncio.sleep(wait)
+        async with self.async_slots:
+            return await fn(*args)
 
-        # Call Gemini API
-        response = model.generate_content(prompt)
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
 
+_limiter = RateLimiter()
+
+def _is_rate_limited(error):
+    return type(error).__name__ in ('ResourceExhausted', 'TooManyRequests') or '429' in str(error)
+
+def _backoff(error, attempt):
+    """After a failed call: pause every caller and return True to retry, or False to give up."""
+    if not _is_rate_limited(error) or attempt == SUMMARY_MAX_RETRIES:
+        return False
+    delay = 2 ** attempt * 5
+    print(f"[Summarizer] Rate limited by Gemini, pausing {delay}s")
+    _limiter.pause(delay)
+    return True
+
+def _generate(prompt):
+    """Send one prompt to Gemini, backing off (for every caller) when rate limited."""
+    for attempt in range(SUMMARY_MAX_RETRIES + 1):
+        try:
+            response = _limiter.call(_get_model().generate_content, prompt)
+        except Exception as e:
+            if not _backoff(e, attempt):
+                raise
+            continue
         if hasattr(response, "text") and response.text:
             return response.text.strip()
-        else:
-            return "Summary unavailable (empty response)"
-    
+        raise ValueError("empty response")
+
+async def _generate_async(prompt):
+    """_generate over async REST (SUMMARY_CLIENT=http)."""
+    from memory_processor import async_clients
+    for attempt in range(SUMMARY_MAX_RETRIES + 1):
+        try:
+            text = await _limiter.call_async(async_clients.gemini_generate, SUMMARY_MODEL, GEMINI_API_KEY, prompt)
+        except Exception as e:
+            if not _backoff(e, attempt):
+                raise
+            continue
+        if text:
+            return text.strip()
+        raise ValueError("empty response")
+
+# --- Map-reduce over long transcripts ------------------------------------
+
+def split_transcript(text, limit=SUMMARY_CHUNK_CHARS):
+    """Split text into chunks under `limit` characters, at sentence ends where possible."""
+    chunks = []
+    while len(text) > limit:
+        cut = max(text.rfind('. ', 0, limit), text.rfind('? ', 0, limit), text.rfind('\n', 0, limit))
+        cut = cut + 1 if cut > limit // 2 else limit
+        chunks.append(text[:cut].strip())
+        text = text[cut:]
+    if text.strip():
+        chunks.append(text.strip())
+    return chunks
+
+def _chunk_prompt(chunk, index, total):
+    return (f"This is part {index + 1} of {total} of a recording's transcript. Summarize the key points "
+            f"of this part in 100 words or less:\n\n{chunk}")
+
+def _combine_prompt(combined, max_length):
+    return (f"These are summaries of consecutive parts of one recording. Combine them into a single "
+            f"concise summary of {max_length} words or less:\n\n{combined}")
+
+def _summary_prompt(transcript, max_length):
+    return f"Please provide a concise summary of the following content in {max_length} words or less:\n\n{transcript}"
+
+def _chunk_failed(chunk, index, total, error):
+    print(f"[Summarizer] Chunk {index + 1}/{total} failed, using local summary: {error}")
+    return fallback_summarize(chunk, max_sentences=4, max_words=100)
+
+def _summarize_chunk(chunk, index, total):
+    """(summary, fallback): fallback is True when the chunk's local summary stood in for Gemini's."""
+    try:
+        return _generate(_chunk_prompt(chunk, index, total)), False
     except Exception as e:
-        print(f"Gemini API request failed: {e}")
-        return "Summary unavailable due to API error"
+        return _chunk_failed(chunk, index, total, e), True
+
+def _gemini_summary(transcript, max_length):
+    """(summary, fallback), where fallback means some chunk was summarized locally."""
+    if SUMMARY_CLIENT == 'http':
+        from memory_processor import async_clients
+        return async_clients.run(_gemini_summary_async(transcript, max_length))
+
+    chunks = split_transcript(transcript)
+    fallback = False
+    while len(chunks) > 1:
+        # Map: chunk summaries are requested concurrently (bounded by the rate limiter)
+        with ThreadPoolExecutor(max_workers=min(SUMMARY_CONCURRENCY, len(chunks))) as pool:
+            partials = list(pool.map(_summarize_chunk, chunks, range(len(chunks)), [len(chunks)] * len(chunks)))
+        fallback = fallback or any(failed for _, failed in partials)
+        # Reduce: combine the partial summaries, chunking again if they are still too long
+        combined = "\n\n".join(partial for partial, _ in partials)
+        if len(combined) <= SUMMARY_CHUNK_CHARS:
+            return _generate(_combine_prompt(combined, max_length)), fallback
+        chunks = split_transcript(combined)
+
+    return _generate(_summary_prompt(transcript, max_length)), fallback
+
+async def _summarize_chunk_async(chunk, index, total):
+    try:
+        return await _generate_async(_chunk_prompt(chunk, index, total)), False
+    except Exception as e:
+        return _chunk_failed(chunk, index, total, e), True
+
+async def _gemini_summary_async(transcript, max_length):
+    """_gemini_summary with every chunk prompt in flight on the I/O loop instead of a thread each."""
+    chunks = split_transcript(transcript)
+    fallback = False
+    while len(chunks) > 1:
+        partials = await asyncio.gather(*(
+            _summarize_chunk_async(chunk, index, len(chunks)) for index, chunk in enumerate(chunks)
+        ))
+        fallback = fallback or any(failed for _, failed in partials)
+        combined = "\n\n".join(partial for partial, _ in partials)
+        if len(combined) <= SUMMARY_CHUNK_CHARS:
+            return await _generate_async(_combine_prompt(combined, max_length)), fallback
+        chunks = split_transcript(combined)
 
-# Fallback summarization if Gemini is not available
-def fallback_summarize(transcript, max_sentences=3):
+    return await _generate_async(_summary_prompt(transcript, max_length)), fallback
+
+# --- Cache and request coalescing -----------------------------------------
+
+def _cache_key(transcript, max_length):
+    return hashlib.sha256(f"{SUMMARY_MODEL}:{max_length}:{transcript}".encode('utf-8')).hexdigest()
+
+def _cache_collection():
+    from memory_processor.memory_store import get_db
+    return get_db()['summary_cache']
+
+def _cached_summary(key):
+    try:
+        entry = _cache_collection().find_one({"_id": key})
+    except Exception as e:
+        print(f"[Summarizer] Summary cache unavailable: {e}")
+        return None
+    return entry['summary'] if entry else None
+
+def _store_summary(key, summary):
+    try:
+        _cache_collection().replace_one(
+            {"_id": key}, {"summary": summary, "model": SUMMARY_MODEL, "created_at": datetime.now()}, upsert=True
+        )
+    except Exception as e:
+        print(f"[Summarizer] Could not cache summary: {e}")
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None   # (summary, fallback)
+
+_inflight = {}   # cache key -> _Call being computed by another thread
+_inflight_lock = threading.Lock()
+
+def summarize_content(transcript, max_length=150):
+    """
+    Generate a summary of the transcript using Google Gemini API and return
+    (summary, fallback). Long transcripts are summarized in chunks and
+    combined. Identical transcripts are summarized once: results are cached by
+    transcript hash, and concurrent requests for the same text share a single
+    computation. When Gemini fails for all or part of the transcript, the
+    local extractive summary stands in and `fallback` is True (also when no
+    GEMINI_API_KEY is set); such summaries are not cached, so callers should
+    not cache them either. With SUMMARY_MODE=local the local summary is the
+    chosen result and `fallback` is False.
+    """
+    if not transcript or transcript.strip() == "" or transcript == SILENT_TRANSCRIPT:
+        return NO_TRANSCRIPT, False
+    if SUMMARY_MODE == 'local':
+        return fallback_summarize(transcript, max_sentences=5, max_words=max_length), False
+    if not GEMINI_API_KEY:
+        # A stand-in until a key is configured, so it must not outlive that
+        return fallback_summarize(transcript, max_sentences=5, max_words=max_length), True
+
+    key = _cache_key(transcript, max_length)
+    summary = _cached_summary(key)
+    if summary is not None:
+        return summary, False
+
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = _Call()
+    if not leader:
+        call.done.wait()
+        return call.result
+
+    try:
+        try:
+            call.result = _gemini_summary(transcript, max_length)
+            if not call.result[1]:
+                _store_summary(key, call.result[0])
+        except Exception as e:
+            print(f"Gemini API request failed, using local summary: {e}")
+            call.result = fallback_summarize(transcript, max_sentences=5, max_words=max_length), True
+        return call.result
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        call.done.set()
+
+# --- Local extractive summary ---------------------------------------------
+
+STOP_WORDS = set("""
+a about above after again against all am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers
+him his how i if in into is it its itself just like me more most my no nor not now of off on once only or other
+our ours out over own same she should so some such than that the their theirs them then there these they this
+those through to too under until up very was we were what when where which while who whom why will with would
+you your yours yeah okay um uh
+""".split())
+TEXTRANK_MAX_SENTENCES = 1500   # above this, rank by similarity to the centroid instead (linear time)
+MAX_VOCABULARY = 2000
+SENTENCE_MAX_WORDS = 40         # unpunctuated speech is cut into pseudo-sentences
+
+def _sentences(text):
+    sentences = []
+    for sentence in re.split(r'(?<=[.!?。！？])\s+', text.strip()):
+        words = sentence.split()
+        for start in range(0, len(words), SENTENCE_MAX_WORDS):
+            sentences.append(' '.join(words[start:start + SENTENCE_MAX_WORDS]))
+    return [s for s in sentences if s]
+
+def _tfidf(sentences):
+    """Row-normalized TF-IDF matrix (sentences x terms) over the most frequent content words."""
+    tokenized = [[w for w in re.findall(r'\w+', s.lower()) if w not in STOP_WORDS and len(w) > 1] for s in sentences]
+    document_frequency = {}
+    for words in tokenized:
+        for word in set(words):
+            document_frequency[word] = document_frequency.get(word, 0) + 1
+    vocabulary = sorted(document_frequency, key=document_frequency.get, reverse=True)[:MAX_VOCABULARY]
+    columns = {word: i for i, word in enumerate(vocabulary)}
+
+    matrix = np.zeros((len(sentences), len(vocabulary)), dtype=np.float32)
+    for row, words in enumerate(tokenized):
+        for word in words:
+            column = columns.get(word)
+            if column is not None:
+                matrix[row, column] += 1
+    idf = np.log((1 + len(sentences)) / (1 + np.array([document_frequency[w] for w in vocabulary], dtype=np.float32))) + 1
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-9)
+
+def _textrank(matrix, damping=0.85, iterations=50):
+    """PageRank over the sentence cosine-similarity graph."""
+    similarity = matrix @ matrix.T
+    np.fill_diagonal(similarity, 0)
+    out_weight = similarity.sum(axis=1, keepdims=True)
+    transition = np.divide(similarity, out_weight, out=np.zeros_like(similarity), where=out_weight > 0)
+    n = len(matrix)
+    scores = np.full(n, 1.0 / n, dtype=np.float32)
+    for _ in range(iterations):
+        updated = (1 - damping) / n + damping * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < 1e-6:
+            return updated
+        scores = updated
+    return scores
+
+def fallback_summarize(transcript, max_sentences=3, max_words=None):
     """
-    Simple fallback summarization when Gemini API is not available
+    Local extractive summary: the most central sentences (TextRank over
+    TF-IDF similarity), in their original order. Needs no network.
     """
-    if not transcript:
-        return "No transcript available for summarization"
-    
-    # Simple algorithm: take the first few sentences
-    sentences = transcript.split('. ')
-    summary = '. '.join(sentences[:max_sentences])
-    
-    if len(sentences) > max_sentences:
-        summary += "..."
-    
-    return summary
+    if not transcript or not transcript.strip():
+        return NO_TRANSCRIPT
+
+    sentences = _sentences(transcript)
+    if len(sentences) <= max_sentences:
+        return ' '.join(sentences)
+
+    matrix = _tfidf(sentences)
+    if len(sentences) <= TEXTRANK_MAX_SENTENCES:
+        scores = _textrank(matrix)
+    else:
+        centroid = matrix.mean(axis=0)
+        scores = matrix @ (centroid / max(np.linalg.norm(centroid), 1e-9))
+    # Tiny bias towards earlier sentences breaks ties in favour of the introduction
+    scores = scores - np.arange(len(sentences)) * 1e-9
+
+    chosen, seen, words = [], set(), 0
+    for index in np.argsort(-scores):
+        normalized = ' '.join(re.findall(r'\w+', sentences[index].lower()))
+        length = len(sentences[index].split())
+        if normalized in seen or (chosen and max_words and words + length > max_words):
+            continue  # repeated sentences are common in speech (and in Whisper output)
+        chosen.append(index)
+        seen.add(normalized)
+        words += length
+        if len(chosen) == max_sentences:
+            break
+    return ' '.join(sentences[i] for i in sorted(chosen))
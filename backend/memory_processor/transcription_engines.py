@@ -0,0 +1,197 @@
+import os
+import re
+import threading
+import time
+
+# Engine selection. Every backend takes 16 kHz mono float32 audio and returns
+# {"text", "language", "segments": [{"start", "end", "text"}, ...]}.
+TRANSCRIBE_ENGINE = os.environ.get('TRANSCRIBE_ENGINE', 'whisper')
+WHISPER_MODEL_SIZE = os.environ.get('WHISPER_MODEL_SIZE', 'medium')
+# Intra-op threads per engine; 0 leaves the library default (all cores).
+TORCH_NUM_THREADS = int(os.environ.get('TORCH_NUM_THREADS', 0))
+
+SAMPLE_RATE = 16000
+
+
+class TranscriptionEngine:
+    """Base class for speech-to-text backends."""
+
+    name = None
+
+    def __init__(self, model_size=WHISPER_MODEL_SIZE, threads=TORCH_NUM_THREADS):
+        self.model_size = model_size
+        self.threads = threads
+
+    def transcribe(self, audio, task="translate"):
+        raise NotImplementedError
+
+
+class WhisperEngine(TranscriptionEngine):
+    """openai-whisper in fp32 PyTorch (the original backend)."""
+
+    name = 'whisper'
+
+    def __init__(self, model_size=WHISPER_MODEL_SIZE, threads=TORCH_NUM_THREADS):
+        super().__init__(model_size, threads)
+        import torch
+        import whisper
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = self._load(whisper, torch)
+
+    def _load(self, whisper, torch):
+        return whisper.load_model(self.model_size, device='cpu')
+
+    def transcribe(self, audio, task="translate"):
+        result = self.model.transcribe(audio, task=task, fp16=False)
+        return {
+            "text": result.get('text', '').strip(),
+            "language": result.get('language', 'unknown'),
+            "segments": [
+                {"start": s['start'], "end": s['end'], "text": s['text'].strip()}
+                for s in result.get('segments', [])
+            ],
+        }
+
+
+class QuantizedWhisperEngine(WhisperEngine):
+    """
+    openai-whisper with its Linear layers dynamically quantized to int8.
+    Uses only PyTorch, so it needs no extra dependency.
+    """
+
+    name = 'whisper-int8'
+
+    def _load(self, whisper, torch):
+        model = whisper.load_model(self.model_size, device='cpu')
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class FasterWhisperEngine(TranscriptionEngine):
+    """
+    CTranslate2 int8 inference through the optional `faster-whisper` package,
+    usually the fastest CPU option.
+    """
+
+    name = 'faster-whisper'
+
+    def __init__(self, model_size=WHISPER_MODEL_SIZE, threads=TORCH_NUM_THREADS):
+        super().__init__(model_size, threads)
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise RuntimeError("The faster-whisper engine requires `pip install faster-whisper`")
+
+        self.model = WhisperModel(model_size, device='cpu', compute_type='int8', cpu_threads=threads)
+
+    def transcribe(self, audio, task="translate"):
+        segments, info = self.model.transcribe(audio, task=task)
+        segments = [{"start": s.start, "end": s.end, "text": s.text.strip()} for s in segments]
+        return {
+            "text": ' '.join(s['text'] for s in segments).strip(),
+            "language": info.language,
+            "segments": segments,
+        }
+
+
+class RemoteEngine(TranscriptionEngine):
+    """
+    Sends audio to the shared inference server (memory_processor.inference_server),
+    which owns the only copy of the model and batches concurrent requests.
+    The model size is chosen by the server.
+    """
+
+    name = 'remote'
+
+    def __init__(self, model_size=WHISPER_MODEL_SIZE, threads=TORCH_NUM_THREADS):
+        super().__init__(model_size, threads)
+        from memory_processor.inference_server import InferenceClient
+        self.client = InferenceClient()
+
+    def transcribe(self, audio, task="translate"):
+        return self.client.transcribe(audio, task=task)
+
+
+ENGINES = {engine.name: engine for engine in (WhisperEngine, QuantizedWhisperEngine, FasterWhisperEngine, RemoteEngine)}
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(name=None, model_size=None, threads=None):
+    """
+    Return a loaded engine, loading it on first use and reusing it afterwards.
+    `threads` only applies when the engine is first loaded.
+    """
+    name = name or TRANSCRIBE_ENGINE
+    model_size = model_size or WHISPER_MODEL_SIZE
+    threads = TORCH_NUM_THREADS if threads is None else threads
+    if name not in ENGINES:
+        raise ValueError(f"Unknown transcription engine '{name}'. Available: {', '.join(ENGINES)}")
+
+    key = (name, model_size)
+    with _engines_lock:
+        if key not in _engines:
+            started = time.perf_counter()
+            _engines[key] = ENGINES[name](model_size, threads)
+            print(f"[Transcriber] Loaded engine {name} ({model_size}) in {time.perf_counter() - started:.1f}s")
+        return _engines[key]
+
+
+def _words(text):
+    return re.sub(r"[^\w\s']", ' ', text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level Levenshtein distance divided by the reference length."""
+    ref, hyp = _words(reference), _words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(
+                previous[j] + 1,                              # deletion
+                current[j - 1] + 1,                           # insertion
+                previous[j - 1] + (ref_word != hyp_word)      # substitution
+            )
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def benchmark_engine(engine, samples, task="transcribe"):
+    """
+    Measure an engine on (name, audio, reference_text) samples.
+    Returns per-sample rows plus the aggregate real-time factor (processing
+    time / audio duration, lower is faster) and word error rate.
+    """
+    rows = []
+    total_audio = total_time = total_errors = total_words = 0.0
+
+    for name, audio, reference in samples:
+        started = time.perf_counter()
+        result = engine.transcribe(audio, task=task)
+        elapsed = time.perf_counter() - started
+
+        duration = len(audio) / SAMPLE_RATE
+        wer = word_error_rate(reference, result['text']) if reference is not None else None
+        rows.append({"sample": name, "seconds": elapsed, "audio_seconds": duration,
+                     "rtf": elapsed / duration if duration else 0.0, "wer": wer})
+
+        total_audio += duration
+        total_time += elapsed
+        if wer is not None:
+            words = len(_words(reference))
+            total_errors += wer * words
+            total_words += words
+
+    return {
+        "engine": engine.name,
+        "model_size": engine.model_size,
+        "rtf": total_time / total_audio if total_audio else 0.0,
+        "wer": total_errors / total_words if total_words else None,
+        "samples": rows,
+    }
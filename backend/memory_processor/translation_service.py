@@ -0,0 +1,204 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+from memory_processor import trigram_index
+from memory_processor.memory_store import bump_user_version, get_collection, get_db
+
+# How English text is obtained for non-English recordings:
+#   async   - googletrans in a background thread, after the memory is saved (default)
+#   offline - a second, local Whisper pass with task="translate"; never uses the network
+#   none    - no translation; only the native-language transcript is stored
+TRANSLATION_MODE = os.environ.get('TRANSLATION_MODE', 'async')
+# How the async mode calls the translator:
+#   googletrans - googletrans, pieces sent in one blocking call (default)
+#   http        - concurrent non-blocking requests on the shared I/O loop (memory_processor.async_clients)
+TRANSLATION_CLIENT = os.environ.get('TRANSLATION_CLIENT', 'googletrans')
+TRANSLATION_BATCH_SIZE = int(os.environ.get('TRANSLATION_BATCH_SIZE', 16))
+TRANSLATION_BATCH_WAIT = float(os.environ.get('TRANSLATION_BATCH_WAIT', 2.0))
+TRANSLATION_RETRY_SECONDS = float(os.environ.get('TRANSLATION_RETRY_SECONDS', 300))
+# How long a process owns a memory it is translating before others may retry it
+TRANSLATION_LEASE_SECONDS = float(os.environ.get('TRANSLATION_LEASE_SECONDS', 600))
+
+# googletrans rejects requests over ~5000 characters
+MAX_PIECE_CHARS = 4500
+
+ENGLISH_LANGUAGES = {'en', 'english'}
+
+def english_text(transcription):
+    """
+    Return the English text for a transcription dict if it is already known
+    (English audio, or an offline Whisper translation), otherwise None.
+    """
+    if transcription.get('translated_transcript'):
+        return transcription['translated_transcript']
+    if transcription['language'] in ENGLISH_LANGUAGES or transcription['language'] == 'unknown':
+        return transcription['transcript']
+    return None
+
+def _text_key(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def _split_text(text, limit=MAX_PIECE_CHARS):
+    """Split text into pieces under the translator's size limit, at sentence ends where possible."""
+    pieces = []
+    while len(text) > limit:
+        cut = max(text.rfind('. ', 0, limit), text.rfind('\n', 0, limit))
+        cut = cut + 1 if cut > 0 else limit
+        pieces.append(text[:cut].strip())
+        text = text[cut:]
+    if text.strip():
+        pieces.append(text.strip())
+    return pieces
+
+class BackgroundTranslator:
+    """
+    Translates saved memories off the ingestion path. Memory ids are queued,
+    collected into batches, and their text pieces are sent to googletrans in
+    one call per batch. Results are cached by text hash, so repeated text is
+    never translated twice. Memories stay marked `translation_status: pending`
+    until translated, and pending ones are retried periodically. Every process
+    runs a translator, so each memory is claimed (`translating`, with a lease)
+    before it is translated; a claim whose process died expires and is retried.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.translator = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='background-translator', daemon=True)
+                self.thread.start()
+
+    def submit(self, memory_id):
+        self.start()
+        self.queue.put(memory_id)
+
+    def _run(self):
+        self._requeue_pending()
+        while True:
+            try:
+                batch = [self.queue.get(timeout=TRANSLATION_RETRY_SECONDS)]
+            except queue.Empty:
+                self._requeue_pending()
+                continue
+
+            deadline = time.monotonic() + TRANSLATION_BATCH_WAIT
+            while len(batch) < TRANSLATION_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                self._translate_batch(list(dict.fromkeys(batch)))
+            except Exception as e:
+                # Memories stay pending and are picked up by the next retry sweep
+                print(f"[Translator] Batch of {len(batch)} failed: {e}")
+
+    def _requeue_pending(self):
+        for memory in get_collection().find(_claimable(), {"_id": 1}):
+            self.queue.put(memory['_id'])
+
+    def _claim(self, memory_ids):
+        """Memories of the batch this process now owns; others are translated elsewhere."""
+        claimed = []
+        for memory_id in memory_ids:
+            memory = get_collection().find_one_and_update(
+                dict(_claimable(), _id=memory_id),
+                {"$set": {"translation_status": "translating",
+                          "translation_lease": time.time() + TRANSLATION_LEASE_SECONDS}},
+                projection={"transcript": 1, "content_hash": 1, "user_id": 1}
+            )
+            if memory is not None:
+                claimed.append(memory)
+        return claimed
+
+    def _translate_batch(self, memory_ids):
+        memories = self._claim(memory_ids)
+        if not memories:
+            return
+        try:
+            self._store_translations(memories)
+        except Exception:
+            # Back to pending, so the next retry sweep (here or elsewhere) picks them up
+            get_collection().update_many(
+                {"_id": {"$in": [m['_id'] for m in memories]}, "translation_status": "translating"},
+                {"$set": {"translation_status": "pending"}, "$unset": {"translation_lease": ""}}
+            )
+            raise
+
+    def _store_translations(self, memories):
+        pieces_by_memory = {m['_id']: _split_text(m['transcript']) for m in memories}
+        translations = self._translate_pieces({p for pieces in pieces_by_memory.values() for p in pieces})
+
+        for memory in memories:
+            translated = ' '.join(translations[p] for p in pieces_by_memory[memory['_id']])
+            get_collection().update_one(
+                {"_id": memory['_id']},
+                {"$set": {"translated_transcript": translated},
+                 "$unset": {"translation_status": "", "translation_lease": ""}}
+            )
+            trigram_index.add_memory({"_id": memory['_id'], "user_id": memory['user_id'],
+                                      "translated_transcript": translated})
+            bump_user_version(memory['user_id'])
+            # Re-uploads of the same content then start with the translation
+            if memory.get('content_hash'):
+                get_db()['artifact_cache'].update_many(
+                    {"content_hash": memory['content_hash'], "translated_transcript": None},
+                    {"$set": {"translated_transcript": translated}}
+                )
+        print(f"[Translator] Translated {len(memories)} memories ({len(translations)} text pieces)")
+
+    def _translate_pieces(self, pieces):
+        """Translate unique text pieces, using and filling the persistent cache."""
+        cache = get_db()['translation_cache']
+        keys = {piece: _text_key(piece) for piece in pieces}
+        cached = {doc['_id']: doc['text'] for doc in cache.find({"_id": {"$in": list(keys.values())}})}
+
+        results = {piece: cached[key] for piece, key in keys.items() if key in cached}
+        missing = [piece for piece in pieces if piece not in results]
+        if missing:
+            for piece, translation in zip(missing, self._translate(missing)):
+                results[piece] = translation.text
+                cache.replace_one(
+                    {"_id": keys[piece]},
+                    {"text": translation.text, "src": translation.src},
+                    upsert=True
+                )
+        return results
+
+    def _translate(self, texts):
+        if TRANSLATION_CLIENT == 'http':
+            from memory_processor import async_clients
+            return async_clients.run(async_clients.translate(texts, dest='en'))
+        if self.translator is None:
+            from googletrans import Translator
+            self.translator = Translator()
+        return self.translator.translate(texts, dest='en')
+
+def _claimable():
+    """Filter for memories waiting for a translator: pending, or claimed by one whose lease ran out."""
+    return {"$or": [
+        {"translation_status": "pending"},
+        {"translation_status": "translating", "translation_lease": {"$lt": time.time()}},
+    ]}
+
+_background = BackgroundTranslator()
+
+def request_translation(memory_id):
+    """Queue a saved memory (marked translation_status: pending) for background translation."""
+    _background.submit(memory_id)
+
+def resume_pending_translations():
+    """Start the background translator, which first requeues memories left pending."""
+    if TRANSLATION_MODE == 'async':
+        _background.start()
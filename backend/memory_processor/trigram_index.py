@@ -0,0 +1,147 @@
+"""
+Trigram inverted index for substring and typo-tolerant memory search.
+
+Postings list the memories whose transcript, translated transcript or
+summary contain a trigram. Each (user, trigram) has one or more bucket
+documents of at most BUCKET_SIZE memory ids, so a common trigram never grows
+one document towards the 16 MB limit or makes every save rewrite a huge
+array. A query only reads the buckets of its own trigrams instead of scanning
+every document, and ranks memories by the share of query trigrams they
+contain. Postings are updated when memories are saved and deleted; to index
+memories saved before this index existed, run from backend/:
+    python -m memory_processor.trigram_index --rebuild [--user USER_ID]
+"""
+import argparse
+import re
+import sys
+from collections import Counter, defaultdict
+from pymongo import UpdateOne
+
+# Share of the query's trigrams a memory must contain to match; below 1.0
+# this tolerates typos ("finacial" still finds "financial")
+TRIGRAM_MIN_SIMILARITY = 0.6
+MAX_CANDIDATES = 200
+BUCKET_SIZE = 1000   # memory ids per posting document
+
+INDEXED_FIELDS = ("transcript", "translated_transcript", "summary")
+
+def _normalize(text):
+    return re.sub(r'[\W_]+', ' ', text.lower()).strip()
+
+def trigrams(text):
+    """Trigrams of normalized text, with words padded so short words and word starts count too."""
+    normalized = f"  {_normalize(text)} "
+    return {normalized[i:i + 3] for i in range(len(normalized) - 2)}
+
+def query_trigrams(query):
+    """
+    Trigrams of a query. Only the word edges the user typed are padded, so
+    "udge" matches inside "budget"; queries under three characters are
+    treated as word prefixes.
+    """
+    normalized = _normalize(query)
+    if len(normalized) < 3:
+        normalized = f" {normalized}"
+    return {normalized[i:i + 3] for i in range(len(normalized) - 2)}
+
+def memory_trigrams(memory):
+    grams = set()
+    for field in INDEXED_FIELDS:
+        if memory.get(field):
+            grams |= trigrams(memory[field])
+    return grams
+
+COLLECTION = 'trigram_postings'
+
+def _postings():
+    from memory_processor.memory_store import get_db
+    return get_db()[COLLECTION]
+
+def ensure_indexes():
+    _postings().create_index([("user_id", 1), ("gram", 1)])
+
+def add_memory(memory):
+    """Add a saved memory document to its user's postings, in a bucket with room left."""
+    not_full = f"memory_ids.{BUCKET_SIZE - 1}"
+    operations = [
+        UpdateOne({"user_id": memory['user_id'], "gram": gram, not_full: {"$exists": False}},
+                  {"$addToSet": {"memory_ids": memory['_id']}}, upsert=True)
+        for gram in memory_trigrams(memory)
+    ]
+    if operations:
+        _postings().bulk_write(operations, ordered=False)
+
+def remove_memory(memory):
+    """Remove a deleted memory document from its user's postings."""
+    grams = list(memory_trigrams(memory))
+    if grams:
+        _postings().update_many(
+            {"user_id": memory['user_id'], "gram": {"$in": grams}, "memory_ids": memory['_id']},
+            {"$pull": {"memory_ids": memory['_id']}}
+        )
+        _postings().delete_many({"user_id": memory['user_id'], "gram": {"$in": grams}, "memory_ids": {"$size": 0}})
+
+def search(user_id, query, limit=MAX_CANDIDATES, min_similarity=TRIGRAM_MIN_SIMILARITY):
+    """
+    Return [(memory_id, similarity), ...], best first, for memories containing
+    at least `min_similarity` of the query's trigrams (1.0 = all of them).
+    """
+    grams = query_trigrams(query)
+    if not grams:
+        return []
+
+    postings = _postings().find({"user_id": user_id, "gram": {"$in": list(grams)}}, {"gram": 1, "memory_ids": 1})
+    return rank_postings(grams, postings, limit, min_similarity)
+
+def rank_postings(grams, postings, limit=MAX_CANDIDATES, min_similarity=TRIGRAM_MIN_SIMILARITY):
+    """Rank memories by how many of the query's `grams` their `postings` documents cover."""
+    # A memory re-added while its first bucket was full can sit in two buckets of a gram
+    covered = {(posting['gram'], memory_id) for posting in postings for memory_id in posting['memory_ids']}
+    counts = Counter(memory_id for _, memory_id in covered)
+
+    # Short queries have too few trigrams to tolerate a miss without matching noise
+    needed = max(min_similarity * len(grams), min(len(grams), 3))
+    return [
+        (memory_id, round(count / len(grams), 4))
+        for memory_id, count in counts.most_common(limit)
+        if count >= needed
+    ]
+
+def rebuild_user_index(user_id, memories):
+    """Rebuild a user's postings from an iterable of memory documents."""
+    postings = defaultdict(list)
+    count = 0
+    for memory in memories:
+        for gram in memory_trigrams(memory):
+            postings[gram].append(memory['_id'])
+        count += 1
+
+    _postings().delete_many({"user_id": user_id})
+    documents = [
+        {"user_id": user_id, "gram": gram, "memory_ids": ids[start:start + BUCKET_SIZE]}
+        for gram, ids in postings.items()
+        for start in range(0, len(ids), BUCKET_SIZE)
+    ]
+    for start in range(0, len(documents), 1000):
+        _postings().insert_many(documents[start:start + 1000], ordered=False)
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Trigram search index maintenance")
+    parser.add_argument('--rebuild', action='store_true', help='rebuild postings from the database')
+    parser.add_argument('--user', help='only rebuild this user (default: every user)')
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return 1
+
+    from memory_processor.memory_store import get_collection
+    projection = {field: 1 for field in INDEXED_FIELDS}
+    user_ids = [args.user] if args.user else get_collection().distinct('user_id')
+    for user_id in user_ids:
+        count = rebuild_user_index(user_id, get_collection().find({"user_id": user_id}, projection))
+        print(f"[Trigram Index] Rebuilt postings for user {user_id}: {count} memories")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""
+Resumable chunked uploads.
+
+A client opens a session with the file name and size, then PUTs the bytes
+in order, each chunk tagged with its offset. Chunks are streamed straight
+into the final upload file, the SHA-256 is updated as data arrives, and the
+media type is sniffed from the first bytes. After a dropped connection the
+client asks for the session's offset and continues from there. As soon as
+enough of the file is on disk, ffprobe reads its streams in the background,
+so ingestion knows the audio track before the last chunk lands.
+
+Sessions live in the same SQLite file as the job queue, so every API
+process on the host sees them.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+from memory_processor.job_queue import JOBS_DB_PATH
+
+UPLOAD_CHUNK_BYTES = int(os.environ.get('UPLOAD_CHUNK_BYTES', 8 * 1024 * 1024))   # suggested to clients
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 4 * 1024 ** 3))
+UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 3600))
+PROBE_MIN_BYTES = 2 * 1024 * 1024   # first probe once this much has arrived
+PROBE_RETRY_BYTES = 32 * 1024 * 1024  # e.g. MP4s with the index at the end need more
+COPY_BUFFER = 1024 * 1024
+
+class UploadError(Exception):
+    """A rejected upload request; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+_local = threading.local()
+_schema_ready = False
+
+def _connect():
+    global _schema_ready
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(JOBS_DB_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        _local.conn = conn
+    if not _schema_ready:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                filepath TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                received INTEGER NOT NULL DEFAULT 0,
+                media_type TEXT,
+                probe TEXT,
+                probed_at_bytes INTEGER NOT NULL DEFAULT 0,
+                content_hash TEXT,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        _schema_ready = True
+    return conn
+
+def _session_dict(row):
+    session = dict(row)
+    session['probe'] = json.loads(session['probe']) if session['probe'] else None
+    return session
+
+# --- Type sniffing --------------------------------------------------------
+
+def sniff_media_type(header):
+    """
+    Identify an upload from its first bytes (magic numbers), independent of
+    the file name. Returns 'mp3', 'wav', 'avi', 'mkv', 'mp4' or None.
+    """
+    if header[:3] == b'ID3' or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        return 'mp3'
+    if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        return 'wav'
+    if header[:4] == b'RIFF' and header[8:12] == b'AVI ':
+        return 'avi'
+    if header[:4] == b'\x1a\x45\xdf\xa3':
+        return 'mkv'  # Matroska / WebM (EBML header)
+    if header[4:8] in (b'ftyp', b'moov', b'mdat', b'wide', b'free'):
+        return 'mp4'  # ISO base media: MP4 and QuickTime MOV
+    return None
+
+# --- Incremental hashing --------------------------------------------------
+
+# Per-process SHA-256 state: session id -> (offset hashed so far, hasher).
+# If a chunk lands on a process without the state (another worker, or after
+# a restart), the bytes already on disk are hashed once to catch up.
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+def _hasher_at(session, offset):
+    with _hashers_lock:
+        state = _hashers.pop(session['id'], None)
+    if state is not None and state[0] == offset:
+        return state[1]
+
+    digest = hashlib.sha256()
+    with open(session['filepath'], 'rb') as f:
+        remaining = offset
+        while remaining:
+            block = f.read(min(COPY_BUFFER, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest
+
+# --- Sessions -------------------------------------------------------------
+
+def create_session(user_id, filename, filepath, size):
+    """Open an upload session for a file of `size` bytes, stored at `filepath`."""
+    if size <= 0 or size > MAX_UPLOAD_BYTES:
+        raise UploadError(f"File size must be between 1 byte and {MAX_UPLOAD_BYTES} bytes")
+    expire_stale_sessions()
+
+    session_id = uuid.uuid4().hex
+    now = time.time()
+    open(filepath, 'wb').close()
+    _connect().execute(
+        """INSERT INTO upload_sessions (id, user_id, filename, filepath, size, status, created_at, updated_at)
+           VALUES (?, ?, ?, ?, ?, 'uploading', ?, ?)""",
+        (session_id, user_id, filename, filepath, size, now, now)
+    )
+    return get_session(session_id, user_id)
+
+def get_session(session_id, user_id):
+    row = _connect().execute(
+        'SELECT * FROM upload_sessions WHERE id = ? AND user_id = ?', (session_id, user_id)
+    ).fetchone()
+    if row is None:
+        raise UploadError("Upload session not found", status=404)
+    return _session_dict(row)
+
+def write_chunk(session_id, user_id, offset, stream, length):
+    """
+    Append `length` bytes from `stream` at `offset`, which must equal the
+    bytes received so far (a mismatch answers 409 with the expected offset,
+    so the client can resume). Returns the updated session; its status is
+    'complete' and content_hash is set once the last byte arrived.
+    """
+    session = get_session(session_id, user_id)
+    if session['status'] != 'uploading':
+        raise UploadError(f"Upload is {session['status']}", status=409, offset=session['received'])
+
+    with open(session['filepath'], 'r+b') as f:
+        # One writer per session at a time, across threads and processes
+        fcntl.flock(f, fcntl.LOCK_EX)
+        session = get_session(session_id, user_id)
+        if offset != session['received']:
+            raise UploadError("Chunk offset does not match the bytes received", status=409,
+                              offset=session['received'])
+        if offset + length > session['size']:
+            raise UploadError("Chunk runs past the declared file size", status=416, offset=offset)
+
+        digest = _hasher_at(session, offset)
+        f.seek(offset)
+        f.truncate()  # drop any partial tail left by an interrupted chunk
+        written = 0
+        media_type = session['media_type']
+        while written < length:
+            block = stream.read(min(COPY_BUFFER, length - written))
+            if not block:
+                break
+            if media_type is None and offset + written == 0:
+                media_type = sniff_media_type(block[:16])
+                if media_type is None:
+                    _abort(session, 'rejected')
+                    raise UploadError("File is not a supported audio or video format", status=415)
+            f.write(block)
+            digest.update(block)
+            written += len(block)
+        f.flush()
+
+        received = offset + written
+        complete = received == session['size']
+        content_hash = digest.hexdigest() if complete else None
+        _connect().execute(
+            """UPDATE upload_sessions SET received = ?, media_type = ?, content_hash = ?, status = ?,
+                      updated_at = ? WHERE id = ?""",
+            (received, media_type, content_hash, 'complete' if complete else 'uploading', time.time(), session_id)
+        )
+        if not complete:
+            with _hashers_lock:
+                _hashers[session_id] = (received, digest)
+
+    session = get_session(session_id, user_id)
+    _maybe_probe(session)
+    if written < length:
+        raise UploadError("Connection closed before the chunk finished; resume from offset",
+                          status=400, offset=received)
+    return session
+
+def abort_session(session_id, user_id):
+    _abort(get_session(session_id, user_id), 'aborted')
+
+def _abort(session, status):
+    _connect().execute(
+        'UPDATE upload_sessions SET status = ?, updated_at = ? WHERE id = ?', (status, time.time(), session['id'])
+    )
+    with _hashers_lock:
+        _hashers.pop(session['id'], None)
+    if os.path.exists(session['filepath']):
+        os.remove(session['filepath'])
+
+def expire_stale_sessions():
+    """Drop unfinished sessions idle for longer than UPLOAD_SESSION_TTL, with their partial files."""
+    cutoff = time.time() - UPLOAD_SESSION_TTL
+    for row in _connect().execute(
+        "SELECT * FROM upload_sessions WHERE status = 'uploading' AND updated_at < ?", (cutoff,)
+    ).fetchall():
+        _abort(_session_dict(row), 'expired')
+    _connect().execute("DELETE FROM upload_sessions WHERE status != 'uploading' AND updated_at < ?", (cutoff,))
+
+# --- Early probing --------------------------------------------------------
+
+def probe_media(filepath):
+    """
+    Read stream information with ffprobe (works on a partially written file
+    when the container's header is at the start). Returns a dict, or None if
+    ffprobe cannot parse the file yet.
+    """
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_streams", "-show_format", "-of", "json", filepath],
+        capture_output=True
+    )
+    if result.returncode != 0:
+        return None
+    info = json.loads(result.stdout or b'{}')
+    streams = info.get('streams', [])
+    audio = [s for s in streams if s.get('codec_type') == 'audio']
+    if not streams:
+        return None
+    duration = info.get('format', {}).get('duration')
+    return {
+        "has_audio": bool(audio),
+        "has_video": any(s.get('codec_type') == 'video' and s.get('disposition', {}).get('attached_pic') != 1
+                         for s in streams),
+        "audio_codec": audio[0].get('codec_name') if audio else None,
+        "sample_rate": int(audio[0]['sample_rate']) if audio and audio[0].get('sample_rate') else None,
+        "duration": float(duration) if duration not in (None, 'N/A') else None,
+    }
+
+def _maybe_probe(session):
+    """Probe in the background once enough bytes are in, retrying as more arrive until it succeeds."""
+    if session['probe'] is not None:
+        return
+    threshold = PROBE_MIN_BYTES if not session['probed_at_bytes'] else session['probed_at_bytes'] + PROBE_RETRY_BYTES
+    if session['received'] < min(threshold, session['size']):
+        return
+    _connect().execute(
+        'UPDATE upload_sessions SET probed_at_bytes = ? WHERE id = ?', (session['received'], session['id'])
+    )
+    thread = threading.Thread(target=_probe, args=(session['id'], session['filepath']), daemon=True)
+    with _probes_lock:
+        _probes[session['id']] = thread
+    thread.start()
+
+_probes = {}   # session id -> probe thread started by this process
+_probes_lock = threading.Lock()
+
+def _probe(session_id, filepath):
+    try:
+        probe = probe_media(filepath)
+    except Exception as e:
+        print(f"[Uploads] Probe failed for session {session_id}: {e}")
+        return
+    finally:
+        with _probes_lock:
+            _probes.pop(session_id, None)
+    if probe is not None:
+        _connect().execute('UPDATE upload_sessions SET probe = ? WHERE id = ?', (json.dumps(probe), session_id))
+        print(f"[Uploads] Probed session {session_id}: {probe}")
+
+def wait_for_probe(session_id, user_id, timeout=5.0):
+    """Return the session's probe result, waiting briefly if this process is still probing."""
+    with _probes_lock:
+        thread = _probes.get(session_id)
+    if thread is not None:
+        thread.join(timeout)
+    return get_session(session_id, user_id)['probe']
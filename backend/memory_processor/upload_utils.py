@@ -0,0 +1,20 @@
+import hashlib
+
+CHUNK_SIZE = 1024 * 1024
+
+def save_and_hash(stream, filepath):
+    """
+    Copy an upload stream to disk in chunks, hashing it on the way.
+    Returns (sha256_hex, size_in_bytes).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(filepath, 'wb') as f:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
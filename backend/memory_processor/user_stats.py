@@ -0,0 +1,176 @@
+"""
+Per-user memory statistics, maintained incrementally.
+
+Each user's `user_state` document carries a `stats` sub-document (memory
+count, total media duration, storage bytes and per-language counts). Saves
+and deletes adjust it with `$inc` in the same update that bumps the user's
+version, so reading stats is a single document lookup. Each save or delete
+also counts itself in `writes_started` before it touches the memories and in
+`writes_finished` with its stats update, which tells a rebuild whether a
+memory may be written but not yet counted. If the stats are missing or have
+drifted, recompute them from the memories, from backend/:
+    python -m memory_processor.user_stats --rebuild [--user USER_ID]
+"""
+import argparse
+import os
+import sys
+import time
+from memory_processor.frame_files import frame_variants
+
+REBUILD_ATTEMPTS = 5
+REBUILD_RETRY_SECONDS = 0.5
+# A save or delete still unfinished after this long is taken to have died
+STALE_WRITE_SECONDS = 600
+
+def _user_state():
+    from memory_processor.memory_store import get_db
+    return get_db()['user_state']
+
+def _language_key(language):
+    # Field names may not contain dots or start with '$'
+    return (language or 'unknown').replace('.', '_').lstrip('$') or 'unknown'
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def storage_bytes(filepath, keyframes, contact_sheet=None):
+    """
+    Bytes on disk attributed to a memory: its upload plus every size of its
+    keyframes and its contact sheet. Frames shared with other memories count
+    towards each of them.
+    """
+    from memory_processor.memory_store import FRAMES_FOLDER
+    frames = [variant for frame in keyframes for variant in frame_variants(frame)]
+    if contact_sheet:
+        frames.append(contact_sheet['file'])
+    return _file_size(filepath) + sum(_file_size(os.path.join(FRAMES_FOLDER, frame)) for frame in frames)
+
+def memory_increments(memory, sign=1):
+    """`$inc` fields that add (sign=1) or remove (sign=-1) a memory document from its user's stats."""
+    return {
+        "stats.total_memories": sign,
+        "stats.total_duration": sign * float(memory.get('duration') or 0),
+        "stats.storage_bytes": sign * int(memory.get('storage_bytes') or 0),
+        f"stats.languages.{_language_key(memory.get('detected_language'))}": sign,
+    }
+
+def begin_write(user_id):
+    """
+    Announce a save or delete of the user's memories, before the memories
+    collection changes. Close it with the `finished_write()` fields in the
+    stats update, or with cancel_write() if nothing was written.
+    """
+    _user_state().update_one(
+        {"_id": user_id}, {"$inc": {"writes_started": 1}, "$set": {"write_started_at": time.time()}}, upsert=True
+    )
+
+def finished_write(increments=None):
+    """`$inc` fields of a stats update that also closes a begin_write()."""
+    return dict(increments or {}, writes_finished=1)
+
+def cancel_write(user_id):
+    _user_state().update_one({"_id": user_id}, {"$inc": {"writes_finished": 1}})
+
+def get_stats(user_id):
+    """Return the user's stats, computing them once if they were never built."""
+    state = _user_state().find_one({"_id": user_id}, {"stats": 1}) or {}
+    stats = state.get('stats') or {}
+    if not stats.get('complete'):
+        # Only $inc updates so far (memories saved before stats existed are
+        # missing). One attempt, so the request never waits out busy writers;
+        # if it cannot be stored, the counted stats are served and a later
+        # request tries again.
+        stats = rebuild_user_stats(user_id, attempts=1)
+    return format_stats(stats)
+
+def format_stats(stats):
+    """The API's view of a `stats` sub-document."""
+    languages = sorted(
+        ((language, count) for language, count in stats.get('languages', {}).items() if count > 0),
+        key=lambda item: -item[1]
+    )
+    return {
+        "total_memories": stats.get('total_memories', 0),
+        "total_duration": round(stats.get('total_duration', 0), 1),
+        "storage_bytes": stats.get('storage_bytes', 0),
+        "language_stats": [{"_id": language, "count": count} for language, count in languages],
+    }
+
+def rebuild_user_stats(user_id, attempts=REBUILD_ATTEMPTS):
+    """
+    Recompute a user's stats from their memories. The result is only written
+    if no save or delete was in flight when counting started and none began
+    meanwhile (otherwise it is recomputed, up to `attempts` times), so a memory
+    written but not yet added to the stats is never counted twice, nor a
+    deleted one missed. Returns the counted stats either way.
+    """
+    from memory_processor.memory_store import get_collection
+    memories = get_collection()
+    _user_state().update_one({"_id": user_id}, {"$setOnInsert": {"version": 0}}, upsert=True)
+    for counter in ('writes_started', 'writes_finished'):
+        _user_state().update_one({"_id": user_id, counter: {"$exists": False}}, {"$set": {counter: 0}})
+
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(REBUILD_RETRY_SECONDS)
+        state = _user_state().find_one({"_id": user_id})
+        started, finished = state['writes_started'], state['writes_finished']
+        in_flight = started != finished
+        # Writers that died never finish; counting from the memories settles them
+        stalled = in_flight and time.time() - state.get('write_started_at', 0) > STALE_WRITE_SECONDS
+
+        # Memories saved before storage was tracked get their size recorded once
+        for memory in memories.find({"user_id": user_id, "storage_bytes": {"$exists": False}},
+                                    {"filepath": 1, "keyframes": 1, "contact_sheet": 1}):
+            size = storage_bytes(memory.get('filepath', ''), memory.get('keyframes', []), memory.get('contact_sheet'))
+            memories.update_one({"_id": memory['_id']}, {"$set": {"storage_bytes": size}})
+
+        stats = {"total_memories": 0, "total_duration": 0.0, "storage_bytes": 0, "languages": {}, "complete": True}
+        for group in memories.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$group": {
+                "_id": "$detected_language",
+                "count": {"$sum": 1},
+                "duration": {"$sum": "$duration"},
+                "bytes": {"$sum": "$storage_bytes"},
+            }}
+        ]):
+            language = _language_key(group['_id'])
+            stats['languages'][language] = stats['languages'].get(language, 0) + group['count']
+            stats['total_memories'] += group['count']
+            stats['total_duration'] += float(group['duration'] or 0)
+            stats['storage_bytes'] += int(group['bytes'] or 0)
+
+        if in_flight and not stalled:
+            continue
+        result = _user_state().update_one(
+            {"_id": user_id, "writes_started": started, "writes_finished": finished},
+            {"$set": {"stats": stats, "writes_finished": started}}
+        )
+        if result.matched_count:
+            return stats
+    print(f"[User Stats] Memories of user {user_id} kept changing; stats not rebuilt")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-user statistics maintenance")
+    parser.add_argument('--rebuild', action='store_true', help='recompute stats from the database')
+    parser.add_argument('--user', help='only rebuild this user (default: every user)')
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return 1
+
+    from memory_processor.memory_store import get_collection
+    user_ids = [args.user] if args.user else get_collection().distinct('user_id')
+    for user_id in user_ids:
+        stats = rebuild_user_stats(user_id)
+        print(f"[User Stats] Rebuilt stats for user {user_id}: {stats['total_memories']} memories, "
+              f"{stats['total_duration']:.0f}s, {stats['storage_bytes']} bytes")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
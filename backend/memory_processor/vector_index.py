@@ -0,0 +1,284 @@
+"""
+Per-user semantic index over memory summaries and transcript chunks.
+
+Embeddings come from a local CPU sentence-transformers model. Memories are
+indexed when saved and tombstoned when deleted; to index memories saved
+before this index existed, run from backend/:
+    python -m memory_processor.vector_index --rebuild [--user USER_ID]
+"""
+import argparse
+import fcntl
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+
+# Local CPU embedding model (multilingual, so native-language transcripts
+# embed into the same space as English queries)
+EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'paraphrase-multilingual-MiniLM-L12-v2')
+VECTOR_INDEX_DIR = os.environ.get(
+    'VECTOR_INDEX_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'vector_index')
+)
+CHUNK_WORDS = 120
+CHUNK_OVERLAP_WORDS = 20
+COMPACT_RATIO = 0.25   # rewrite a user's index once this share of rows is deleted
+# Users whose index (row ids and memory map) a process keeps open
+VECTOR_INDEX_CACHE_USERS = int(os.environ.get('VECTOR_INDEX_CACHE_USERS', 256))
+
+_model = None
+_model_lock = threading.Lock()
+
+def _get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(EMBEDDING_MODEL, device='cpu')
+    return _model
+
+def embed(texts):
+    """Embed texts as L2-normalized float32 rows, so dot product = cosine similarity."""
+    vectors = _get_model().encode(
+        list(texts), batch_size=32, normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False
+    )
+    return np.asarray(vectors, dtype=np.float32)
+
+def chunk_text(text, words=CHUNK_WORDS, overlap=CHUNK_OVERLAP_WORDS):
+    """Split a transcript into overlapping word windows."""
+    tokens = text.split()
+    step = words - overlap
+    return [' '.join(tokens[i:i + words]) for i in range(0, max(len(tokens) - overlap, 1), step)]
+
+def memory_texts(summary, transcript):
+    """The passages embedded for one memory: its summary plus transcript chunks."""
+    texts = [summary] if summary else []
+    if transcript:
+        texts.extend(chunk_text(transcript))
+    return texts
+
+def top_k(matrix, queries, k, live=None):
+    """
+    Batched cosine top-k: `queries` (Q x D) against `matrix` (N x D), both
+    normalized. Rows where the boolean mask `live` is False are skipped.
+    Returns (indices, scores), each Q x min(k, live rows), best first.
+    """
+    scores = queries @ matrix.T
+    if live is not None:
+        scores[:, ~live] = -np.inf
+        k = min(k, int(live.sum()))
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+class UserVectorIndex:
+    """
+    Append-only on-disk index for one user:
+      vectors.f32     raw float32 rows, memory-mapped for search
+      rows.jsonl      one memory id per row
+      deleted.jsonl   tombstoned memory ids (compacted away periodically)
+      meta.json       the embedding dimension
+    Writers take an exclusive file lock, so API and worker processes can
+    update the same index; readers reload under a shared lock when the files
+    change, so they never see half of an append or of a compaction.
+    """
+
+    def __init__(self, user_id):
+        self.directory = os.path.join(VECTOR_INDEX_DIR, user_id)
+        self.vectors_path = os.path.join(self.directory, 'vectors.f32')
+        self.rows_path = os.path.join(self.directory, 'rows.jsonl')
+        self.deleted_path = os.path.join(self.directory, 'deleted.jsonl')
+        self.meta_path = os.path.join(self.directory, 'meta.json')
+        self._loaded_version = None
+        self._matrix = None
+        self._row_ids = None
+        self._live = None
+
+    @contextmanager
+    def _locked(self, shared=False):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_lines(self, path):
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _dimension(self):
+        if not os.path.exists(self.meta_path):
+            return None
+        with open(self.meta_path) as f:
+            return json.load(f)['dim']
+
+    def add(self, memory_id, vectors):
+        vectors = np.atleast_2d(vectors)
+        with self._locked():
+            n_rows = len(self._read_lines(self.rows_path))
+            dim = self._dimension()
+            if dim is None:
+                with open(self.meta_path, 'w') as f:
+                    json.dump({"dim": vectors.shape[1]}, f)
+            elif dim != vectors.shape[1]:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the index ({dim}); "
+                                 f"rebuild it after changing EMBEDDING_MODEL")
+            elif os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) > n_rows * dim * 4:
+                # Vectors of an append that died before its rows were written
+                os.truncate(self.vectors_path, n_rows * dim * 4)
+            with open(self.vectors_path, 'ab') as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            with open(self.rows_path, 'a') as f:
+                f.writelines(json.dumps(memory_id) + '\n' for _ in range(len(vectors)))
+
+    def remove(self, memory_id):
+        with self._locked():
+            with open(self.deleted_path, 'a') as f:
+                f.write(json.dumps(memory_id) + '\n')
+            self._compact_if_needed()
+
+    def _compact_if_needed(self):
+        rows = self._read_lines(self.rows_path)
+        deleted = set(self._read_lines(self.deleted_path))
+        dead = sum(1 for row in rows if row in deleted)
+        if not rows or dead / len(rows) < COMPACT_RATIO:
+            return
+
+        matrix = self._read_matrix(len(rows))
+        rows = rows[:len(matrix)]
+        keep = np.array([row not in deleted for row in rows], dtype=bool)
+        # Write new files and swap them in, so readers never see a partial index
+        with open(self.vectors_path + '.tmp', 'wb') as f:
+            f.write(np.ascontiguousarray(matrix[keep]).tobytes())
+        with open(self.rows_path + '.tmp', 'w') as f:
+            f.writelines(json.dumps(row) + '\n' for row, k in zip(rows, keep) if k)
+        os.replace(self.vectors_path + '.tmp', self.vectors_path)
+        os.replace(self.rows_path + '.tmp', self.rows_path)
+        os.remove(self.deleted_path)
+
+    def _read_matrix(self, n_rows):
+        """The first `n_rows` vectors, or fewer if the file holds fewer whole rows."""
+        dim = self._dimension()
+        if n_rows == 0 or not dim or not os.path.exists(self.vectors_path):
+            return np.empty((0, dim or 0), dtype=np.float32)
+        n_rows = min(n_rows, os.path.getsize(self.vectors_path) // 4 // dim)
+        if n_rows == 0:
+            return np.empty((0, dim), dtype=np.float32)
+        return np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(n_rows, dim))
+
+    def _version(self):
+        return tuple(
+            (os.stat(path).st_mtime_ns, os.stat(path).st_size) if os.path.exists(path) else None
+            for path in (self.vectors_path, self.rows_path, self.deleted_path)
+        )
+
+    def _load(self):
+        if self._version() != self._loaded_version:
+            with self._locked(shared=True):
+                version = self._version()
+                rows = self._read_lines(self.rows_path)
+                deleted = set(self._read_lines(self.deleted_path))
+                matrix = self._read_matrix(len(rows))
+            rows = rows[:len(matrix)]
+            # Tombstoned rows stay in the memory map and are masked out of the scores
+            live = np.array([row not in deleted for row in rows], dtype=bool)
+            self._matrix = matrix
+            self._row_ids = rows
+            self._live = None if live.all() else live
+            self._loaded_version = version
+        return self._matrix, self._row_ids, self._live
+
+    def search(self, query_vectors, k=20):
+        """
+        Return, per query, [(memory_id, best_similarity), ...] for the top-k
+        memories (a memory's score is its best-matching passage).
+        """
+        matrix, row_ids, live = self._load()
+        if not row_ids:
+            return [[] for _ in range(len(query_vectors))]
+
+        # Over-fetch passages, since several may belong to the same memory
+        indices, scores = top_k(matrix, query_vectors, k * 4, live)
+        results = []
+        for query_indices, query_scores in zip(indices, scores):
+            best = {}
+            for index, score in zip(query_indices, query_scores):
+                memory_id = row_ids[index]
+                if memory_id not in best:
+                    best[memory_id] = float(score)
+            results.append(list(best.items())[:k])
+        return results
+
+_indexes = OrderedDict()   # user id -> UserVectorIndex, least recently used first
+_indexes_lock = threading.Lock()
+
+def get_user_index(user_id):
+    with _indexes_lock:
+        if user_id not in _indexes:
+            _indexes[user_id] = UserVectorIndex(user_id)
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > VECTOR_INDEX_CACHE_USERS:
+            _indexes.popitem(last=False)
+        return _indexes[user_id]
+
+def index_memory(user_id, memory_id, summary, transcript):
+    """Embed a saved memory's summary and transcript chunks into the user's index."""
+    texts = memory_texts(summary, transcript)
+    if texts:
+        get_user_index(user_id).add(str(memory_id), embed(texts))
+
+def remove_memory(user_id, memory_id):
+    get_user_index(user_id).remove(str(memory_id))
+
+def search(user_id, query, k=20):
+    """Top-k [(memory_id, cosine_similarity), ...] for one query."""
+    index = get_user_index(user_id)
+    if not os.path.exists(index.rows_path):
+        return []
+    return index.search(embed([query]), k)[0]
+
+def rebuild_user_index(user_id, memories):
+    """Rebuild a user's index from (memory_id, summary, transcript) tuples."""
+    index = get_user_index(user_id)
+    with index._locked():
+        for path in (index.vectors_path, index.rows_path, index.deleted_path, index.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+    count = 0
+    for memory_id, summary, transcript in memories:
+        index_memory(user_id, memory_id, summary, transcript)
+        count += 1
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic search index maintenance")
+    parser.add_argument('--rebuild', action='store_true', help='re-embed memories from the database')
+    parser.add_argument('--user', help='only rebuild this user (default: every user)')
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return 1
+
+    from memory_processor.memory_store import get_collection
+    user_ids = [args.user] if args.user else get_collection().distinct('user_id')
+    for user_id in user_ids:
+        memories = get_collection().find({"user_id": user_id}, {"summary": 1, "transcript": 1})
+        count = rebuild_user_index(
+            user_id, ((m['_id'], m.get('summary'), m.get('transcript')) for m in memories)
+        )
+        print(f"[Vector Index] Rebuilt index for user {user_id}: {count} memories")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""
+Shared fixtures. Tests run from backend/ with `python -m pytest` against an
+in-memory mongomock database, so no MongoDB server is needed.
+"""
+import os
+import sys
+
+import mongomock
+import pytest
+from pymongo import UpdateOne
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_processor import artifact_gc, db, memory_store, vector_index
+
+
+@pytest.fixture(scope='session')
+def mongo_client():
+    """
+    An in-memory mongomock client. mongomock's bulk_write does not accept the
+    UpdateOne operations of current pymongo, so those are replayed one by one.
+    """
+    bulk_write = mongomock.collection.Collection.bulk_write
+
+    def compatible_bulk_write(self, requests, ordered=True, **kwargs):
+        try:
+            return bulk_write(self, requests, ordered=ordered, **kwargs)
+        except TypeError:
+            for request in requests:
+                if not isinstance(request, UpdateOne):
+                    raise
+                self.update_one(request._filter, request._doc, upsert=request._upsert)
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(mongomock.collection.Collection, 'bulk_write', compatible_bulk_write)
+        yield mongomock.MongoClient()
+
+
+@pytest.fixture
+def mongo(mongo_client, monkeypatch):
+    """An empty memory database; semantic indexing and file cleanup are left out."""
+    mongo_client.drop_database(db.MONGO_DB_NAME)
+    monkeypatch.setattr(db, '_client', mongo_client)
+    monkeypatch.setattr(memory_store, '_indexes_ready', False)
+    monkeypatch.setattr(vector_index, 'index_memory', lambda *args: None)
+    monkeypatch.setattr(vector_index, 'remove_memory', lambda *args: None)
+    monkeypatch.setattr(artifact_gc, 'schedule_cleanup', lambda memories: None)
+    return db.get_db()
+
+
+@pytest.fixture
+def save(mongo):
+    """Save a memory for `user_id` the way the ingestion pipeline does."""
+    def save(user_id='user-1', transcript='the quarterly budget meeting', language='en', segments=None):
+        return memory_store.save_memory(
+            f'/nonexistent/{transcript[:12]}.mp3', transcript, 'a summary', [], user_id,
+            detected_language=language, duration=30.0, segments=segments
+        )
+    return save
@@ -0,0 +1,70 @@
+from bson import ObjectId
+import pytest
+
+from memory_processor import memory_store, user_stats
+
+SEGMENTS = [{"start": 0.0, "end": 4.0, "text": "the quarterly budget"}]
+
+
+def test_single_delete_leaves_memories_claimed_by_a_batch_delete(save):
+    memory_id = save()
+    # A batch delete has claimed the memory but not removed it yet
+    memory_store.get_collection().update_one({"_id": memory_id}, {"$set": {"deleting": ObjectId()}})
+
+    assert memory_store.delete_memory(str(memory_id), 'user-1') == 0
+    assert memory_store.get_collection().count_documents({"_id": memory_id}) == 1
+    assert user_stats.get_stats('user-1')['total_memories'] == 1
+
+
+def test_batch_delete_skips_memories_another_batch_claimed(save):
+    first, second = save(), save(transcript='a second recording')
+    memory_store.get_collection().update_one({"_id": first}, {"$set": {"deleting": ObjectId()}})
+
+    assert memory_store.delete_memories([str(first), str(second)], 'user-1') == [str(second)]
+
+
+def test_each_memory_is_deleted_once(save):
+    first, second = save(), save(transcript='a second recording')
+
+    assert memory_store.delete_memory(str(first), 'user-1') == 1
+    assert memory_store.delete_memories([str(first), str(second)], 'user-1') == [str(second)]
+    assert memory_store.delete_memory(str(second), 'user-1') == 0
+    assert user_stats.get_stats('user-1')['total_memories'] == 0
+    state = memory_store.get_db()['user_state'].find_one({"_id": "user-1"})
+    assert state['writes_started'] == state['writes_finished']
+
+
+def test_deletes_check_ownership(save):
+    memory_id = save()
+
+    assert memory_store.delete_memory(str(memory_id), 'user-2') == 0
+    assert memory_store.delete_memories([str(memory_id), 'not-an-id'], 'user-2') == []
+    assert memory_store.get_collection().count_documents({}) == 1
+
+
+def test_deletes_remove_segments_in_the_request(save):
+    first = save(segments=SEGMENTS)
+    second = save(transcript='a second recording', segments=SEGMENTS)
+    segments = memory_store.get_segments_collection()
+    assert segments.count_documents({}) == 2
+
+    memory_store.delete_memory(str(first), 'user-1')
+    assert segments.count_documents({"memory_id": first}) == 0
+    memory_store.delete_memories([str(second)], 'user-1')
+    assert segments.count_documents({}) == 0
+
+
+def test_a_failed_save_leaves_nothing_for_its_retry(mongo, monkeypatch):
+    def failing_save_segments(*args):
+        raise RuntimeError('segments write failed')
+    monkeypatch.setattr(memory_store, 'save_segments', failing_save_segments)
+    with pytest.raises(RuntimeError):
+        memory_store.save_memory('/nonexistent/a.mp4', 'the quarterly budget', 'a summary', ['frame.jpg'], 'user-1')
+
+    db = memory_store.get_db()
+    assert memory_store.get_collection().count_documents({}) == 0
+    assert db['frame_refs'].find_one({"_id": "frame.jpg"})['refs'] == 0
+    assert db['trigram_postings'].count_documents({}) == 0
+    state = db['user_state'].find_one({"_id": "user-1"})
+    assert state['writes_started'] == state['writes_finished']
+    assert user_stats.get_stats('user-1')['total_memories'] == 0
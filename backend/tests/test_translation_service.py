@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import pytest
+
+from memory_processor import memory_store, translation_service
+from memory_processor.translation_service import BackgroundTranslator
+
+
+class StubTranslator(BackgroundTranslator):
+    def __init__(self, fail=False):
+        super().__init__()
+        self.fail = fail
+        self.translated = []
+
+    def _translate(self, texts):
+        if self.fail:
+            raise RuntimeError('translator unavailable')
+        self.translated.extend(texts)
+        return [SimpleNamespace(text=f'english: {text}', src='es') for text in texts]
+
+
+@pytest.fixture
+def pending(save):
+    memory_id = save(transcript='reunion de presupuesto', language='es')
+    memory_store.get_collection().update_one({"_id": memory_id}, {"$set": {"translation_status": "pending"}})
+    return memory_id
+
+
+def memory(memory_id):
+    return memory_store.get_collection().find_one({"_id": memory_id})
+
+
+def test_a_claimed_memory_is_translated_once(pending):
+    first, second = StubTranslator(), StubTranslator()
+    claimed = first._claim([pending])
+
+    second._translate_batch([pending])
+    assert second.translated == []
+
+    first._store_translations(claimed)
+    assert memory(pending)['translated_transcript'] == 'english: reunion de presupuesto'
+    assert 'translation_status' not in memory(pending)
+    assert 'translation_lease' not in memory(pending)
+
+
+def test_an_expired_claim_is_retried(pending, monkeypatch):
+    monkeypatch.setattr(translation_service, 'TRANSLATION_LEASE_SECONDS', -1)
+    StubTranslator()._claim([pending])
+
+    translator = StubTranslator()
+    translator._translate_batch([pending])
+    assert translator.translated == ['reunion de presupuesto']
+
+
+def test_a_failed_batch_goes_back_to_pending(pending):
+    with pytest.raises(RuntimeError):
+        StubTranslator(fail=True)._translate_batch([pending])
+
+    assert memory(pending)['translation_status'] == 'pending'
+    assert 'translation_lease' not in memory(pending)
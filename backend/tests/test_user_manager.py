@@ -0,0 +1,53 @@
+import asyncio
+
+import mongomock
+import pytest
+from pymongo.errors import OperationFailure
+
+from auth import user_manager
+
+
+@pytest.fixture
+def users(mongo, monkeypatch):
+    monkeypatch.setattr(user_manager, 'BCRYPT_ROUNDS', 4)
+    monkeypatch.setattr(user_manager, '_email_index_ready', False)
+    return mongo['users']
+
+
+def test_an_email_registers_once(users):
+    assert 'user_id' in user_manager.register_user('a@example.com', 'secret', 'A')
+    assert user_manager.register_user('a@example.com', 'other', 'B') == {'error': 'User already exists with this email'}
+    assert users.count_documents({}) == 1
+
+
+def test_registration_checks_for_duplicates_until_the_index_exists(users, monkeypatch):
+    create_index = mongomock.collection.Collection.create_index
+    def failing_create_index(self, *args, **kwargs):
+        raise OperationFailure('E11000 duplicate key error')
+    monkeypatch.setattr(mongomock.collection.Collection, 'create_index', failing_create_index)
+
+    user_manager.register_user('a@example.com', 'secret', 'A')
+    assert user_manager.register_user('a@example.com', 'other', 'B') == {'error': 'User already exists with this email'}
+    assert not user_manager._email_index_ready
+
+    # Retried on the next call once the duplicates are gone
+    monkeypatch.setattr(mongomock.collection.Collection, 'create_index', create_index)
+    user_manager.get_users_collection()
+    assert user_manager._email_index_ready
+
+
+def test_login_upgrades_the_cost_factor(users, monkeypatch):
+    user_manager.register_user('a@example.com', 'secret', 'A')
+    monkeypatch.setattr(user_manager, 'BCRYPT_ROUNDS', 5)
+
+    assert asyncio.run(user_manager.login_user_async('a@example.com', 'secret'))['email'] == 'a@example.com'
+    assert user_manager._hash_rounds(users.find_one()['password']) == 5
+    assert user_manager.login_user('a@example.com', 'wrong') == {'error': 'Invalid email or password'}
+
+
+def test_a_saturated_pool_turns_requests_away(users, monkeypatch):
+    monkeypatch.setattr(user_manager, '_submit_bcrypt', lambda fn, *args: None)
+
+    assert user_manager.register_user('a@example.com', 'secret', 'A') == user_manager.BUSY_ERROR
+    assert asyncio.run(user_manager.register_user_async('a@example.com', 'secret', 'A')) == user_manager.BUSY_ERROR
+    assert users.count_documents({}) == 0
@@ -0,0 +1,91 @@
+from memory_processor import memory_store, trigram_index, user_stats
+
+
+def stats(user_id='user-1'):
+    return user_stats.format_stats(memory_store.get_db()['user_state'].find_one({"_id": user_id})['stats'])
+
+
+def test_saves_and_deletes_update_the_stats(save):
+    first = save(language='en')
+    save(transcript='reunion de presupuesto', language='es')
+    memory_store.delete_memory(str(first), 'user-1')
+
+    assert user_stats.get_stats('user-1') == {
+        "total_memories": 1, "total_duration": 30.0, "storage_bytes": 0,
+        "language_stats": [{"_id": "es", "count": 1}],
+    }
+
+
+def test_rebuild_does_not_count_a_save_in_flight(save, monkeypatch):
+    monkeypatch.setattr(user_stats, 'REBUILD_RETRY_SECONDS', 0)
+    save()
+    user_stats.rebuild_user_stats('user-1')
+
+    # The rebuild runs after the memory is inserted but before the save adds it to the stats
+    add_memory = trigram_index.add_memory
+    def add_memory_and_rebuild(memory):
+        add_memory(memory)
+        user_stats.rebuild_user_stats('user-1')
+    monkeypatch.setattr(trigram_index, 'add_memory', add_memory_and_rebuild)
+    save(transcript='a second recording')
+
+    assert stats()['total_memories'] == 2
+
+
+def test_rebuild_retries_when_a_save_starts_while_counting(save, monkeypatch):
+    monkeypatch.setattr(user_stats, 'REBUILD_RETRY_SECONDS', 0)
+    save()
+
+    # A whole save lands between the rebuild's count and its write
+    language_key = user_stats._language_key
+    pending = ['a second recording']
+    def language_key_and_save(language):
+        if pending:
+            save(transcript=pending.pop())
+        return language_key(language)
+    monkeypatch.setattr(user_stats, '_language_key', language_key_and_save)
+    user_stats.rebuild_user_stats('user-1')
+
+    assert stats()['total_memories'] == 2
+
+
+def test_rebuild_settles_a_writer_that_died(save, monkeypatch):
+    save()
+    # A save that inserted its memory and died before updating the stats
+    user_stats.begin_write('user-1')
+    memory_store.get_collection().insert_one({"user_id": "user-1", "detected_language": "en", "duration": 5.0})
+    monkeypatch.setattr(user_stats, 'STALE_WRITE_SECONDS', -1)
+
+    assert user_stats.rebuild_user_stats('user-1')['total_memories'] == 2
+    state = memory_store.get_db()['user_state'].find_one({"_id": "user-1"})
+    assert state['writes_started'] == state['writes_finished']
+
+    # Later writes are counted again
+    save(transcript='a third recording')
+    assert stats()['total_memories'] == 3
+
+
+def test_rebuild_gives_up_while_a_write_is_in_flight(save, monkeypatch):
+    monkeypatch.setattr(user_stats, 'REBUILD_RETRY_SECONDS', 0)
+    save()
+    user_stats.rebuild_user_stats('user-1')
+    user_stats.begin_write('user-1')
+    memory_store.get_collection().insert_one({"user_id": "user-1", "detected_language": "en", "duration": 5.0})
+
+    user_stats.rebuild_user_stats('user-1')
+
+    # The stored stats are left for the writer to update
+    assert stats()['total_memories'] == 1
+
+
+def test_a_stats_request_does_not_wait_for_writers(save, monkeypatch):
+    def no_sleep(seconds):
+        raise AssertionError('the request slept')
+    monkeypatch.setattr(user_stats.time, 'sleep', no_sleep)
+    save()
+    # Stats were never built and a save is in flight
+    memory_store.get_db()['user_state'].update_one({"_id": "user-1"}, {"$unset": {"stats": ""}})
+    user_stats.begin_write('user-1')
+
+    assert user_stats.get_stats('user-1')['total_memories'] == 1
+    assert 'stats' not in memory_store.get_db()['user_state'].find_one({"_id": "user-1"})
@@ -0,0 +1,42 @@
+"""
+Ingestion worker process: runs the job queue's worker pool without the web API.
+
+Pair it with API-only web processes on the same host:
+    APP_ROLE=api gunicorn app:app
+    python worker.py
+"""
+import os
+import signal
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from memory_processor import artifact_gc, job_queue
+from memory_processor.ingestion import process_memory_async
+from memory_processor.memory_store import ensure_indexes
+from memory_processor.audio_transcriber import preload_engine
+from memory_processor.translation_service import resume_pending_translations
+
+# Load the transcription model up front so the first job doesn't pay for it
+PRELOAD_MODEL = os.environ.get('WORKER_PRELOAD_MODEL', '1') == '1'
+
+def main():
+    ensure_indexes()
+    if PRELOAD_MODEL:
+        preload_engine()
+
+    pool = job_queue.start_workers(process_memory_async, size=max(1, job_queue.INGEST_WORKERS))
+    resume_pending_translations()
+    artifact_gc.start_sweeper()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    stop.wait()
+
+    print("[Worker] Shutting down; unfinished jobs will be resumed when their lease expires")
+    pool.stop()
+
+if __name__ == '__main__':
+    main()
@@ -762,7 +762,7 @@ function MemorySearch() {
             >
               {memory.keyframes && memory.keyframes.length > 0 && (
                 <img 
-                  src={memory.keyframes[0]} 
+                  src={(memory.thumbnails && memory.thumbnails[0]) || memory.keyframes[0]} 
                   alt="Memory preview" 
                   style={{
                     ...styles.memoryImage,
@@ -888,7 +888,7 @@ function MemorySearch() {
                         {selectedMemory.keyframes.map((frame, index) => (
                           <img
                             key={index}
-                            src={frame}
+                            src={(selectedMemory.thumbnails && selectedMemory.thumbnails[index]) || frame}
                             alt={`Thumbnail ${index + 1}`}
                             style={{
                               ...styles.thumbnail,
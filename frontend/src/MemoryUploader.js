@@ -1,5 +1,5 @@
 import React, { useState, useRef, useEffect } from 'react';
-import { uploadMemory, getProcessingStatus } from './api';
+import { uploadMemory, openProcessingEvents, waitForProcessingStatus } from './api';
 import { useAuth } from './AuthContext';
 
 function MemoryUploader({ setMemoryCount, onUploadComplete }) {
@@ -11,18 +11,22 @@ function MemoryUploader({ setMemoryCount, onUploadComplete }) {
     const [progress, setProgress] = useState(0);
     const [statusMessage, setStatusMessage] = useState('');
     const [uploadId, setUploadId] = useState(null);
+    const [partialTranscript, setPartialTranscript] = useState('');
     const fileInputRef = useRef(null);
-    const pollingRef = useRef(null);
+    const eventsRef = useRef(null);
+    const watchingRef = useRef(false);
     const { token } = useAuth();
 
-    // Clean up polling on unmount
-    useEffect(() => {
-        return () => {
-            if (pollingRef.current) {
-                clearTimeout(pollingRef.current);
-            }
-        };
-    }, []);
+    const stopWatching = () => {
+        watchingRef.current = false;
+        if (eventsRef.current) {
+            eventsRef.current.close();
+            eventsRef.current = null;
+        }
+    };
+
+    // Close the progress stream on unmount
+    useEffect(() => stopWatching, []);
 
     const handleFileChange = (e) => {
         const selectedFile = e.target.files[0];
@@ -68,9 +72,10 @@ function MemoryUploader({ setMemoryCount, onUploadComplete }) {
             setProgress(10);
             setStatusMessage('File uploaded, starting processing...');
             setUploadId(result.filename);
+            setPartialTranscript('');
             
-            // Start polling for processing status
-            startPolling(result.filename);
+            // Follow processing progress as the server pushes it
+            watchProgress(result.filename);
             
         } catch (err) {
             setError(err.message || 'Failed to upload memory. Please try again.');
@@ -78,48 +83,92 @@ function MemoryUploader({ setMemoryCount, onUploadComplete }) {
         }
     };
 
-    const startPolling = (filename) => {
-        const checkStatus = async () => {
+    // Returns true once the job has finished (successfully or not)
+    const applyStatus = (status) => {
+        setProgress(status.progress);
+        setStatusMessage(status.message);
+
+        if (status.status === 'completed') {
+            stopWatching();
+            setMessage('Memory processed and stored successfully!');
+            setProcessing(false);
+            setMemoryCount(prev => prev + 1);
+            if (onUploadComplete) onUploadComplete();
+            // Reset form
+            setFile(null);
+            if (fileInputRef.current) {
+                fileInputRef.current.value = '';
+            }
+            return true;
+        }
+        if (status.status === 'error' || status.status === 'unknown') {
+            stopWatching();
+            setError(status.message || 'Processing failed');
+            setProcessing(false);
+            return true;
+        }
+        return false;
+    };
+
+    const watchProgress = async (filename) => {
+        watchingRef.current = true;
+        if (typeof EventSource === 'undefined') {
+            longPoll(filename, null);
+            return;
+        }
+
+        let events;
+        try {
+            events = await openProcessingEvents(filename, token);
+        } catch (err) {
+            longPoll(filename, null);
+            return;
+        }
+        if (!watchingRef.current) {
+            events.close();
+            return;
+        }
+        eventsRef.current = events;
+        let revision = null;
+        events.addEventListener('status', (e) => {
+            const status = JSON.parse(e.data);
+            revision = status.revision;
+            applyStatus(status);
+        });
+        events.addEventListener('transcript', (e) => {
+            const chunk = JSON.parse(e.data);
+            setPartialTranscript(prev => prev.slice(0, chunk.offset) + chunk.text);
+        });
+        events.onerror = () => {
+            // Stream blocked or dropped (e.g. by a proxy): switch to long-polling
+            if (!watchingRef.current) return;
+            events.close();
+            eventsRef.current = null;
+            longPoll(filename, revision);
+        };
+    };
+
+    const longPoll = async (filename, since) => {
+        let revision = since;
+        while (watchingRef.current) {
             try {
-                const status = await getProcessingStatus(filename, token);
-                setProgress(status.progress);
-                setStatusMessage(status.message);
-                
-                if (status.status === 'processing') {
-                    // Continue polling
-                    pollingRef.current = setTimeout(() => checkStatus(), 2000);
-                } else if (status.status === 'completed') {
-                    setMessage('Memory processed and stored successfully!');
-                    setProcessing(false);
-                    setMemoryCount(prev => prev + 1);
-                    if (onUploadComplete) onUploadComplete();
-                    // Reset form
-                    setFile(null);
-                    if (fileInputRef.current) {
-                        fileInputRef.current.value = '';
-                    }
-                } else if (status.status === 'error') {
-                    setError(status.message || 'Processing failed');
-                    setProcessing(false);
-                } else if (status.status === 'queued') {
-                    // Still queued, continue polling
-                    pollingRef.current = setTimeout(() => checkStatus(), 2000);
-                }
+                const status = await waitForProcessingStatus(filename, token, revision);
+                if (!watchingRef.current) return;
+                revision = status.revision;
+                if (status.partial_transcript) setPartialTranscript(status.partial_transcript);
+                if (applyStatus(status)) return;
             } catch (err) {
                 console.error('Status check error:', err);
                 setError('Failed to check processing status. The server might be busy.');
                 setProcessing(false);
+                stopWatching();
+                return;
             }
-        };
-        
-        // Start the polling
-        pollingRef.current = setTimeout(() => checkStatus(), 2000);
+        }
     };
 
     const cancelUpload = () => {
-        if (pollingRef.current) {
-            clearTimeout(pollingRef.current);
-        }
+        stopWatching();
         setProcessing(false);
         setLoading(false);
         setMessage('Upload cancelled');
@@ -251,6 +300,14 @@ function MemoryUploader({ setMemoryCount, onUploadComplete }) {
             color: '#ff9800',
             background: 'rgba(255, 152, 0, 0.1)',
         },
+        partialTranscript: {
+            fontSize: '0.85rem',
+            color: '#c0c0f0',
+            marginTop: '0.5rem',
+            maxHeight: '6rem',
+            overflowY: 'auto',
+            whiteSpace: 'pre-wrap',
+        },
         uploadId: {
             fontSize: '0.8rem',
             color: '#a0a0e0',
@@ -354,6 +411,9 @@ function MemoryUploader({ setMemoryCount, onUploadComplete }) {
                     <div style={styles.progressText}>
                         {statusMessage} ({Math.round(progress)}%)
                     </div>
+                    {processing && partialTranscript && (
+                        <div style={styles.partialTranscript}>{partialTranscript}</div>
+                    )}
                 </div>
             )}
             
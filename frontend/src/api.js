@@ -76,6 +76,73 @@ export const uploadMemory = async (file, token) => {
     return await response.json();
 };
 
+// Several files (or zip archives of them) in one request; returns
+// { uploads: [{ name, filename, status_url }], rejected: [{ name, error }] }
+export const uploadMemories = async (files, token) => {
+    const formData = new FormData();
+    Array.from(files).forEach(file => formData.append('files', file));
+
+    const response = await fetch(`${BASE_URL}/upload/batch`, {
+        method: 'POST',
+        headers: {
+            'Authorization': `Bearer ${token}`,
+        },
+        body: formData,
+    });
+    
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.error || 'Upload failed');
+    }
+    
+    return await response.json();
+};
+
+// Chunked, resumable upload for large files. Returns the same
+// { filename, status_url } as uploadMemory once the last chunk is stored.
+export const uploadMemoryResumable = async (file, token, onProgress = null, uploadId = null) => {
+    const headers = { 'Authorization': `Bearer ${token}` };
+
+    let session;
+    if (uploadId) {
+        // Resume: ask the server how much it already has
+        session = await (await fetch(`${BASE_URL}/uploads/${uploadId}`, { headers })).json();
+    } else {
+        const response = await fetch(`${BASE_URL}/uploads`, {
+            method: 'POST',
+            headers: { ...headers, 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size }),
+        });
+        session = await response.json();
+        if (!response.ok) {
+            throw new Error(session.error || 'Upload failed');
+        }
+    }
+
+    while (session.status === 'uploading') {
+        const chunk = file.slice(session.offset, session.offset + session.chunk_size);
+        const response = await fetch(session.upload_url, {
+            method: 'PUT',
+            headers: { ...headers, 'Upload-Offset': String(session.offset) },
+            body: chunk,
+        });
+        const body = await response.json();
+        if (response.status === 409 && body.offset !== undefined) {
+            session.offset = body.offset; // the server is ahead or behind; continue from its offset
+            continue;
+        }
+        if (!response.ok) {
+            const error = new Error(body.error || 'Upload failed');
+            error.uploadId = session.upload_id; // pass back in to resume
+            throw error;
+        }
+        session = body;
+        if (onProgress) onProgress(session.offset / session.size);
+    }
+
+    return session;
+};
+
 export const getProcessingStatus = async (filename, token) => {
     const response = await fetch(`${BASE_URL}/processing-status/${filename}`, {
         headers: {
@@ -85,6 +152,38 @@ export const getProcessingStatus = async (filename, token) => {
     return await response.json();
 };
 
+// Server-Sent Events stream of a job's progress. EventSource cannot send an
+// Authorization header, so a short-lived token for this one stream goes in
+// the query string instead of the login token.
+export const openProcessingEvents = async (filename, token) => {
+    const response = await fetch(`${BASE_URL}/processing-status/${filename}/stream-token`, {
+        method: 'POST',
+        headers: {
+            'Authorization': `Bearer ${token}`,
+        },
+    });
+    if (!response.ok) {
+        throw new Error('Could not open the progress stream');
+    }
+    const { token: streamToken } = await response.json();
+    return new EventSource(`${BASE_URL}/processing-status/${filename}/events?token=${encodeURIComponent(streamToken)}`);
+};
+
+// Long-poll fallback: resolves once the status differs from `since` (or after ~25s)
+export const waitForProcessingStatus = async (filename, token, since) => {
+    const params = new URLSearchParams({ wait: 25 });
+    if (since) params.set('since', since);
+    const response = await fetch(`${BASE_URL}/processing-status/${filename}?${params}`, {
+        headers: {
+            'Authorization': `Bearer ${token}`,
+        },
+    });
+    if (!response.ok) {
+        throw new Error('Status check failed');
+    }
+    return await response.json();
+};
+
 export const searchMemory = async (query, token) => {
     const response = await fetch(`${BASE_URL}/search?query=${encodeURIComponent(query)}`, {
         headers: {
@@ -100,6 +199,21 @@ export const searchMemory = async (query, token) => {
     return await response.json();
 };
 
+export const searchSegments = async (query, token, limit = 20) => {
+    const response = await fetch(`${BASE_URL}/search/segments?query=${encodeURIComponent(query)}&limit=${limit}`, {
+        headers: {
+            'Authorization': `Bearer ${token}`,
+        },
+    });
+    
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.error || 'Search failed');
+    }
+    
+    return await response.json();
+};
+
 export const getAllMemories = async (token) => {
     const response = await fetch(`${BASE_URL}/memories`, {
         headers: {
@@ -109,6 +223,25 @@ export const getAllMemories = async (token) => {
     return await response.json();
 };
 
+export const getMemoriesPage = async (token, { cursor = null, limit = 20, view = 'compact', fields = null } = {}) => {
+    const params = new URLSearchParams({ limit, view });
+    if (cursor) params.append('cursor', cursor);
+    if (fields) params.append('fields', fields.join(','));
+
+    const response = await fetch(`${BASE_URL}/memories?${params}`, {
+        headers: {
+            'Authorization': `Bearer ${token}`,
+        },
+    });
+
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.error || 'Failed to load memories');
+    }
+
+    return await response.json(); // { memories, next_cursor }
+};
+
 export const deleteMemory = async (id, token) => {
     const response = await fetch(`${BASE_URL}/delete/${id}`, { 
         method: 'DELETE',
@@ -125,6 +258,25 @@ export const deleteMemory = async (id, token) => {
     return await response.json();
 };
 
+// Returns { deleted: [...ids], not_found: [...ids] }
+export const deleteMemories = async (ids, token) => {
+    const response = await fetch(`${BASE_URL}/memories/delete`, {
+        method: 'POST',
+        headers: {
+            'Authorization': `Bearer ${token}`,
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ ids }),
+    });
+    
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.error || 'Delete failed');
+    }
+    
+    return await response.json();
+};
+
 export const getHealthStatus = async () => {
     const response = await fetch(`${BASE_URL}/health`);
     return await response.json();
@@ -132,22 +284,23 @@ export const getHealthStatus = async () => {
 
 export const getMemoryStats = async (token) => {
     try {
-        const memories = await getAllMemories(token);
-        
-        const totalDuration = memories.reduce((sum, memory) => sum + (memory.duration || 0), 0);
-        const languageCount = {};
-        
-        memories.forEach(memory => {
-            const lang = memory.detected_language || 'unknown';
-            languageCount[lang] = (languageCount[lang] || 0) + 1;
+        const response = await fetch(`${BASE_URL}/stats`, {
+            headers: {
+                'Authorization': `Bearer ${token}`,
+            },
         });
+        if (!response.ok) {
+            throw new Error('Failed to fetch stats');
+        }
+        const stats = await response.json();
         
         return {
-            total: memories.length,
-            totalDuration,
-            languages: Object.keys(languageCount).map(lang => ({
-                language: lang,
-                count: languageCount[lang]
+            total: stats.total_memories,
+            totalDuration: stats.total_duration,
+            storageBytes: stats.storage_bytes,
+            languages: stats.language_stats.map(item => ({
+                language: item._id || 'unknown',
+                count: item.count
             }))
         };
     } catch (error) {